@@ -0,0 +1,193 @@
+import functools
+import json
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from resource_governor import ResourceGovernor
+
+# Scheduler of the files of a batch on the worker pool. The cost of each file is estimated without opening it with the
+# readers: the number of tables of a DOCX (the <w:tbl> elements of word/document.xml), the number of pages of a PDF
+# (its /Type /Page objects), and the size of the other files, times the seconds per table, page or MiB observed in
+# the earlier batches (saved to the history file, if one is given).
+#
+# The files are dispatched longest first over the whole batch (so that no long file is left for the end of the
+# batch), in bands of costs within a factor of two. Inside a band, the files of each steel plant are dispatched in one
+# run (the plant with the longest file first), so that the workers keep the caches of the same rule maker warm. The
+# results are yielded as the files complete, with the index of their file, so that they can be routed without waiting
+# for the files dispatched last. After each run, the makespan (from the first dispatch to the last result) and the idle
+# time of the workers are in the report. With a resource governor, the files run in its workers (see
+# resource_governor), and the files given up are not timed.
+#
+#     python certificate_processor.py <directory> --schedule [--history batch_history.json]
+
+# The plant is known from the file type: PdfFile only reads the certificates of BaoSteel, DocxFile those of LongTeng
+PLANTS = {
+    '.pdf': 'BAOSHAN IRON & STEEL CO., LTD.',
+    '.docx': 'CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.',
+    '.doc': 'CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.'
+}
+# Seconds per table, page or MiB until the history has some observations
+DEFAULT_RATES = {'docx_tables': 0.05, 'pdf_pages': 1.5, 'mebibytes': 2.0}
+PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def get_docx_tables(file_path: str) -> int:
+    with zipfile.ZipFile(file_path) as archive:
+        return archive.read('word/document.xml').count(b'<w:tbl>')
+
+
+def get_pdf_pages(file_path: str) -> int:
+    # The page objects may be in compressed object streams, the size is used then
+    with open(file_path, 'rb') as f:
+        return len(PAGE_PATTERN.findall(f.read()))
+
+
+def get_work_units(file_path: str) -> Tuple[str, float]:
+    # The measure of the work of a file, and its unit
+    extension = os.path.splitext(file_path)[1].lower()
+    try:
+        if extension == '.docx':
+            return 'docx_tables', max(get_docx_tables(file_path), 1)
+        if extension == '.pdf' and (pages := get_pdf_pages(file_path)) > 0:
+            return 'pdf_pages', pages
+    except (OSError, KeyError, zipfile.BadZipFile):
+        pass
+    return 'mebibytes', max(os.path.getsize(file_path) / (1024 * 1024), 0.01)
+
+
+@dataclass
+class ScheduledFile:
+    index: int
+    file_path: str
+    plant: Optional[str]
+    unit: str
+    units: float
+    cost: float
+
+
+@dataclass
+class ScheduleReport:
+    files: int = 0
+    workers: int = 0
+    estimated_cost: float = 0
+    makespan: float = 0
+    busy_time: Dict[int, float] = field(default_factory=dict)
+
+    def get_idle_time(self) -> float:
+        # A worker without any file was idle for the whole makespan
+        return max(self.workers * self.makespan - sum(self.busy_time.values()), 0)
+
+    def __str__(self):
+        busy_time = ', '.join([f"{seconds:.2f} s" for seconds in self.busy_time.values()])
+        return (
+            f"{self.files} files on {self.workers} workers (estimated {self.estimated_cost:.1f} s of work): "
+            f"makespan {self.makespan:.2f} s, worker idle time {self.get_idle_time():.2f} s (busy {busy_time})"
+        )
+
+
+def run_timed(function: Callable[[str], Any], file_path: str) -> Tuple[str, Any, int, float, float]:
+    # Runs in the workers, the wall clock times are comparable between processes
+    start = time.time()
+    result = function(file_path)
+    return file_path, result, os.getpid(), start, time.time()
+
+
+def fail_timed(on_failure: Callable[[str, str], Any], file_path: str,
+               reason: str) -> Tuple[str, Any, Optional[int], float, float]:
+    # A file given up by the governor, without a worker to account its time to
+    now = time.time()
+    return file_path, on_failure(file_path, reason), None, now, now
+
+
+def get_band(cost: float) -> float:
+    # The costs of a band are within a factor of two
+    return math.floor(math.log2(cost)) if cost > 0 else -math.inf
+
+
+class BatchScheduler:
+
+    def __init__(self, history_path: Optional[str] = None):
+        self.history_path = history_path
+        # Per unit: [seconds, units] observed
+        self.history: Dict[str, List[float]] = dict()
+        if history_path is not None and os.path.exists(history_path):
+            with open(history_path, encoding='utf-8') as f:
+                self.history = json.load(f)
+        self.report = ScheduleReport()
+
+    def get_rate(self, unit: str) -> float:
+        seconds, units = self.history.get(unit, [0, 0])
+        return seconds / units if units > 0 else DEFAULT_RATES[unit]
+
+    def observe(self, unit: str, units: float, seconds: float):
+        observed = self.history.setdefault(unit, [0, 0])
+        observed[0] += seconds
+        observed[1] += units
+
+    def save_history(self):
+        if self.history_path is not None:
+            with open(self.history_path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, indent=2)
+
+    def estimate(self, index: int, file_path: str) -> ScheduledFile:
+        unit, units = get_work_units(file_path)
+        plant = PLANTS.get(os.path.splitext(file_path)[1].lower())
+        return ScheduledFile(index, file_path, plant, unit, units, units * self.get_rate(unit))
+
+    def schedule(self, file_paths: List[str]) -> List[ScheduledFile]:
+        files = [self.estimate(index, file_path) for index, file_path in enumerate(file_paths)]
+        # The longest file of each plant in each band orders the runs of the band
+        longest: Dict[Tuple[float, str], float] = dict()
+        for f in files:
+            key = (get_band(f.cost), f.plant or '')
+            longest[key] = max(longest.get(key, 0), f.cost)
+        return sorted(files, key=lambda f: (-get_band(f.cost), -longest[(get_band(f.cost), f.plant or '')],
+                                            f.plant or '', -f.cost, f.index))
+
+    def run(self, file_paths: List[str], workers: int, function: Callable[[str], Any],
+            pool_context=None, initializer: Optional[Callable[[], None]] = None,
+            governor: Optional[ResourceGovernor] = None,
+            on_failure: Optional[Callable[[str, str], Any]] = None,
+            pool: Optional[multiprocessing.pool.Pool] = None) -> Iterator[Tuple[int, Any]]:
+        # Yields the index of each file with the result of the function, as the files complete. With a governor, the
+        # files given up get the result of on_failure. With a pool kept by the caller, the files run in its workers.
+        scheduled_files = self.schedule(file_paths)
+        by_path = {scheduled_file.file_path: scheduled_file for scheduled_file in scheduled_files}
+        self.report = ScheduleReport(files=len(file_paths), workers=max(min(workers, len(file_paths)), 1),
+                                     estimated_cost=sum([scheduled_file.cost for scheduled_file in scheduled_files]))
+        ordered_paths = [scheduled_file.file_path for scheduled_file in scheduled_files]
+        timed_function = functools.partial(run_timed, function)
+        pool_context = pool_context or multiprocessing.get_context()
+        start = time.time()
+        try:
+            if governor is not None:
+                governed_results = governor.run(ordered_paths, self.report.workers, timed_function,
+                                                functools.partial(fail_timed, on_failure), pool_context, initializer)
+                yield from self.collect((timed_result for _, timed_result in governed_results), by_path, start)
+            elif pool is not None:
+                yield from self.collect(pool.imap_unordered(timed_function, ordered_paths, chunksize=1), by_path, start)
+            elif self.report.workers <= 1:
+                yield from self.collect(map(timed_function, ordered_paths), by_path, start)
+            else:
+                with pool_context.Pool(processes=self.report.workers, initializer=initializer) as pool:
+                    yield from self.collect(pool.imap_unordered(timed_function, ordered_paths, chunksize=1), by_path,
+                                            start)
+        finally:
+            self.save_history()
+
+    def collect(self, timed_results: Iterator[Tuple[str, Any, Optional[int], float, float]],
+                by_path: Dict[str, ScheduledFile], start: float) -> Iterator[Tuple[int, Any]]:
+        for file_path, result, worker, task_start, task_end in timed_results:
+            scheduled_file = by_path[file_path]
+            if worker is not None:
+                self.observe(scheduled_file.unit, scheduled_file.units, task_end - task_start)
+                self.report.busy_time[worker] = self.report.busy_time.get(worker, 0) + task_end - task_start
+            self.report.makespan = max(self.report.makespan, task_end - start)
+            yield scheduled_file.index, result
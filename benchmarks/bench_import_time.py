@@ -0,0 +1,46 @@
+# Benchmark of the start-up time: imports each top-level module in a fresh interpreter and prints the best time of a
+# few runs, with the document and report backends (pdfplumber, python-docx, pywin32, openpyxl) the import loaded.
+#
+# Usage: python benchmarks/bench_import_time.py [runs]
+import os
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ['pdfplumber', 'docx', 'win32com', 'openpyxl']
+MEASURE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - start)\n"
+    f"print(' '.join([backend for backend in {BACKENDS!r} if backend in sys.modules]))\n"
+)
+
+
+def list_modules() -> List[str]:
+    modules = sorted(file_name[:-3] for file_name in os.listdir(ROOT) if file_name.endswith('.py'))
+    return modules + ['output_utilities.output_excel']
+
+
+def measure(module: str) -> Tuple[Optional[float], str]:
+    # Returns the import time (None if the import failed) and the backends loaded, or the error
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + [os.environ.get('PYTHONPATH', '')]))
+    process = subprocess.run([sys.executable, '-c', MEASURE.format(module=module)], capture_output=True, text=True,
+                             cwd=ROOT, env=environment)
+    if process.returncode != 0:
+        return None, process.stderr.strip().splitlines()[-1]
+    seconds, backends = (process.stdout.splitlines() + [''])[:2]
+    return float(seconds), backends
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'module':<32}{'import (ms)':>12}  backends")
+    for module_name in list_modules():
+        results = [measure(module_name) for _ in range(runs)]
+        times = [seconds for seconds, _ in results if seconds is not None]
+        if not times:
+            print(f"{module_name:<32}{'failed':>12}  {results[0][1]}")
+            continue
+        print(f"{module_name:<32}{min(times) * 1000:>12.1f}  {results[0][1] or '-'}")
@@ -0,0 +1,60 @@
+# Benchmark of the overhead of the instrumentation: reads and verifies the test certificates serially without any hook,
+# then with a TimingSummary registered, and prints the best time of a few runs of each, with the overhead of a call
+# to an instrumented function and of an empty span without hooks.
+#
+# Usage: python benchmarks/bench_instrumentation.py [runs]
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from certificate_processor import read_and_verify  # noqa: E402
+from instrumentation import TimingSummary, add_hook, remove_hook, instrumented, span  # noqa: E402
+
+TEST_DATA = os.path.join(ROOT, 'test_suites', 'test_data')
+
+
+@instrumented('noop')
+def noop():
+    pass
+
+
+def bare_noop():
+    pass
+
+
+def empty_span():
+    with span('noop'):
+        pass
+
+
+def read_all(file_paths):
+    for file_path in file_paths:
+        read_and_verify(file_path)
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # Not the .doc files: they are converted and removed when they are read
+    file_paths = [
+        os.path.join(TEST_DATA, file_name) for file_name in sorted(os.listdir(TEST_DATA))
+        if file_name.lower().endswith(('.pdf', '.docx'))
+    ]
+    calls = 1000000
+    bare = min(timeit.repeat(bare_noop, number=calls, repeat=runs)) / calls
+    wrapped = min(timeit.repeat(noop, number=calls, repeat=runs)) / calls
+    spanned = min(timeit.repeat(empty_span, number=calls, repeat=runs)) / calls
+    print(f"instrumented call without hooks: +{(wrapped - bare) * 1e9:.0f} ns over a bare call")
+    print(f"empty span without hooks: {spanned * 1e9:.0f} ns")
+    read_all(file_paths)
+    without_hooks = min(timeit.repeat(lambda: read_all(file_paths), number=1, repeat=runs))
+    summary = TimingSummary()
+    add_hook(summary)
+    try:
+        with_hooks = min(timeit.repeat(lambda: read_all(file_paths), number=1, repeat=runs))
+    finally:
+        remove_hook(summary)
+    print(f"{len(file_paths)} files: {without_hooks:.3f} s without hooks, {with_hooks:.3f} s with a timing summary "
+          f"({(with_hooks / without_hooks - 1) * 100:+.1f} %)")
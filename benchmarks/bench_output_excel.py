@@ -0,0 +1,41 @@
+# Benchmark of the FAIL reports: writes the workbook of a single certificate many times, as for the FAIL files of a
+# batch, and prints the best time per workbook of a few runs, with the time to build the header from scratch and to
+# clone the header template.
+#
+# Usage: python benchmarks/bench_output_excel.py [runs] [workbooks]
+import os
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from certificate_processor import read_and_verify  # noqa: E402
+from output_utilities.output_excel import build_header, create_workbook, get_header_template, \
+    write_multiple_certificates_to_excel  # noqa: E402
+
+TEST_FILE = os.path.join(ROOT, 'test_suites', 'test_data', 'DNVGL_LONGTENG.docx')
+
+
+def build_from_scratch():
+    build_header(create_workbook().active)
+
+
+def clone_template():
+    get_header_template().clone(create_workbook().active)
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    workbooks = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    certificates = read_and_verify(TEST_FILE).certificates
+    built = min(timeit.repeat(build_from_scratch, number=workbooks, repeat=runs)) / workbooks
+    cloned = min(timeit.repeat(clone_template, number=workbooks, repeat=runs)) / workbooks
+    print(f"header: {built * 1e3:.2f} ms built from scratch, {cloned * 1e3:.2f} ms cloned from the template")
+    with tempfile.TemporaryDirectory() as directory:
+        output_file = os.path.join(directory, 'FAIL.xlsx')
+        written = min(timeit.repeat(lambda: write_multiple_certificates_to_excel(certificates, 'FAIL', output_file),
+                                    number=workbooks, repeat=runs)) / workbooks
+    print(f"{workbooks} workbooks of {sum([len(c.steel_plates) for c in certificates])} plates: "
+          f"{written * 1e3:.2f} ms per workbook")
@@ -0,0 +1,138 @@
+# Benchmark of the compiled verification (rule_compiler) against the interpreted verification (Limit.verify) on the
+# steel plates of the certificates in test_suites/test_data, with the rule sets built once, built again for every
+# steel plate, and looked up in a rule space (as read_and_verify does once the rule space is loaded).
+#
+# Usage: python benchmarks/bench_rule_compiler.py [iterations]
+import copy
+import os
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from certificate_factory import CertificateFactoryRegister, BaoSteelCertificateFactory, LongTengCertificateFactory
+from certificate_verification import RuleMaker
+from common import CommonUtils, SteelPlate, Limit
+from rule_compiler import RuleCompiler
+from rule_space import RuleSpace
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_suites', 'test_data')
+
+
+def load_plates() -> List[Tuple[SteelPlate, RuleMaker]]:
+    register = CertificateFactoryRegister()
+    register.register_factory(steel_plant='BAOSHAN IRON & STEEL CO., LTD.',
+                              certificate_factory=BaoSteelCertificateFactory())
+    register.register_factory(steel_plant='CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.',
+                              certificate_factory=LongTengCertificateFactory())
+    plates = []
+    for file_name in sorted(os.listdir(TEST_DATA)):
+        # .doc files are converted (and removed) when they are opened, they are left out of the benchmark.
+        if not file_name.lower().endswith(('.pdf', '.docx')):
+            continue
+        try:
+            with CommonUtils.open_file(os.path.join(TEST_DATA, file_name)) as cert_file:
+                factory = register.get_factory(steel_plant=cert_file.steel_plant)
+                certificates = factory.read(file=cert_file)
+        except Exception as e:
+            print(f"Skipped {file_name}: {e}")
+            continue
+        for certificate in certificates:
+            for plate in certificate.steel_plates:
+                plates.append((plate, factory.get_rule_maker()))
+        print(f"Loaded {file_name}: {sum(len(c.steel_plates) for c in certificates)} steel plates.")
+    return plates
+
+
+def reset(plate: SteelPlate):
+    elements = [
+        plate.specification, plate.delivery_condition, plate.thickness, plate.yield_strength, plate.tensile_strength,
+        plate.elongation, plate.temperature
+    ] + plate.impact_energy_list + list(plate.chemical_compositions.values())
+    for element in elements:
+        if element is not None:
+            element.valid_flag = True
+            element.message = None
+
+
+def run(plates: List[Tuple[SteelPlate, List[Limit]]], iterations: int, compiled: bool,
+        new_rules: bool = False) -> Tuple[float, List[bool]]:
+    compiler = RuleCompiler()
+    verdicts = []
+    elapsed = 0.0
+    for _ in range(iterations):
+        for plate, rules in plates:
+            if new_rules:
+                # New limit objects, as when the rule set is built again for every steel plate.
+                rules = copy.deepcopy(rules)
+            # The annotations are reset so that they don't pile up over the iterations.
+            reset(plate)
+            start = time.perf_counter()
+            if compiled:
+                verdicts.append(compiler.verify(plate, rules))
+            else:
+                verdicts.append(all([limit.verify(plate) for limit in rules]))
+            elapsed += time.perf_counter() - start
+    return elapsed, verdicts
+
+
+def run_rule_space(plates: List[Tuple[SteelPlate, RuleMaker]], rule_space: RuleSpace, iterations: int,
+                   compiled: bool) -> Tuple[float, List[bool]]:
+    compiler = RuleCompiler()
+    verdicts = []
+    elapsed = 0.0
+    for _ in range(iterations):
+        for plate, rule_maker in plates:
+            reset(plate)
+            start = time.perf_counter()
+            rules = rule_space.get_rules(rule_maker, plate)
+            if compiled:
+                verdicts.append(compiler.verify(plate, rules))
+            else:
+                verdicts.append(all([limit.verify(plate) for limit in rules]))
+            elapsed += time.perf_counter() - start
+    return elapsed, verdicts
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    plates, rule_makers = [], []
+    for plate, rule_maker in load_plates():
+        try:
+            plates.append((plate, rule_maker.get_rules(plate)))
+            rule_makers.append((plate, rule_maker))
+        except Exception as e:
+            print(f"Skipped steel plate {plate.serial_number.value}: {e}")
+    if len(plates) == 0:
+        print("No steel plate could be loaded from the test data.")
+        return
+    compiler = RuleCompiler()
+    start = time.perf_counter()
+    for _, rules in plates:
+        compiler.compile(rules)
+    compile_time = time.perf_counter() - start
+    interpreted_time, interpreted_verdicts = run(plates, iterations, compiled=False)
+    compiled_time, compiled_verdicts = run(plates, iterations, compiled=True)
+    rebuilt_time, rebuilt_verdicts = run(plates, iterations, compiled=True, new_rules=True)
+    rule_space = RuleSpace()
+    rule_space.build(list({type(rule_maker): rule_maker for _, rule_maker in rule_makers}.values()))
+    space_interpreted_time, space_interpreted_verdicts = run_rule_space(rule_makers, rule_space, iterations, False)
+    space_compiled_time, space_compiled_verdicts = run_rule_space(rule_makers, rule_space, iterations, True)
+    assert interpreted_verdicts == compiled_verdicts == rebuilt_verdicts == space_interpreted_verdicts == \
+           space_compiled_verdicts, \
+        "The compiled verification gives different verdicts."
+    count = len(plates) * iterations
+    print(f"Steel plates: {len(plates)}, rule sets compiled: {len(compiler)} in {compile_time * 1000:.1f} ms")
+    print(f"Interpreted: {interpreted_time / count * 1e6:8.2f} us per steel plate")
+    print(f"Compiled:    {compiled_time / count * 1e6:8.2f} us per steel plate "
+          f"(x{interpreted_time / compiled_time:.2f})")
+    print(f"Compiled, new rule objects for every steel plate (lookup by signature): "
+          f"{rebuilt_time / count * 1e6:8.2f} us per steel plate (x{interpreted_time / rebuilt_time:.2f})")
+    print(f"Rule space, interpreted: {space_interpreted_time / count * 1e6:8.2f} us per steel plate")
+    print(f"Rule space, compiled:    {space_compiled_time / count * 1e6:8.2f} us per steel plate "
+          f"(x{space_interpreted_time / space_compiled_time:.2f})")
+
+
+if __name__ == '__main__':
+    main()
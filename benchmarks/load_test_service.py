@@ -0,0 +1,100 @@
+# Load test of the verification service (certificate_service): sends the certificates of test_suites/test_data from
+# concurrent clients and prints the throughput, the latency percentiles and the refused requests. The service is started
+# on a free port unless the URL of a running one is given.
+#
+# Usage: python benchmarks/load_test_service.py [--url http://127.0.0.1:8000] [--clients 8] [--requests 64]
+#                                               [--workers N] [--upload]
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA = os.path.join(ROOT, 'test_suites', 'test_data')
+
+
+def start_service(workers: int) -> Tuple[subprocess.Popen, str]:
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        port = free_socket.getsockname()[1]
+    # The output of the service is discarded, it would fill the pipe otherwise
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'certificate_service.py'), '--port', str(port), '--workers', str(workers)],
+        stdout=subprocess.DEVNULL, cwd=ROOT
+    )
+    url = f"http://127.0.0.1:{port}"
+    # The service listens once its workers are warm
+    while process.poll() is None:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return process, url
+        except OSError:
+            time.sleep(0.2)
+    raise ValueError(f"The service exited with code {process.returncode}.")
+
+
+def send(url: str, file_path: str, upload: bool) -> Tuple[int, float, str]:
+    if upload:
+        with open(file_path, 'rb') as f:
+            request = urllib.request.Request(f"{url}/verify?file_name={quote(os.path.basename(file_path))}",
+                                             data=f.read(), method='POST')
+    else:
+        request = urllib.request.Request(f"{url}/verify?path={quote(file_path)}", data=b'', method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            status, verdict = response.status, json.load(response)['verdict']
+    except urllib.error.HTTPError as e:
+        status, verdict = e.code, None
+    return status, time.perf_counter() - start, verdict
+
+
+def get_percentile(latencies: List[float], percentile: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else float('nan')
+    return statistics.quantiles(latencies, n=100)[percentile - 1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the certificate verification service.')
+    parser.add_argument('--url', default=None, help='URL of a running service (default: start one)')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--upload', action='store_true', help='upload the files instead of sending their path')
+    arguments = parser.parse_args()
+    # .doc files are converted when they are opened, the service verifies a copy of them
+    file_paths = [
+        os.path.join(TEST_DATA, file_name) for file_name in sorted(os.listdir(TEST_DATA))
+        if file_name.lower().endswith(('.pdf', '.docx', '.doc'))
+    ]
+    service, url = (None, arguments.url) if arguments.url else start_service(arguments.workers)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(arguments.clients) as clients:
+            responses = list(clients.map(
+                lambda index: send(url, file_paths[index % len(file_paths)], arguments.upload),
+                range(arguments.requests)
+            ))
+        elapsed = time.perf_counter() - start
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+    latencies = sorted(latency for status, latency, _ in responses if status == 200)
+    print(f"{len(responses)} requests from {arguments.clients} clients in {elapsed:.2f} s "
+          f"({len(responses) / elapsed:.1f} requests/s)")
+    print(f"Statuses: {dict(sorted((status, [r[0] for r in responses].count(status)) for status, _, _ in responses))}")
+    print(f"Verdicts: {sorted(set(verdict for _, _, verdict in responses if verdict is not None))}")
+    if latencies:
+        print(f"Latency: p50 {get_percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p95 {get_percentile(latencies, 95) * 1000:.1f} ms, p99 {get_percentile(latencies, 99) * 1000:.1f} ms")
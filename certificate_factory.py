@@ -7,6 +7,7 @@ from common import PdfFile, Specification, Thickness, SerialNumbers, SteelPlate,
     PositionDirectionImpact, Temperature, ImpactEnergy, PlateNo, BatchNo, Quantity, CertificateFile, DocxFile, \
     SerialNumber, CommonUtils, TableSearchType, Certificate, SingletonABCMeta, Direction, SteelMakingType
 from dataclasses import dataclass
+from instrumentation import instrument_methods, instrumented, set_attributes
 
 # from certificate_verification import BaoSteelRuleMaker, RuleMaker
 from certificate_verification import RuleMaker, BaoSteelRuleMaker, LongTengRuleMaker
@@ -16,7 +17,6 @@ from certificate_verification import RuleMaker, BaoSteelRuleMaker, LongTengRuleM
 # object because the forms BAOSHAN deliver have them in the certificate level, so at first we read them and put them in
 # the certificate object, and then copy them to each SteelPlate object (in a way like broadcasting) the certificate
 # contains.
-from output_utilities.output_excel import write_multiple_certificates_to_excel
 
 
 @dataclass
@@ -33,6 +33,10 @@ class LongTengCertificate(Certificate):
     delivery_condition: Optional[DeliveryCondition]
 
 
+# The rows at the top of a LongTeng table, with the certificate number
+HEADER_ROWS = 3
+
+
 # Here the term of factory is not related to the steel plant, it is purely the concept of Factory Method design pattern.
 # The pattern improves the code loosely coupled for better maintainability and extensibility.
 # This class contains the factory method act as the creator of the certificates, and it must be instantiated by
@@ -43,6 +47,12 @@ class CertificateFactory(metaclass=SingletonABCMeta):
     def read(self, file: CertificateFile) -> List[Certificate]:
         pass
 
+    # Only reads the certificate numbers, e.g. to find the certificates which have already been verified. The file may
+    # be opened with header_only (see CertificateFile), the tables which are not needed are not extracted.
+    @abstractmethod
+    def read_certificate_nos(self, file: CertificateFile) -> List[str]:
+        pass
+
     @abstractmethod
     def get_rule_maker(self) -> RuleMaker:
         pass
@@ -60,6 +70,16 @@ class LongTengCertificateFactory(CertificateFactory):
     def get_verifier(self) -> LongTengCertificateVerifier:
         return LongTengCertificateVerifier()
 
+    def read_certificate_nos(self, file: DocxFile) -> List[str]:
+        # The number is in the header rows of each table, the other rows are only read if it is not found there
+        certificate_nos = []
+        for cert_index in range(file.get_table_count()):
+            table = file.get_table(cert_index, HEADER_ROWS)
+            if CommonUtils.search_table(table, '质保书编号', TableSearchType.REMOVE_LINE_BREAK_CONTAIN) is None:
+                table = file.get_table(cert_index)
+            certificate_nos.append(self.extract_certificate_no(file.file_path, cert_index, table))
+        return certificate_nos
+
     def read(self, file: DocxFile) -> List[LongTengCertificate]:
         certificate_list = []
         for cert_index, table in enumerate(file.tables):
@@ -680,6 +700,8 @@ class LongTengCertificateFactory(CertificateFactory):
             )
         x_coordinate = coordinates[0] + 1
         y_coordinate = coordinates[1]
+        # The cells after the title row, more of them than the 4 expected values for extra impact test columns
+        set_attributes(impact_row_cells=len(table[x_coordinate]) - y_coordinate)
         expected_title_values = ['1', '2', '3', 'Avg']
         for title_index, title_value in enumerate(expected_title_values):
             LongTengCertificateFactory.extract_impact_energy(file_path, cert_index, table, steel_plates, title_value,
@@ -762,6 +784,9 @@ class BaoSteelCertificateFactory(CertificateFactory):
     def get_verifier(self) -> BaoSteelCertificateVerifier:
         return BaoSteelCertificateVerifier()
 
+    def read_certificate_nos(self, file: PdfFile) -> List[str]:
+        return [BaoSteelCertificateFactory.extract_certificate_no(file)]
+
     def read(self, file: PdfFile) -> List[Certificate]:
         certificate_no = BaoSteelCertificateFactory.extract_certificate_no(file)
         specification = BaoSteelCertificateFactory.extract_specification(file)
@@ -793,6 +818,7 @@ class BaoSteelCertificateFactory(CertificateFactory):
         return [certificate]
 
     @staticmethod
+    @instrumented('extract.non_test_lot_no_map')
     def generate_non_test_lot_no_map(pdf_file: PdfFile, serial_numbers: SerialNumbers) -> Dict[int, int]:
         # The number is always in the second table
         _, data_table = pdf_file.tables
@@ -801,8 +827,10 @@ class BaoSteelCertificateFactory(CertificateFactory):
         x_coordinate = serial_numbers.x_coordinate
         y_coordinate = serial_numbers.y_coordinate + 1
 
-        matching_index_gen = (index for index, item in enumerate(data_table[x_coordinate][y_coordinate].split('\n')) if
-                              'Test Lot No:' not in item)
+        plate_no_lines = data_table[x_coordinate][y_coordinate].split('\n')
+        set_attributes(plate_no_lines=len(plate_no_lines),
+                       test_lot_no_lines=len([item for item in plate_no_lines if 'Test Lot No:' in item]))
+        matching_index_gen = (index for index, item in enumerate(plate_no_lines) if 'Test Lot No:' not in item)
 
         non_test_lot_no_map: Dict[int, int] = dict()
 
@@ -890,6 +918,7 @@ class BaoSteelCertificateFactory(CertificateFactory):
             serial_numbers=serial_numbers,
             steel_plates=steel_plates
         )
+        set_attributes(plate_count=len(steel_plates), impact_test_count=impact_test_count)
         if impact_test_count > 0:
             BaoSteelCertificateFactory.extract_position_direction_impact(
                 pdf_file=pdf_file,
@@ -1920,7 +1949,7 @@ class BaoSteelCertificateFactory(CertificateFactory):
     def extract_certificate_no(pdf_file: PdfFile) -> str:
         # Hardcode here, the specification information is always in the first table:
         table_index = 0
-        table = pdf_file.tables[table_index]
+        table = pdf_file.get_table(table_index)
         # 遍历这张表格
         coordinates = CommonUtils.search_table(table, 'CERTIFICATENO.',
                                                search_type=TableSearchType.REMOVE_LINE_BREAK_CONTAIN)
@@ -2031,7 +2060,13 @@ class CertificateFactoryRegister:
         return certificate_factory
 
 
+# Each extract_* step in its own span, e.g. extract.chemical_elements (see instrumentation)
+instrument_methods(LongTengCertificateFactory, 'extract_', 'extract')
+instrument_methods(BaoSteelCertificateFactory, 'extract_', 'extract')
+
 if __name__ == '__main__':
+    from output_utilities.output_excel import write_multiple_certificates_to_excel
+
     test_file = r'C:\Users\jjli\Documents\CloudStation\Lab\Python\Work\Maritime\Document\DNVGL质保书样本.docx'
     with DocxFile(test_file) as docx_file:
         factory = LongTengCertificateFactory()
@@ -0,0 +1,262 @@
+import argparse
+import dataclasses
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+from enum import Enum, unique
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import common
+from certificate_processor import FileResult, BatchResult, BatchRouter, ProcessOptions, list_certificate_files, \
+    read_and_verify, get_destination, add_result, write_summaries, open_passed_workbook, add_option_arguments, \
+    get_options, get_metrics_exporter
+from file_router import get_free_name
+
+# Batch processing with a job journal, so that a batch which died halfway can be resumed. The journal is a SQLite
+# database (in WAL mode, the worker processes write to it too) with one row per certificate file and its state:
+#
+#     QUEUED -> PARSED -> VERIFIED -> ROUTED -> REPORTED
+#
+# The result of the verification (the certificates with their annotations, or the exception message) is stored with
+# the VERIFIED state. The name the file is given in its destination is stored with it before the file is moved. On
+# resume, the files already verified are routed from their stored result instead of being read again (only their
+# reports are written if the file is already in its destination), the routed ones are skipped, and the summary
+# workbooks are rebuilt from the stored results of the batch.
+#
+# The results are pickled, so a journal can only be resumed by the version of the code which wrote it: the journal
+# records JOURNAL_VERSION and the fields of the pickled classes, and is refused with another version.
+#
+#     python certificate_journal.py run|resume [directory] [--workers N] [--journal FILE]
+#
+# The other options of certificate_processor apply to the files read in this run (see ProcessOptions).
+
+JOURNAL_FILE = 'journal.sqlite3'
+# Incremented when the tables change
+JOURNAL_VERSION = 2
+
+
+@unique
+class JobState(Enum):
+    QUEUED = 1
+    PARSED = 2
+    VERIFIED = 3
+    ROUTED = 4
+    REPORTED = 5
+
+
+def get_result_format() -> str:
+    # The fields of FileResult and of the classes of the certificates, which are pickled with the results
+    classes = [FileResult] + [value for value in vars(common).values() if dataclasses.is_dataclass(value)]
+    fields = [
+        f"{value.__module__}.{value.__qualname__}({','.join(field.name for field in dataclasses.fields(value))})"
+        for value in classes
+    ]
+    return hashlib.sha256(';'.join(sorted(fields)).encode()).hexdigest()
+
+
+class JobJournal:
+
+    def __init__(self, path: str):
+        self.path = path
+        # Autocommit, each state change is a transaction of its own
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.check_version()
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'file_name TEXT PRIMARY KEY, position INTEGER NOT NULL, state TEXT NOT NULL, destination TEXT, '
+            'result BLOB, updated_at REAL NOT NULL)'
+        )
+
+    def check_version(self):
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            tables = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+            if version == 0 and tables == 0:
+                # A new journal
+                self.connection.execute('CREATE TABLE journal (result_format TEXT NOT NULL)')
+                self.connection.execute('INSERT INTO journal (result_format) VALUES (?)', (get_result_format(),))
+                self.connection.execute(f"PRAGMA user_version = {JOURNAL_VERSION}")
+                return
+            if version != JOURNAL_VERSION:
+                raise ValueError(
+                    f"The journal {self.path} has version {version}, expected version {JOURNAL_VERSION}: resume it "
+                    f"with the version of certificate_journal which wrote it, or delete it."
+                )
+            if self.connection.execute('SELECT result_format FROM journal').fetchone()[0] != get_result_format():
+                raise ValueError(
+                    f"The results of the journal {self.path} were stored by another version of FileResult or of the "
+                    f"certificates: resume it with the version of certificate_journal which wrote it, or delete it."
+                )
+
+    def close(self):
+        self.connection.close()
+
+    def queue(self, file_names: List[str]):
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            position = self.connection.execute('SELECT COALESCE(MAX(position), 0) FROM jobs').fetchone()[0]
+            for file_name in file_names:
+                position += 1
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO jobs (file_name, position, state, updated_at) VALUES (?, ?, ?, ?)',
+                    (file_name, position, JobState.QUEUED.name, time.time())
+                )
+
+    def set_state(self, file_name: str, state: JobState, result: Optional[FileResult] = None):
+        if result is None:
+            self.connection.execute(
+                'UPDATE jobs SET state = ?, updated_at = ? WHERE file_name = ?', (state.name, time.time(), file_name)
+            )
+        else:
+            self.connection.execute(
+                'UPDATE jobs SET state = ?, destination = ?, result = ?, updated_at = ? WHERE file_name = ?',
+                (state.name, get_destination(result), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL),
+                 time.time(), file_name)
+            )
+
+    def get_states(self) -> Dict[str, JobState]:
+        return {
+            file_name: JobState[state]
+            for file_name, state in self.connection.execute('SELECT file_name, state FROM jobs ORDER BY position')
+        }
+
+    def get_result(self, file_name: str) -> Optional[FileResult]:
+        row = self.connection.execute('SELECT result FROM jobs WHERE file_name = ?', (file_name,)).fetchone()
+        return pickle.loads(row[0]) if row is not None and row[0] is not None else None
+
+    def get_results(self) -> Iterator[Tuple[str, FileResult]]:
+        # The stored results of the batch, in the order the files were queued, loaded one at a time
+        for file_name, result in self.connection.execute(
+                'SELECT file_name, result FROM jobs WHERE result IS NOT NULL ORDER BY position'):
+            yield file_name, pickle.loads(result)
+
+    def get_unfinished_count(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM jobs WHERE state != ?', (JobState.REPORTED.name,)
+        ).fetchone()[0]
+
+    def set_reported(self):
+        self.connection.execute(
+            'UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?',
+            (JobState.REPORTED.name, time.time(), JobState.ROUTED.name)
+        )
+
+    def remove(self, file_name: str):
+        self.connection.execute('DELETE FROM jobs WHERE file_name = ?', (file_name,))
+
+    def clear(self):
+        self.connection.execute('DELETE FROM jobs')
+
+
+# The connections of the current process, a forked worker must not use the connection of its parent
+journals: Dict[Tuple[int, str], JobJournal] = dict()
+
+
+def get_journal(path: str) -> JobJournal:
+    key = (os.getpid(), path)
+    if key not in journals:
+        journals[key] = JobJournal(path)
+    return journals[key]
+
+
+def read_and_verify_journaled(journal_path: str, file_path: str, duplicates_path: Optional[str] = None) -> FileResult:
+    journal = get_journal(journal_path)
+    file_name = os.path.basename(file_path)
+    result = read_and_verify(file_path, on_read=lambda _: journal.set_state(file_name, JobState.PARSED),
+                             duplicates_path=duplicates_path)
+    journal.set_state(file_name, JobState.VERIFIED, result)
+    return result
+
+
+def set_routed_name(journal: JobJournal, directory: str, result: FileResult):
+    # Journaled before the file is moved, so that the move can be found again if the batch dies before it is recorded
+    result.routed_name = get_free_name(os.path.join(directory, get_destination(result)), result.file_name)
+    journal.set_state(result.file_name, JobState.VERIFIED, result)
+
+
+def route_result(router: BatchRouter, journal: JobJournal, result: FileResult, batch_result: BatchResult):
+    # The file may have been moved already if the batch died between the move and the state update, then only its
+    # reports are written
+    if os.path.exists(os.path.join(router.directory, result.file_name)):
+        set_routed_name(journal, router.directory, result)
+        router.route(result, batch_result)
+    elif result.routed_name is not None and \
+            os.path.exists(os.path.join(router.directory, get_destination(result), result.routed_name)):
+        router.route(result, batch_result, moved=True)
+    else:
+        print(f"{result.file_name} is neither in {router.directory} nor in {get_destination(result)}, skipped.")
+    journal.set_state(result.file_name, JobState.ROUTED, result)
+
+
+def rebuild_reports(directory: str, journal: JobJournal) -> BatchResult:
+    batch_result = BatchResult()
+    with open_passed_workbook(directory) as passed_workbook:
+        for _, result in journal.get_results():
+            add_result(result, batch_result, passed_workbook)
+    write_summaries(directory, batch_result)
+    return batch_result
+
+
+def process(directory: str = '.', options: Optional[ProcessOptions] = None, journal_path: Optional[str] = None,
+            resume: bool = False) -> BatchResult:
+    router = BatchRouter(directory, options)
+    directory = router.directory
+    journal_path = os.path.abspath(journal_path or os.path.join(directory, JOURNAL_FILE))
+    with router:
+        journal = get_journal(journal_path)
+        if not resume:
+            unfinished_count = journal.get_unfinished_count()
+            if unfinished_count > 0:
+                raise ValueError(
+                    f"The journal {journal_path} has {unfinished_count} unfinished files, resume the batch or delete "
+                    f"the journal to start a new one."
+                )
+            journal.clear()
+        journal.queue(list_certificate_files(directory))
+        states = journal.get_states()
+        # The summaries are rebuilt from the journal
+        routed = BatchResult()
+        # Verified before the batch died: routed from the stored result
+        for file_name, state in states.items():
+            if state == JobState.VERIFIED:
+                print(f"\n\nRouting file {file_name} from the journal ...")
+                route_result(router, journal, journal.get_result(file_name), routed)
+        file_names = []
+        for file_name, state in states.items():
+            if state in (JobState.QUEUED, JobState.PARSED):
+                if os.path.exists(os.path.join(directory, file_name)):
+                    file_names.append(file_name)
+                else:
+                    # Removed from the directory, or a .doc file converted to .docx (queued by its new name)
+                    journal.remove(file_name)
+        for file_name, result in router.route_files(
+                file_names, routed, function=functools.partial(read_and_verify_journaled, journal_path),
+                on_verified=functools.partial(set_routed_name, journal, directory)):
+            # With the name of the routed file, for the summaries
+            journal.set_state(file_name, JobState.ROUTED, result)
+        batch_result = rebuild_reports(directory, journal)
+        journal.set_reported()
+    return batch_result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the certificate files of a directory with a job journal.')
+    parser.add_argument('command', choices=['run', 'resume'])
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--journal', default=None, help=f"journal file (default: {JOURNAL_FILE} in the directory)")
+    add_option_arguments(parser)
+    arguments = parser.parse_args()
+    options = get_options(arguments)
+    with get_metrics_exporter(arguments, options):
+        batch = process(arguments.directory, options, journal_path=arguments.journal,
+                        resume=arguments.command == 'resume')
+    print(
+        f"\n{len(batch.passed_certificate_nos)} certificates passed, {len(batch.failed_files)} files failed, "
+        f"{len(batch.certificates_with_exception)} files with exception."
+    )
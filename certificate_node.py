@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+from certificate_processor import BatchResult, BatchRouter, ProcessOptions, list_certificate_files, \
+    write_summaries, open_passed_workbook, get_pool_context, warm_up, add_option_arguments, get_options, \
+    get_metrics_exporter
+
+# Distribution of the certificate files of a shared intake directory between several hosts, without a broker: each
+# node claims a file by creating its lease file with O_CREAT | O_EXCL, which is atomic on local disks and on NFS and
+# SMB shares (SQLite locking is not reliable on them), then verifies and routes it like certificate_processor:
+#
+#     <intake>/.leases/<file name>.lease      {"node": ..., "token": ..., "pid": ..., "acquired_at": ...}
+#
+# The owner of a lease touches it every heartbeat_seconds while it reads the file. A lease not touched for
+# lease_seconds is expired, its node is considered dead: another node removes it and claims the file again (under a
+# <file name>.lease.reclaim lock, so that only one node reclaims it). A node which lost its lease does not route its
+# result. The expiry compares the modification time set by the file server with the clock of the node, lease_seconds
+# must stay well above the clock skew between the hosts.
+#
+# Each node writes its own summaries (PASS_<node>.xlsx and EXCEPTION_<node>.xlsx) once the intake is empty. A node
+# claims up to workers files at a time and verifies them in one pool, forked when the node starts (like
+# certificate_watcher), with the options of certificate_processor (see ProcessOptions). Each file is routed and its
+# lease released as soon as it is verified.
+#
+#     python certificate_node.py <intake> [--node NAME] [--lease SECONDS] [--heartbeat SECONDS]
+
+LEASE_DIRECTORY = '.leases'
+
+
+class Lease:
+
+    def __init__(self, path: str, token: str):
+        self.path = path
+        self.token = token
+
+    def heartbeat(self) -> bool:
+        # False once the lease was reclaimed by another node
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return self.is_held()
+
+    def is_held(self) -> bool:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)['token'] == self.token
+        except (FileNotFoundError, ValueError, KeyError):
+            return False
+
+    def release(self):
+        if self.is_held():
+            os.remove(self.path)
+
+    @contextmanager
+    def keep_alive(self, heartbeat_seconds: float):
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(heartbeat_seconds) and self.heartbeat():
+                pass
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stopped.set()
+            thread.join()
+
+
+class LeaseDirectory:
+
+    def __init__(self, directory: str, node: str, lease_seconds: float = 60):
+        self.directory = directory
+        self.node = node
+        self.lease_seconds = lease_seconds
+        self.lease_directory = os.path.join(directory, LEASE_DIRECTORY)
+        os.makedirs(self.lease_directory, exist_ok=True)
+
+    def get_lease_path(self, file_name: str) -> str:
+        return os.path.join(self.lease_directory, f"{file_name}.lease")
+
+    def is_expired(self, path: str) -> bool:
+        try:
+            return time.time() - os.stat(path).st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def create(self, path: str) -> Optional[Lease]:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        token = uuid.uuid4().hex
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            json.dump({'node': self.node, 'token': token, 'pid': os.getpid(), 'acquired_at': time.time()}, f)
+        return Lease(path, token)
+
+    def reclaim(self, path: str) -> Optional[Lease]:
+        lock_path = f"{path}.reclaim"
+        # Left by a node which died while reclaiming
+        if self.is_expired(lock_path):
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        try:
+            # Checked again under the lock, another node may have reclaimed it in between
+            if not self.is_expired(path):
+                return None
+            print(f"Reclaiming the expired lease {os.path.basename(path)} ...")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return self.create(path)
+        finally:
+            os.remove(lock_path)
+
+    def try_claim(self, file_name: str) -> Optional[Lease]:
+        path = self.get_lease_path(file_name)
+        lease = self.create(path)
+        if lease is None and self.is_expired(path):
+            lease = self.reclaim(path)
+        if lease is None:
+            return None
+        # Routed by another node since the directory was listed
+        if not os.path.exists(os.path.join(self.directory, file_name)):
+            lease.release()
+            return None
+        return lease
+
+
+class CertificateNode:
+
+    def __init__(self, directory: str, node: Optional[str] = None, lease_seconds: float = 60,
+                 heartbeat_seconds: float = 10, poll_seconds: float = 1, options: Optional[ProcessOptions] = None):
+        self.router = BatchRouter(directory, options)
+        self.directory = self.router.directory
+        self.node = node or f"{socket.gethostname()}-{os.getpid()}"
+        self.leases = LeaseDirectory(self.directory, self.node, lease_seconds)
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.workers = self.router.options.workers or os.cpu_count() or 1
+        self.pool = None
+        self.batch_result = BatchResult()
+        # PASS_<node>.xlsx, written while the node runs
+        self.passed_workbook = None
+        self.processed_files = []
+
+    def claim_files(self, file_names: List[str]) -> Dict[str, Lease]:
+        # Up to workers files, in the order of the intake
+        leases = dict()
+        for file_name in file_names:
+            if len(leases) >= self.workers:
+                break
+            lease = self.leases.try_claim(file_name)
+            if lease is not None:
+                print(f"\n\n[{self.node}] Processing file {file_name} ...")
+                leases[file_name] = lease
+        return leases
+
+    def process_files(self, leases: Dict[str, Lease]):
+        file_names = list(leases)
+        # Each lease is kept alive until its file is routed
+        heartbeats = {file_name: ExitStack() for file_name in file_names}
+        try:
+            for file_name in file_names:
+                heartbeats[file_name].enter_context(leases[file_name].keep_alive(self.heartbeat_seconds))
+            for index, result in self.router.verify_files(file_names, pool=self.pool):
+                file_name = file_names[index]
+                heartbeats[file_name].close()
+                lease = leases[file_name]
+                if not lease.is_held():
+                    print(f"[{self.node}] Lost the lease of {file_name}, another node processes it.")
+                    continue
+                self.router.route(result, self.batch_result, self.passed_workbook)
+                self.processed_files.append(file_name)
+                lease.release()
+        finally:
+            for heartbeat in heartbeats.values():
+                heartbeat.close()
+
+    def start(self):
+        # Forked warm, after the hooks are registered so that the workers create the spans too. The governed workers
+        # are kept between the rounds too.
+        self.router.start()
+        warm_up()
+        if self.workers > 1:
+            self.pool = get_pool_context().Pool(processes=self.workers, initializer=warm_up)
+        if self.router.options.governor is not None:
+            self.router.options.governor.keep_workers()
+
+    def stop(self, report: bool = True):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.router.options.governor is not None:
+            self.router.options.governor.stop_workers()
+        self.router.stop(report)
+
+    def run(self) -> BatchResult:
+        # Processes the files of the intake until it is empty, the files leased by the other nodes are waited for
+        self.start()
+        try:
+            with open_passed_workbook(self.directory, suffix=f"_{self.node}") as self.passed_workbook:
+                while file_names := list_certificate_files(self.directory):
+                    leases = self.claim_files(file_names)
+                    if leases:
+                        self.process_files(leases)
+                    else:
+                        time.sleep(self.poll_seconds)
+            self.passed_workbook = None
+            write_summaries(self.directory, self.batch_result, suffix=f"_{self.node}")
+        except BaseException:
+            self.stop(report=False)
+            raise
+        self.stop()
+        return self.batch_result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the certificate files of an intake shared between hosts.')
+    parser.add_argument('directory')
+    parser.add_argument('--node', default=None, help='name of the node (default: <host name>-<pid>)')
+    parser.add_argument('--lease', type=float, default=60, help='seconds after which a lease not renewed expires')
+    parser.add_argument('--heartbeat', type=float, default=10, help='seconds between the renewals of a lease')
+    add_option_arguments(parser)
+    arguments = parser.parse_args()
+    options = get_options(arguments)
+    certificate_node = CertificateNode(arguments.directory, arguments.node, arguments.lease, arguments.heartbeat,
+                                       options=options)
+    with get_metrics_exporter(arguments, options):
+        batch = certificate_node.run()
+    print(
+        f"\n[{certificate_node.node}] {len(certificate_node.processed_files)} files processed: "
+        f"{len(batch.passed_certificate_nos)} certificates passed, {len(batch.failed_files)} files failed, "
+        f"{len(batch.certificates_with_exception)} files with exception."
+    )
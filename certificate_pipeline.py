@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, Executor
+from dataclasses import dataclass
+from typing import Optional, Dict, Iterator, Tuple
+
+from certificate_processor import FileResult, BatchResult, BatchRouter, ProcessOptions, list_certificate_files, \
+    get_destination, print_result, move_result, write_failed_certificates, add_result, write_summaries, \
+    open_passed_workbook, add_option_arguments, get_options, get_metrics_exporter
+
+# The batch processing of certificate_processor as an asyncio pipeline of three stages connected by bounded queues:
+#
+#     parse (read and verify, in worker processes) -> route (move the file, write the rows of the passed certificates
+#     and the records) -> report (write the FAIL workbook)
+#
+# The results of the workers are waited for, the files routed and the workbooks written in threads, the event loop only
+# passes the results from one stage to the next. A full queue blocks the stage before it, so a slow disk stops the
+# results from being taken from the workers. Each stage records the time it is busy and the time it is blocked, waiting
+# for room in the queue after it: a parse stage mostly busy means the batch is bound by parsing, a parse stage blocked
+# (with results waiting in front of route or report) means it is bound by I/O. The results are routed and recorded
+# like the ones of certificate_processor (see BatchRouter), in the order of the files (as they complete with a
+# scheduler or a governor), so the summary workbooks are the same as the ones of certificate_processor. The files are
+# read ahead of the routing, so they cannot be looked up in a duplicate index.
+#
+#     python certificate_pipeline.py [directory] [--workers N] [--queue-size N]
+
+STAGES = ('parse', 'route', 'report')
+
+
+@dataclass
+class StageStatistics:
+    items: int = 0
+    busy_seconds: float = 0
+    # Waiting for room in the queue after the stage
+    blocked_seconds: float = 0
+    peak_depth: int = 0
+    depth_samples: int = 0
+    depth_total: int = 0
+
+    def sample(self, depth: int):
+        self.peak_depth = max(self.peak_depth, depth)
+        self.depth_samples += 1
+        self.depth_total += depth
+
+    @property
+    def average_depth(self) -> float:
+        return self.depth_total / self.depth_samples if self.depth_samples else 0
+
+
+class CertificatePipeline:
+
+    def __init__(self, directory: str = '.', options: Optional[ProcessOptions] = None, queue_size: int = 4):
+        self.router = BatchRouter(directory, options)
+        if self.router.options.duplicates is not None:
+            raise ValueError('The pipeline reads the files before the earlier ones are routed, it cannot check them '
+                             'against a duplicate index.')
+        self.directory = self.router.directory
+        self.queue_size = queue_size
+        self.statistics: Dict[str, StageStatistics] = {stage: StageStatistics() for stage in STAGES}
+        self.queues: Dict[str, asyncio.Queue] = dict()
+
+    def queue_depths(self) -> Dict[str, int]:
+        # Number of items waiting in front of each stage
+        return {stage: queue.qsize() for stage, queue in self.queues.items()}
+
+    def sample_depths(self):
+        for stage, depth in self.queue_depths().items():
+            self.statistics[stage].sample(depth)
+
+    async def run_stage(self, stage: str, executor: Executor, function, *args):
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        finally:
+            self.statistics[stage].items += 1
+            self.statistics[stage].busy_seconds += time.perf_counter() - start
+
+    async def put(self, stage: str, queue: asyncio.Queue, result: Optional[FileResult]):
+        start = time.perf_counter()
+        await queue.put(result)
+        self.statistics[stage].blocked_seconds += time.perf_counter() - start
+
+    async def parse(self, executor: Executor, results: Iterator[Tuple[int, FileResult]], file_count: int):
+        for _ in range(file_count):
+            _, result = await self.run_stage('parse', executor, next, results)
+            self.sample_depths()
+            await self.put('parse', self.queues['route'], result)
+        await self.queues['route'].put(None)
+
+    def route_result(self, result: FileResult, batch_result: BatchResult, passed_workbook):
+        # In the route thread, the only one which writes the summaries and the records (and the store) while the batch
+        # runs
+        print(f"\n\nProcessing file {result.file_name} ...")
+        print_result(result)
+        move_result(self.directory, result)
+        add_result(result, batch_result, passed_workbook)
+        self.router.record(result)
+
+    async def route(self, executor: Executor, batch_result: BatchResult, passed_workbook, file_count: int):
+        route_queue, report_queue = self.queues['route'], self.queues['report']
+        while (result := await route_queue.get()) is not None:
+            await self.run_stage('route', executor, self.route_result, result, batch_result, passed_workbook)
+            self.router.set_pending(file_count - self.statistics['route'].items)
+            if get_destination(result) == 'FAIL':
+                self.sample_depths()
+                await self.put('route', report_queue, result)
+        await report_queue.put(None)
+
+    async def report(self, executor: Executor):
+        report_queue = self.queues['report']
+        while (result := await report_queue.get()) is not None:
+            await self.run_stage('report', executor, write_failed_certificates, self.directory, result)
+
+    async def run(self) -> BatchResult:
+        batch_result = BatchResult()
+        with self.router:
+            file_names = list_certificate_files(self.directory)
+            # The results waiting for I/O in front of route and report, the files are dispatched to the workers by the
+            # pool (or the scheduler, or the governor) as it takes the results
+            self.queues = {
+                'route': asyncio.Queue(maxsize=self.queue_size),
+                'report': asyncio.Queue(maxsize=self.queue_size)
+            }
+            self.router.set_pending(len(file_names))
+            # Taken from the workers in a thread of its own, where the pool is created
+            results = self.router.verify_files(file_names)
+            with ThreadPoolExecutor(max_workers=1) as parse_executor, \
+                    ThreadPoolExecutor(max_workers=1) as route_executor, \
+                    ThreadPoolExecutor(max_workers=1) as report_executor, \
+                    open_passed_workbook(self.directory) as passed_workbook:
+                tasks = [
+                    asyncio.create_task(self.parse(parse_executor, results, len(file_names))),
+                    asyncio.create_task(self.route(route_executor, batch_result, passed_workbook, len(file_names))),
+                    asyncio.create_task(self.report(report_executor))
+                ]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    # A failing stage would leave the other ones waiting on its queue
+                    for task in tasks:
+                        task.cancel()
+                    raise
+            write_summaries(self.directory, batch_result)
+        return batch_result
+
+    def process(self) -> BatchResult:
+        return asyncio.run(self.run())
+
+    def print_statistics(self):
+        for stage, statistics in self.statistics.items():
+            print(
+                f"{stage}: {statistics.items} items, busy {statistics.busy_seconds:.2f} s, blocked "
+                f"{statistics.blocked_seconds:.2f} s, queue depth {statistics.average_depth:.1f} on average, "
+                f"{statistics.peak_depth} at most"
+            )
+
+
+def process(directory: str = '.', options: Optional[ProcessOptions] = None, queue_size: int = 4) -> BatchResult:
+    return CertificatePipeline(directory, options, queue_size).process()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the certificate files of a directory.')
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='number of results waiting for the route and report stages before parsing blocks')
+    add_option_arguments(parser)
+    arguments = parser.parse_args()
+    options = get_options(arguments)
+    pipeline = CertificatePipeline(arguments.directory, options, arguments.queue_size)
+    with get_metrics_exporter(arguments, options):
+        batch = pipeline.process()
+    print(
+        f"\n{len(batch.passed_certificate_nos)} certificates passed, {len(batch.failed_files)} files failed, "
+        f"{len(batch.certificates_with_exception)} files with exception."
+    )
+    pipeline.print_statistics()
@@ -0,0 +1,624 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Tuple, Optional, Iterator
+
+from batch_scheduler import BatchScheduler
+from certificate_factory import CertificateFactoryRegister, BaoSteelCertificateFactory, LongTengCertificateFactory
+from certificate_verification import BaoSteelRuleMaker, LongTengRuleMaker
+from certificate_verifier import CertificateVerifier, BaoSteelCertificateVerifier, LongTengCertificateVerifier
+from common import Certificate, CommonUtils, SingletonRegistry, LimitMessage, LimitResult
+from duplicate_index import DuplicateIndex, EarlierFile, hash_file, get_duplicate_index
+from file_profiler import FileProfile, SlowestProfiles, PROFILE_DIRECTORY, profile_file, enable_profiling, \
+    disable_profiling
+from file_router import route, get_free_name
+from instrumentation import TimingSummary, add_hook, remove_hook, span
+from limit_statistics import LimitStatistics, collect_limit_statistics, enable_limit_statistics, \
+    disable_limit_statistics
+from metrics import CacheLookups, CertificateMetrics, MetricsExporter, get_cache_lookups, get_cache_lookups_since
+from resource_governor import ResourceGovernor, MEBIBYTE
+from results_store import ResultsStore, get_verified_elements
+from rule_compiler import RuleCompiler
+from rule_space import RuleSpace
+from tracer import Tracer
+
+# Batch processing of the certificate files of a directory: each file is read and verified, then moved to the PASS, FAIL
+# or EXCEPTION subdirectory. The passed certificates are summarized in PASS/PASS.xlsx, written as the files are routed,
+# each failed file gets its own workbook in FAIL, and the files which could not be processed are listed in
+# EXCEPTION/EXCEPTION.xlsx.
+#
+# Reading and verification run in a pool of worker processes. The pool is created (forked where available) after the
+# factories, rule makers and verifiers have been built, so the workers start warm. The results are collected in the
+# order of the files, and the files are routed and the workbooks written by the calling process in that order, so the
+# outcome is the same as a serial run. With a scheduler or a governor, the files are routed as they complete instead,
+# the summaries list them in that order.
+#
+# The other drivers (certificate_journal, certificate_pipeline, certificate_node and certificate_watcher) route the
+# files with the same loop and options, see BatchRouter and ProcessOptions.
+#
+#     python certificate_processor.py [directory] [--workers N]
+
+CERTIFICATE_EXTENSIONS = ('.pdf', '.doc', '.docx')
+DESTINATIONS = ('PASS', 'FAIL', 'EXCEPTION')
+
+
+@dataclass
+class FileResult:
+    # file_name is the name of the file to route, a .doc file is converted to .docx while it is read
+    file_name: str
+    # The name of the file in its destination once it is routed, renamed if the destination had a file with that name
+    routed_name: Optional[str] = None
+    certificates: List[Certificate] = field(default_factory=list)
+    valid_flag: bool = False
+    # The verdict of each steel plate given by the verifier, by certificate (see results_store)
+    plate_flags: List[List[bool]] = field(default_factory=list)
+    exception_message: Optional[str] = None
+    # The class of the exception, e.g. ValueError
+    exception_class: Optional[str] = None
+    steel_plant: Optional[str] = None
+    certificate_nos: List[str] = field(default_factory=list)
+    content_hash: Optional[str] = None
+    # Set for the files already verified (see duplicate_index), which are neither read nor verified again
+    duplicate_of: Optional[EarlierFile] = None
+    # Seconds of the file and of each stage (see instrumentation), only while a hook is registered
+    timings: Optional[Dict[str, float]] = None
+    # Counters of the evaluations of the limits (see limit_statistics), only while they are enabled
+    limit_statistics: Optional[LimitStatistics] = None
+    # The cProfile statistics of the file (see file_profiler), only while profiling is enabled
+    profile: Optional[FileProfile] = None
+    # Lookups in the caches of the rule sets while verifying the file, by cache and hit or miss (see metrics)
+    cache_lookups: CacheLookups = field(default_factory=dict)
+    # When the file was read and verified (see time.time), e.g. for the partitions of plate_archive
+    verified_at: Optional[float] = None
+
+
+@dataclass
+class BatchResult:
+    # Only the numbers of the passed certificates are kept, their rows are streamed to PASS.xlsx (see add_result)
+    passed_certificate_nos: List[str] = field(default_factory=list)
+    failed_files: List[str] = field(default_factory=list)
+    certificates_with_exception: List[Tuple[str, str]] = field(default_factory=list)
+    # File name, name of the earlier file and where it was routed
+    duplicates: List[Tuple[str, str, str]] = field(default_factory=list)
+
+
+# Built once per process by warm_up
+register: Optional[CertificateFactoryRegister] = None
+
+
+def create_register() -> CertificateFactoryRegister:
+    certificate_register = CertificateFactoryRegister()
+    certificate_register.register_factory(steel_plant='BAOSHAN IRON & STEEL CO., LTD.',
+                                          certificate_factory=BaoSteelCertificateFactory())
+    certificate_register.register_factory(steel_plant='CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.',
+                                          certificate_factory=LongTengCertificateFactory())
+    return certificate_register
+
+
+def warm_up():
+    # Builds the factories, rule makers, verifiers and the rule space (if its snapshot exists) of the current process
+    global register
+    if register is None:
+        register = create_register()
+    SingletonRegistry.warm_up(
+        BaoSteelCertificateFactory, LongTengCertificateFactory, BaoSteelRuleMaker, LongTengRuleMaker,
+        CertificateVerifier, BaoSteelCertificateVerifier, LongTengCertificateVerifier, RuleCompiler
+    )
+
+
+def load_rule_space():
+    rule_space = RuleSpace()
+    if len(rule_space) == 0:
+        rule_space.load()
+
+
+SingletonRegistry.add_warm_up_hook(load_rule_space)
+
+
+def list_certificate_files(directory: str) -> List[str]:
+    # Sorted, so that the order of the files (and of the certificates in the workbooks) doesn't depend on the file
+    # system
+    with os.scandir(directory) as it:
+        return sorted(
+            entry.name for entry in it if entry.is_file() and entry.name.lower().endswith(CERTIFICATE_EXTENSIONS)
+        )
+
+
+def read_and_verify(file_path: str, on_read: Optional[Callable[[FileResult], None]] = None,
+                    duplicates_path: Optional[str] = None) -> FileResult:
+    # With the path of a duplicate index, the file is hashed and its bytes are looked up, then its certificate numbers
+    # are looked up from the header of the file (see CertificateFile), before the tables are extracted
+    warm_up()
+    result = FileResult(file_name=os.path.basename(file_path))
+    with span('file', file_name=result.file_name) as file_span:
+        with profile_file() as result.profile:
+            try:
+                if duplicates_path is not None:
+                    result.content_hash = hash_file(file_path)
+                    result.duplicate_of = get_duplicate_index(duplicates_path).find_by_hash(result.content_hash)
+                if result.duplicate_of is None:
+                    with CommonUtils.open_file(file_path, header_only=duplicates_path is not None) as cert_file:
+                        factory = register.get_factory(steel_plant=cert_file.steel_plant)
+                        result.steel_plant = cert_file.steel_plant
+                        if duplicates_path is not None:
+                            result.certificate_nos = factory.read_certificate_nos(cert_file)
+                            result.duplicate_of = get_duplicate_index(duplicates_path).find_by_certificate_nos(
+                                result.steel_plant, result.certificate_nos
+                            )
+                        if result.duplicate_of is None:
+                            cert_file.extract_tables()
+                            result.certificates = factory.read(file=cert_file)
+                if result.duplicate_of is None:
+                    result.certificate_nos = [certificate.certificate_no for certificate in result.certificates]
+                    if on_read is not None:
+                        on_read(result)
+                    rule_space = RuleSpace()
+                    cache_lookups = get_cache_lookups()
+                    with collect_limit_statistics(result.steel_plant) as result.limit_statistics:
+                        # The rule sets of a loaded rule space are the same objects for all the files, each one is
+                        # compiled once (see rule_compiler). The limits are only counted when they are interpreted.
+                        compiled = len(rule_space) > 0 and result.limit_statistics is None
+                        result.plate_flags = [
+                            CertificateVerifier.verify_plates(certificate, factory.get_rule_maker(), compiled=compiled,
+                                                              rule_space=rule_space if len(rule_space) > 0 else None)
+                            for certificate in result.certificates
+                        ]
+                    result.valid_flag = all([all(flags) for flags in result.plate_flags])
+                    result.cache_lookups = get_cache_lookups_since(cache_lookups)
+            except Exception as e:
+                result.exception_message = str(e)
+                result.exception_class = type(e).__name__
+        if file_span is not None:
+            file_span.attributes.update(
+                steel_plant=result.steel_plant, certificate_count=len(result.certificates),
+                plate_count=sum([len(certificate.steel_plates) for certificate in result.certificates]),
+                verdict=get_destination(result), exception_message=result.exception_message
+            )
+    if file_span is not None:
+        result.timings = dict(file_span.stages, file=file_span.duration)
+    if not os.path.exists(file_path) and os.path.exists(f"{file_path}x"):
+        result.file_name = f"{result.file_name}x"
+    result.verified_at = time.time()
+    return result
+
+
+def get_failed_result(file_path: str, reason: str) -> FileResult:
+    # The result of a file given up by the resource governor
+    return FileResult(file_name=os.path.basename(file_path), exception_message=reason,
+                      exception_class='ResourceGovernor')
+
+
+def get_pool_context():
+    # Forked workers inherit the warm factories, rule makers and caches of the parent
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+
+def read_and_verify_files(file_paths: List[str], workers: Optional[int] = None,
+                          function: Callable[[str], FileResult] = read_and_verify,
+                          scheduler: Optional[BatchScheduler] = None,
+                          governor: Optional[ResourceGovernor] = None,
+                          pool: Optional[multiprocessing.pool.Pool] = None) -> Iterator[Tuple[int, FileResult]]:
+    # Yields the index of each file with its result, in the order of the given files. With one worker the files are
+    # processed in this process. With a scheduler, the files are dispatched in the order of the scheduler instead (see
+    # batch_scheduler). With a governor, the files always run in worker processes, killed beyond its limits (see
+    # resource_governor). With either, the files are yielded as they complete. With a pool kept by the caller across
+    # batches (see certificate_watcher and certificate_node), the files are processed by its workers, unless they are
+    # governed.
+    workers = min(workers or os.cpu_count() or 1, len(file_paths))
+    if pool is None:
+        warm_up()
+    if scheduler is not None:
+        yield from scheduler.run(file_paths, max(workers, 1), function, get_pool_context(), warm_up, governor,
+                                 get_failed_result, pool)
+        print(f"\nSchedule: {scheduler.report}")
+        return
+    if governor is not None:
+        yield from governor.run(file_paths, max(workers, 1), function, get_failed_result, get_pool_context(), warm_up)
+        return
+    if pool is not None:
+        yield from enumerate(pool.imap(function, file_paths, chunksize=1))
+        return
+    if workers <= 1:
+        for index, file_path in enumerate(file_paths):
+            yield index, function(file_path)
+        return
+    with get_pool_context().Pool(processes=workers, initializer=warm_up) as pool:
+        yield from enumerate(pool.imap(function, file_paths, chunksize=1))
+
+
+def read_and_verify_unique_files(directory: str, file_names: List[str], workers: Optional[int],
+                                 duplicates: DuplicateIndex,
+                                 scheduler: Optional[BatchScheduler] = None,
+                                 governor: Optional[ResourceGovernor] = None,
+                                 function: Callable[..., FileResult] = read_and_verify,
+                                 pool: Optional[multiprocessing.pool.Pool] = None) -> Iterator[Tuple[int, FileResult]]:
+    # Like read_and_verify_files, but the files already verified are routed as duplicates. The function is given the
+    # path of the index as duplicates_path: the files are hashed by the workers, which look up their bytes and their
+    # certificates in the index before reading them. Each result must be routed by the caller before the next one is
+    # asked for, so that the index has the files routed earlier in the batch, and the duplicates name the routed file.
+    # A file verified while a file with the same bytes or certificates was routed is routed as its duplicate here.
+    results = read_and_verify_files(
+        [os.path.join(directory, file_name) for file_name in file_names], workers,
+        functools.partial(function, duplicates_path=duplicates.path), scheduler, governor, pool
+    )
+    batch_files: Dict[str, FileResult] = dict()
+    batch_certificates: Dict[Tuple[str, str], FileResult] = dict()
+    for index, result in results:
+        earlier_files = [batch_files[result.content_hash]] if result.content_hash in batch_files else []
+        earlier_files.extend([
+            batch_certificates[(result.steel_plant, certificate_no)] for certificate_no in result.certificate_nos
+            if (result.steel_plant, certificate_no) in batch_certificates
+        ])
+        if result.duplicate_of is None and earlier_files:
+            result = FileResult(file_name=result.file_name, steel_plant=result.steel_plant,
+                                certificate_nos=result.certificate_nos, content_hash=result.content_hash,
+                                duplicate_of=get_earlier_file(earlier_files[0]))
+        if result.duplicate_of is None:
+            if result.content_hash is not None:
+                batch_files.setdefault(result.content_hash, result)
+            for certificate_no in result.certificate_nos:
+                batch_certificates.setdefault((result.steel_plant, certificate_no), result)
+        yield index, result
+
+
+def get_earlier_file(result: FileResult) -> EarlierFile:
+    return get_routed_name(result), get_destination(result)
+
+
+def get_destination(result: FileResult) -> str:
+    if result.duplicate_of is not None:
+        return 'DUPLICATE'
+    if result.exception_message is not None:
+        return 'EXCEPTION'
+    return 'PASS' if result.valid_flag else 'FAIL'
+
+
+def print_result(result: FileResult):
+    if result.duplicate_of is not None:
+        print(f"Duplicate of {result.duplicate_of[0]} ({result.duplicate_of[1]})!")
+    elif result.exception_message is not None:
+        print(f"Exception occurred during reading the file!")
+        print(result.exception_message)
+    elif result.valid_flag:
+        print(f"Verification Pass!")
+    else:
+        print(f"Verification Fail!")
+        for certificate in result.certificates:
+            for message in get_failed_messages(certificate):
+                print(message)
+
+
+def get_failed_messages(certificate: Certificate) -> List[str]:
+    # The messages of the failed limits, the only ones rendered (see LimitMessage) and printed since the limits no
+    # longer print each evaluation
+    messages = []
+    for plate in certificate.steel_plates:
+        for element in get_verified_elements(plate):
+            if element.valid_flag or element.message is None:
+                continue
+            parts = element.message.parts if isinstance(element.message, LimitMessage) else (element.message,)
+            messages.extend([str(part) for part in parts if not isinstance(part, LimitResult) or not part.valid_flag])
+    return list(dict.fromkeys(messages))
+
+
+def move_file(directory: str, file_name: str, destination: str, target_name: Optional[str] = None) -> str:
+    # Returns the new path of the file, which is renamed if the destination has a file with the same name
+    return route(os.path.join(directory, file_name), os.path.join(directory, destination), target_name)
+
+
+def move_result(directory: str, result: FileResult):
+    # A routed_name given beforehand (see certificate_journal) is used if it is still free
+    result.routed_name = os.path.basename(
+        move_file(directory, result.file_name, get_destination(result), result.routed_name)
+    )
+
+
+def get_routed_name(result: FileResult) -> str:
+    return result.routed_name or result.file_name
+
+
+def write_failed_certificates(directory: str, result: FileResult):
+    # Named after the routed file, e.g. FAIL/<stem> (1).xlsx for FAIL/<stem> (1).pdf, and never over another workbook.
+    # openpyxl is only imported when a report is written.
+    from output_utilities.output_excel import write_multiple_certificates_to_excel
+
+    file_name = get_free_name(os.path.join(directory, 'FAIL'), f"{os.path.splitext(get_routed_name(result))[0]}.xlsx")
+    write_multiple_certificates_to_excel(
+        result.certificates, sheet_name='FAIL', output_file=os.path.join(directory, 'FAIL', file_name)
+    )
+
+
+def open_passed_workbook(directory: str, suffix: str = ''):
+    # The StreamingCertificateWorkbook of PASS/PASS<suffix>.xlsx, saved when its with block exits without an exception
+    from output_utilities.output_excel import StreamingCertificateWorkbook
+
+    return StreamingCertificateWorkbook(os.path.join(directory, 'PASS', f"PASS{suffix}.xlsx"))
+
+
+def add_result(result: FileResult, batch_result: BatchResult, passed_workbook=None):
+    # The rows of the passed certificates are written to the passed workbook (see open_passed_workbook) if it is given
+    destination = get_destination(result)
+    file_name = get_routed_name(result)
+    if destination == 'DUPLICATE':
+        batch_result.duplicates.append((file_name, result.duplicate_of[0], result.duplicate_of[1]))
+    elif destination == 'EXCEPTION':
+        batch_result.certificates_with_exception.append((file_name, result.exception_message))
+    elif destination == 'PASS':
+        batch_result.passed_certificate_nos.extend([certificate.certificate_no for certificate in result.certificates])
+        if passed_workbook is not None:
+            with span('report.write_passed_certificates'):
+                for certificate in result.certificates:
+                    passed_workbook.write(certificate)
+    else:
+        batch_result.failed_files.append(file_name)
+
+
+def route_file(directory: str, result: FileResult, batch_result: BatchResult, passed_workbook=None):
+    # The file is moved first, the summaries and the FAIL workbook use the name it was given in its destination
+    print_result(result)
+    move_result(directory, result)
+    report_file(directory, result, batch_result, passed_workbook)
+
+
+def report_file(directory: str, result: FileResult, batch_result: BatchResult, passed_workbook=None):
+    # The reports of a file once it is in its destination
+    add_result(result, batch_result, passed_workbook)
+    if get_destination(result) == 'FAIL':
+        write_failed_certificates(directory, result)
+
+
+def create_destinations(directory: str):
+    for destination in DESTINATIONS:
+        os.makedirs(os.path.join(directory, destination), exist_ok=True)
+
+
+def write_summaries(directory: str, batch_result: BatchResult, suffix: str = '',
+                    passed_certificates: Optional[Iterable[Certificate]] = None):
+    # The suffix is added to the names of the summaries, e.g. EXCEPTION_<node>.xlsx for the nodes of certificate_node.
+    # PASS.xlsx is only written here from the given passed certificates, otherwise it is streamed as the files are
+    # routed (see open_passed_workbook).
+    from output_utilities.output_excel import write_multiple_certificates_to_excel, write_certificates_with_exception, \
+        write_duplicates
+
+    if passed_certificates is not None:
+        write_multiple_certificates_to_excel(passed_certificates,
+                                             output_file=os.path.join(directory, 'PASS', f"PASS{suffix}.xlsx"))
+    write_certificates_with_exception(batch_result.certificates_with_exception,
+                                      output_file=os.path.join(directory, 'EXCEPTION', f"EXCEPTION{suffix}.xlsx"))
+    if batch_result.duplicates:
+        write_duplicates(batch_result.duplicates,
+                         output_file=os.path.join(directory, 'DUPLICATE', f"DUPLICATE{suffix}.xlsx"))
+
+
+def store_result(store: Optional[ResultsStore], result: FileResult):
+    if store is not None:
+        # Once the file is routed, under the name it was given in its destination
+        store.add_result(get_routed_name(result), result.certificates, result.plate_flags, result.exception_message)
+
+
+@dataclass
+class ProcessOptions:
+    # The options of a batch, the same for all the drivers (see BatchRouter)
+    # Number of worker processes, by default the number of CPUs
+    workers: Optional[int] = None
+    # The certificates are saved to the results store
+    store: Optional[ResultsStore] = None
+    # The files are checked against (and added to) the duplicate index
+    duplicates: Optional[DuplicateIndex] = None
+    # The files are dispatched by estimated cost and steel plant
+    scheduler: Optional[BatchScheduler] = None
+    # The files running too long or with too much memory are routed to EXCEPTION
+    governor: Optional[ResourceGovernor] = None
+    # JSON lines file of the timing record of each file, the p50/p95/p99 of the stages are printed
+    timings: Optional[str] = None
+    # CSV file of the evaluations of the limits, counted by steel plant and specification and printed
+    limit_statistics: Optional[str] = None
+    # Number of the slowest files whose profiles are written to the PROFILE subdirectory
+    profiles: Optional[int] = None
+    # The spans of each file are written to the TRACE subdirectory as OpenTelemetry JSON
+    trace: bool = False
+    # Updated as the files are routed
+    metrics: Optional[CertificateMetrics] = None
+
+
+class BatchRouter:
+    # The routing loop shared by the drivers. Started before the workers are forked, it registers the hooks and enables
+    # the statistics of the options, so that the workers fill them too. Each result is routed (see route_file), then
+    # recorded in the metrics, the results store, the duplicate index, the timings, the limit statistics and the
+    # profiles, which are written when it is stopped.
+
+    def __init__(self, directory: str, options: Optional[ProcessOptions] = None):
+        self.directory = os.path.abspath(directory)
+        self.options = options or ProcessOptions()
+        self.timing_summary = TimingSummary() if self.options.timings is not None else None
+        self.tracer = Tracer(self.directory) if self.options.trace else None
+        self.limit_statistics = LimitStatistics() if self.options.limit_statistics is not None else None
+        self.slowest_profiles = SlowestProfiles(self.options.profiles) if self.options.profiles is not None else None
+
+    def get_hooks(self):
+        return [hook for hook in (self.timing_summary, self.tracer, self.options.metrics) if hook is not None]
+
+    def start(self):
+        create_destinations(self.directory)
+        for hook in self.get_hooks():
+            add_hook(hook)
+        if self.limit_statistics is not None:
+            enable_limit_statistics()
+        if self.slowest_profiles is not None:
+            enable_profiling()
+
+    def stop(self, report: bool = True):
+        for hook in self.get_hooks():
+            remove_hook(hook)
+        if self.limit_statistics is not None:
+            disable_limit_statistics()
+        if self.slowest_profiles is not None:
+            disable_profiling()
+        if report:
+            self.report()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop(report=exc_type is None)
+
+    def report(self):
+        if self.timing_summary is not None:
+            write_timings(self.options.timings, self.timing_summary)
+        if self.limit_statistics is not None:
+            self.limit_statistics.write_csv(self.options.limit_statistics)
+            print(f"\n{self.limit_statistics}")
+        if self.slowest_profiles is not None:
+            self.slowest_profiles.write(self.directory)
+            print(f"\nProfiles of the slowest files in {os.path.join(self.directory, PROFILE_DIRECTORY)}:\n"
+                  f"{self.slowest_profiles}")
+
+    def set_pending(self, count: int):
+        if self.options.metrics is not None:
+            self.options.metrics.set_pending(count)
+
+    def verify_files(self, file_names: List[str], function: Callable[..., FileResult] = read_and_verify,
+                     pool: Optional[multiprocessing.pool.Pool] = None) -> Iterator[Tuple[int, FileResult]]:
+        # The index of each file of the directory with its result (see read_and_verify_files). With a duplicate index,
+        # each result must be routed before the next one is asked for (see read_and_verify_unique_files).
+        options = self.options
+        if options.duplicates is None:
+            return read_and_verify_files([os.path.join(self.directory, file_name) for file_name in file_names],
+                                         options.workers, function, options.scheduler, options.governor, pool)
+        return read_and_verify_unique_files(self.directory, file_names, options.workers, options.duplicates,
+                                            options.scheduler, options.governor, function, pool)
+
+    def record(self, result: FileResult):
+        options = self.options
+        if options.metrics is not None:
+            options.metrics.record(result, get_destination(result))
+        store_result(options.store, result)
+        # The files with an exception are read again when submitted again
+        if options.duplicates is not None and result.duplicate_of is None and result.exception_message is None:
+            options.duplicates.add(result.content_hash, result.routed_name, get_destination(result),
+                                   result.steel_plant, result.certificate_nos)
+        if self.timing_summary is not None and result.timings is not None:
+            self.timing_summary.add_record(
+                {'file_name': result.file_name, 'verdict': get_destination(result), 'timings': result.timings}
+            )
+        if self.limit_statistics is not None and result.limit_statistics is not None:
+            self.limit_statistics.merge(result.limit_statistics)
+        if self.slowest_profiles is not None and result.profile is not None:
+            self.slowest_profiles.add(result.file_name, result.profile)
+
+    def route(self, result: FileResult, batch_result: BatchResult, passed_workbook=None, moved: bool = False):
+        # With moved, the file is already in its destination, as routed_name (see certificate_journal)
+        if moved:
+            print_result(result)
+            report_file(self.directory, result, batch_result, passed_workbook)
+        else:
+            route_file(self.directory, result, batch_result, passed_workbook)
+        self.record(result)
+
+    def route_files(self, file_names: List[str], batch_result: BatchResult, passed_workbook=None,
+                    function: Callable[..., FileResult] = read_and_verify,
+                    pool: Optional[multiprocessing.pool.Pool] = None,
+                    keep_going: bool = False,
+                    on_verified: Optional[Callable[[FileResult], None]] = None) -> Iterator[Tuple[str, FileResult]]:
+        # Yields the name and the result of each file once it is routed, in the order of verify_files. With keep_going,
+        # a file which cannot be routed (e.g. deleted in the meantime) is logged and skipped instead of stopping.
+        # on_verified is called with each result before the file is moved (see certificate_journal).
+        self.set_pending(len(file_names))
+        for routed, (index, result) in enumerate(self.verify_files(file_names, function, pool), 1):
+            print(f"\n\nProcessing file {file_names[index]} ...")
+            try:
+                if on_verified is not None:
+                    on_verified(result)
+                self.route(result, batch_result, passed_workbook)
+            except Exception as e:
+                if not keep_going:
+                    raise
+                print(f"Failed to route {file_names[index]}: {e.__class__.__name__}: {e}")
+                result = None
+            self.set_pending(len(file_names) - routed)
+            if result is not None:
+                yield file_names[index], result
+
+
+def process(directory: str = '.', options: Optional[ProcessOptions] = None) -> BatchResult:
+    batch_result = BatchResult()
+    with BatchRouter(directory, options) as router:
+        file_names = list_certificate_files(router.directory)
+        with open_passed_workbook(router.directory) as passed_workbook:
+            for _ in router.route_files(file_names, batch_result, passed_workbook):
+                pass
+        write_summaries(router.directory, batch_result)
+    return batch_result
+
+
+def write_timings(timings_path: str, timing_summary: TimingSummary):
+    with open(timings_path, 'w', encoding='utf-8') as f:
+        for record in timing_summary.records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f"\n{timing_summary}")
+
+
+def add_option_arguments(parser: argparse.ArgumentParser):
+    # The arguments of ProcessOptions and of the metrics exporter, shared by the command lines of the drivers
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs, 1 to process serially)')
+    parser.add_argument('--store', default=None, help='SQLite file to save the certificates and verdicts to')
+    parser.add_argument('--duplicates', default=None, help='SQLite file indexing the files already verified')
+    parser.add_argument('--schedule', action='store_true', help='dispatch the longest files first, by steel plant')
+    parser.add_argument('--history', default=None, help='JSON file of the parse times, to estimate the costs')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds after which a file is given up')
+    parser.add_argument('--max-rss', type=int, default=None,
+                        help='MiB of memory growth of a worker above which a file is given up')
+    parser.add_argument('--max-tasks', type=int, default=None, help='files after which a worker is replaced')
+    parser.add_argument('--timings', default=None, help='JSON lines file of the seconds of the stages of each file')
+    parser.add_argument('--limit-statistics', default=None,
+                        help='CSV file of the evaluations, failures and time of each limit, by plant and specification')
+    parser.add_argument('--profile', type=int, default=None, metavar='N',
+                        help='profile each file and keep the profiles of the N slowest files')
+    parser.add_argument('--trace', action='store_true', help='write the spans of each file as OpenTelemetry JSON')
+    parser.add_argument('--metrics-file', default=None, help='file to write the metrics to, in the Prometheus format')
+    parser.add_argument('--metrics-interval', type=float, default=15, help='seconds between the writes of the metrics')
+    parser.add_argument('--metrics-port', type=int, default=None, help='port to serve the metrics on 127.0.0.1')
+
+
+def get_options(arguments: argparse.Namespace) -> ProcessOptions:
+    governed = arguments.timeout is not None or arguments.max_rss is not None or arguments.max_tasks is not None
+    exported = arguments.metrics_file is not None or arguments.metrics_port is not None
+    return ProcessOptions(
+        workers=arguments.workers,
+        store=ResultsStore(arguments.store) if arguments.store else None,
+        duplicates=DuplicateIndex(arguments.duplicates) if arguments.duplicates else None,
+        scheduler=BatchScheduler(arguments.history) if arguments.schedule or arguments.history else None,
+        governor=ResourceGovernor(arguments.timeout, arguments.max_rss and arguments.max_rss * MEBIBYTE,
+                                  arguments.max_tasks) if governed else None,
+        timings=arguments.timings, limit_statistics=arguments.limit_statistics, profiles=arguments.profile,
+        trace=arguments.trace, metrics=CertificateMetrics() if exported else None
+    )
+
+
+def get_metrics_exporter(arguments: argparse.Namespace, options: ProcessOptions) -> MetricsExporter:
+    # Does nothing without a metrics file or port
+    return MetricsExporter(options.metrics or CertificateMetrics(), arguments.metrics_file, arguments.metrics_port,
+                           arguments.metrics_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the certificate files of a directory.')
+    parser.add_argument('directory', nargs='?', default='.')
+    add_option_arguments(parser)
+    arguments = parser.parse_args()
+    options = get_options(arguments)
+    with get_metrics_exporter(arguments, options):
+        batch = process(arguments.directory, options)
+    print(
+        f"\n{len(batch.passed_certificate_nos)} certificates passed, {len(batch.failed_files)} files failed, "
+        f"{len(batch.certificates_with_exception)} files with exception."
+    )
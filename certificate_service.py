@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from certificate_processor import FileResult, read_and_verify, get_destination, get_pool_context, warm_up
+from common import Certificate, SteelPlate, ChemicalElementValue
+from results_store import get_message, get_plate_verdict, get_value
+
+# Local HTTP service verifying certificates on warm workers: the worker processes import the readers and build the
+# factories, rule makers and caches once, instead of once per CLI run. It only listens on 127.0.0.1.
+#
+#     python certificate_service.py [--port 8000] [--workers N] [--max-concurrent N] [--max-pending N]
+#
+#     GET  /health                           {"status": "ok", "workers": ..., "running": ..., "pending": ...}
+#     POST /verify?path=<certificate file>   verifies a file readable by the service
+#     POST /verify?file_name=<name.pdf>      verifies the uploaded body (the name gives the file type)
+#
+# The verdict of the file is PASS, FAIL or EXCEPTION, like the destinations of certificate_processor, with the value,
+# flag and message of each verified field of each steel plate. At most max_concurrent files are verified at once, the
+# requests beyond max_pending waiting ones are refused with 503. An unexpected error answers 500, and a worker dying
+# during a verification (killed, out of memory) replaces the pool of workers for the next requests.
+
+HOST = '127.0.0.1'
+CERTIFICATE_EXTENSIONS = ('.pdf', '.docx', '.doc')
+MAX_UPLOAD_SIZE = 64 * 1024 * 1024
+VERIFIED_FIELDS = [
+    'specification', 'thickness', 'delivery_condition', 'yield_strength', 'tensile_strength', 'elongation',
+    'temperature'
+]
+
+
+def get_annotation(element) -> Dict[str, Any]:
+    value = element.calculated_value if isinstance(element, ChemicalElementValue) else element.value
+    return {'value': value, 'valid': element.valid_flag, 'message': get_message(element)}
+
+
+def get_plate_json(plate: SteelPlate) -> Dict[str, Any]:
+    return {
+        'serial_number': get_value(plate.serial_number),
+        'batch_no': get_value(plate.batch_no),
+        'plate_no': get_value(plate.plate_no),
+        'verdict': get_plate_verdict(plate),
+        'fields': {
+            name: get_annotation(getattr(plate, name)) for name in VERIFIED_FIELDS if getattr(plate, name) is not None
+        },
+        'impact_energy': [
+            dict(get_annotation(energy), test_number=energy.test_number) for energy in plate.impact_energy_list
+        ],
+        'chemistry': {element: get_annotation(value) for element, value in plate.chemical_compositions.items()}
+    }
+
+
+def get_certificate_json(certificate: Certificate) -> Dict[str, Any]:
+    plates = [get_plate_json(plate) for plate in certificate.steel_plates]
+    return {
+        'certificate_no': certificate.certificate_no,
+        'steel_plant': certificate.steel_plant,
+        'verdict': 'PASS' if all([plate['verdict'] == 'PASS' for plate in plates]) else 'FAIL',
+        'steel_plates': plates
+    }
+
+
+def get_result_json(result: FileResult) -> Dict[str, Any]:
+    return {
+        'file_name': result.file_name,
+        'verdict': get_destination(result),
+        'exception_message': result.exception_message,
+        'certificates': [get_certificate_json(certificate) for certificate in result.certificates]
+    }
+
+
+def verify_file(file_path: str) -> Dict[str, Any]:
+    # Runs in the workers, only the JSON of the result is sent back
+    return get_result_json(read_and_verify(file_path))
+
+
+class ServiceError(Exception):
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class CertificateService:
+
+    def __init__(self, port: int = 8000, workers: Optional[int] = None, max_concurrent: Optional[int] = None,
+                 max_pending: Optional[int] = None, max_upload_size: int = MAX_UPLOAD_SIZE):
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or self.workers
+        self.max_pending = self.max_concurrent * 4 if max_pending is None else max_pending
+        self.max_upload_size = max_upload_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.pending = 0
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, mp_context=get_pool_context(), initializer=warm_up)
+
+    async def start(self):
+        # The workers are started and warmed up before the first request
+        self.executor = self.create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, warm_up) for _ in range(self.workers)])
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.server = await asyncio.start_server(self.handle, HOST, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Listening on http://{HOST}:{self.port} with {self.workers} workers", flush=True)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def serve_forever(self):
+        await self.start()
+        serving = asyncio.ensure_future(self.server.serve_forever())
+        try:
+            # SIGTERM stops the workers too (the event loop has no signal handlers on Windows)
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        except (NotImplementedError, AttributeError):
+            pass
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # One request per connection
+        try:
+            try:
+                status, payload = await self.respond(reader)
+            except ServiceError as e:
+                status, payload = e.status, {'error': str(e)}
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                status, payload = HTTPStatus.BAD_REQUEST, {'error': f"Malformed request: {e}"}
+            except Exception as e:
+                print(f"Unexpected error: {e.__class__.__name__}: {e}", flush=True)
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{e.__class__.__name__}: {e}"}
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            headers = [
+                f"HTTP/1.1 {status.value} {status.phrase}", 'Content-Type: application/json; charset=utf-8',
+                f"Content-Length: {len(body)}", 'Connection: close'
+            ]
+            if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                headers.append('Retry-After: 1')
+            writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, reader: asyncio.StreamReader) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = dict()
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > self.max_upload_size:
+            raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"The upload is larger than {self.max_upload_size} bytes.")
+        body = await reader.readexactly(length)
+        url = urlsplit(target)
+        parameters = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == '/health' and method == 'GET':
+            return HTTPStatus.OK, {
+                'status': 'ok', 'workers': self.workers, 'running': self.running, 'pending': self.pending
+            }
+        if url.path == '/verify' and method == 'POST':
+            return HTTPStatus.OK, await self.verify(parameters, body)
+        raise ServiceError(HTTPStatus.NOT_FOUND, f"No route for {method} {url.path}.")
+
+    async def verify(self, parameters: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        if 'path' in parameters:
+            file_name = os.path.basename(parameters['path'])
+            if not os.path.isfile(parameters['path']):
+                raise ServiceError(HTTPStatus.NOT_FOUND, f"The file {parameters['path']} does not exist.")
+        elif 'file_name' in parameters:
+            file_name = os.path.basename(parameters['file_name'])
+        else:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, 'The path or the file_name of the certificate is missing.')
+        if not file_name.lower().endswith(CERTIFICATE_EXTENSIONS):
+            raise ServiceError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"The file {file_name} is not a PDF or Word file.")
+        if self.semaphore.locked() and self.pending >= self.max_pending:
+            raise ServiceError(HTTPStatus.SERVICE_UNAVAILABLE, f"{self.pending} requests are already waiting.")
+        self.pending += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.pending -= 1
+        self.running += 1
+        try:
+            return await self.verify_in_worker(parameters.get('path'), file_name, body)
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    async def verify_in_worker(self, path: Optional[str], file_name: str, body: bytes) -> Dict[str, Any]:
+        # The uploads, and the .doc files (converted and removed when they are opened), are verified in a temporary
+        # directory
+        directory = None
+        try:
+            if path is None or file_name.lower().endswith('.doc'):
+                directory = tempfile.mkdtemp(prefix='certificate_service_')
+                file_path = os.path.join(directory, file_name)
+                if path is None:
+                    with open(file_path, 'wb') as f:
+                        f.write(body)
+                else:
+                    shutil.copy(path, file_path)
+            else:
+                file_path = os.path.abspath(path)
+            executor = self.executor
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, verify_file, file_path)
+            except BrokenProcessPool:
+                # The other requests on the broken pool fail too, the first one replaces it
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self.executor = self.create_executor()
+                raise ServiceError(HTTPStatus.INTERNAL_SERVER_ERROR,
+                                   f"The worker verifying {file_name} stopped unexpectedly.")
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the verification of certificates on 127.0.0.1.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='files verified at once (default: workers)')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='requests waiting for a worker before 503 (default: 4 * max-concurrent)')
+    arguments = parser.parse_args()
+    service = CertificateService(arguments.port, arguments.workers, arguments.max_concurrent, arguments.max_pending)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -1,12 +1,13 @@
 from abc import abstractmethod
 from dataclasses import dataclass
 from enum import Enum, unique
-from functools import reduce
 from typing import Tuple, Union, List, Optional
 
 from common import Limit, SingletonABCMeta, Direction, SteelPlate, CommonUtils, \
     ImpactEnergy, ChemicalElementValue, Thickness, YieldStrength, TensileStrength, Elongation, Temperature, \
-    Specification, DeliveryCondition, PositionDirectionImpact
+    Specification, DeliveryCondition, PositionDirectionImpact, LimitResult, LimitMessage
+from instrumentation import instrumented
+from limit_statistics import count_evaluations
 
 
 @unique
@@ -58,52 +59,48 @@ class ChemicalCompositionLimit(Limit):
                 f"The limit type {self.limit_type} is not expected in ChemicalCompositionLimit."
             )
 
-    def verify_value(self, value: float) -> Tuple[bool, str]:
+    def evaluate(self, value: float) -> LimitResult:
         if self.limit_type == LimitType.MAXIMUM:
-            if value <= self.maximum:
-                message = (
+            return LimitResult(self, value, value <= self.maximum)
+        elif self.limit_type == LimitType.MINIMUM:
+            return LimitResult(self, value, value >= self.minimum)
+        elif self.limit_type == LimitType.RANGE:
+            return LimitResult(self, value, self.minimum <= value <= self.maximum)
+
+    def render_message(self, value: float, valid_flag: bool) -> str:
+        if self.limit_type == LimitType.MAXIMUM:
+            if valid_flag:
+                return (
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the maximum "
                     f"limit {self.maximum} {self.unit}."
                 )
-                print(message)
-                return True, message
             else:
-                message = (
+                return (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the maximum "
                     f"limit {self.maximum} {self.unit}."
                 )
-                print(message)
-                return False, message
         elif self.limit_type == LimitType.MINIMUM:
-            if value >= self.minimum:
-                message = (
+            if valid_flag:
+                return (
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the minimum "
                     f"limit {self.minimum} {self.unit}."
                 )
-                print(message)
-                return True, message
             else:
-                message = (
+                return (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the minimum "
                     f"limit {self.minimum} {self.unit}."
                 )
-                print(message)
-                return False, message
         elif self.limit_type == LimitType.RANGE:
-            if self.minimum <= value <= self.maximum:
-                message = (
+            if valid_flag:
+                return (
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the valid "
                     f"range [{self.minimum}, {self.maximum}] {self.unit}."
                 )
-                print(message)
-                return True, message
             else:
-                message = (
+                return (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the valid "
                     f"range [{self.minimum}, {self.maximum}]. {self.unit}"
                 )
-                print(message)
-                return False, message
 
     def get_element(self, plate: SteelPlate) -> Tuple[List[ChemicalElementValue], float]:
         if self.chemical_element == 'C + 1/6 Mn':
@@ -119,6 +116,14 @@ class ChemicalCompositionLimit(Limit):
             element = self.get_element_by_name(plate, self.chemical_element)
             return [element], element.calculated_value
 
+    def get_element_names(self) -> Tuple[str, ...]:
+        if self.chemical_element == 'C + 1/6 Mn':
+            return 'C', 'Mn'
+        elif self.chemical_element == 'Nb + V + Ti':
+            return 'Nb', 'V', 'Ti'
+        else:
+            return self.chemical_element,
+
     @staticmethod
     def get_element_by_name(plate: SteelPlate, element_name: str) -> ChemicalElementValue:
         if element_name in plate.chemical_compositions:
@@ -131,19 +136,16 @@ class ChemicalCompositionLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         elements, value = self.get_element(plate)
-        valid_flag, message = self.verify_value(value)
+        result = self.evaluate(value)
         for element in elements:
-            element.valid_flag = valid_flag
+            element.valid_flag = result.valid_flag
             # element.message = message
             # element.message = message if element.message is None else (element.message + ' ' + message)
-            if element.message is None:
-                element.message = message
+            if result.valid_flag:
+                element.message = LimitMessage.join(element.message, result)
             else:
-                if valid_flag:
-                    element.message = element.message + ' ' + message
-                else:
-                    element.message = message + ' ' + element.message
-        return valid_flag
+                element.message = LimitMessage.join(result, element.message)
+        return result.valid_flag
 
 
 @dataclass
@@ -159,23 +161,24 @@ class BaoSteelAlLimit(Limit):
         minimum=0.010
     )
 
-    def verify_value(self, value) -> Tuple[bool, str]:
+    def evaluate(self, value) -> LimitResult:
         alt_value, als_value = value
-        alt_valid_flag, alt_message = self.alt_limit.verify_value(alt_value)
-        als_valid_flag, als_message = self.als_limit.verify_value(als_value)
-        if alt_valid_flag or als_valid_flag:
-            return True, alt_message + ' ' + als_message
-        else:
-            return False, alt_message + ' ' + als_message
+        valid_flag = self.alt_limit.evaluate(alt_value).valid_flag or self.als_limit.evaluate(als_value).valid_flag
+        return LimitResult(self, value, valid_flag)
+
+    def render_message(self, value, valid_flag: bool) -> str:
+        alt_value, als_value = value
+        return str(self.alt_limit.evaluate(alt_value)) + ' ' + str(self.als_limit.evaluate(als_value))
 
     # might be not used in the actual run, but was tested in test suites.
     def verify(self, plate: SteelPlate) -> bool:
         elements, value = self.get_element(plate)
-        valid_flag, message = self.verify_value(value)
+        result = self.evaluate(value)
+        message = LimitMessage.join(result)
         for element in elements:
-            element.valid_flag = valid_flag
+            element.valid_flag = result.valid_flag
             element.message = message
-        return valid_flag
+        return result.valid_flag
 
     def get_element(self, plate: SteelPlate):
         if 'Alt' in plate.chemical_compositions:
@@ -194,11 +197,27 @@ class BaoSteelAlLimit(Limit):
             )
         return [alt, als], (alt.calculated_value, als.calculated_value)
 
+    @staticmethod
+    def get_element_names() -> Tuple[str, ...]:
+        return 'Alt', 'Als'
+
 
 @dataclass
 class FineGrainElementLimit(Limit):
     concurrent_limits: List[Union[ChemicalCompositionLimit, BaoSteelAlLimit]]
 
+    def __post_init__(self):
+        # The elements involved are known once the limits are given, they are collected here (in order of appearance
+        # and without duplicates) instead of being merged again for every steel plate.
+        self.element_names: Tuple[str, ...] = FineGrainElementLimit.collect_element_names(self.concurrent_limits)
+
+    @staticmethod
+    def collect_element_names(limits: List[Limit]) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(name for limit in limits for name in limit.get_element_names()))
+
+    def get_element_names(self) -> Tuple[str, ...]:
+        return self.element_names
+
     def verify(self, plate: SteelPlate) -> bool:
         return FineGrainElementLimit.verify_limit(plate, self.concurrent_limits)
 
@@ -240,33 +259,27 @@ class FineGrainElementLimit(Limit):
     @staticmethod
     def verify_limit(plate: SteelPlate,
                      limits_to_check: List[Union[ChemicalCompositionLimit, BaoSteelAlLimit]]) -> bool:
-        limit = limits_to_check[0]
-        elements, value = limit.get_element(plate)
-        valid_flag, message = limit.verify_value(value)
-        if valid_flag:
-            if len(limits_to_check) == 1:
-                for element in elements:
-                    element.valid_flag = True
-                    element.message = message if element.message is None else element.message + ' ' + message
-                return True
-            else:
-                if FineGrainElementLimit.verify_limit(plate, limits_to_check[1:]):
-                    for element in elements:
-                        element.valid_flag = True
-                        element.message = message if element.message is None else element.message + ' ' + message
-                    return True
-                else:
-                    return False
-        else:
-            return False
+        # All the limits must pass (AND), the checking stops at the first failed limit. The elements are annotated
+        # only when every limit has passed, from the last limit to the first one.
+        passed_results = []
+        for limit in limits_to_check:
+            elements, value = limit.get_element(plate)
+            result = limit.evaluate(value)
+            if not result.valid_flag:
+                return False
+            passed_results.append((elements, result))
+        for elements, result in reversed(passed_results):
+            for element in elements:
+                element.valid_flag = True
+                element.message = LimitMessage.join(element.message, result)
+        return True
 
     # DO NOT USE
     def verify_value(self, value) -> Tuple[bool, str]:
         pass
 
-    def get_element(self, plate: SteelPlate):
-        return reduce(lambda x, y: x + [element for element in y if element not in x],
-                      [limit.get_element(plate)[0] for limit in self.concurrent_limits])
+    def get_element(self, plate: SteelPlate) -> List[ChemicalElementValue]:
+        return [ChemicalCompositionLimit.get_element_by_name(plate, name) for name in self.element_names]
 
 
 @dataclass
@@ -274,11 +287,20 @@ class FineGrainElementLimitCombination(Limit):
     fine_grain_element_limits: Optional[List[FineGrainElementLimit]]
     error_message: Optional[str]
 
+    def __post_init__(self):
+        # Compiled form of the combination: any of the alternatives (OR) passes when all its limits (AND) pass.
+        self.alternatives: Tuple[Tuple[Union[ChemicalCompositionLimit, BaoSteelAlLimit], ...], ...] = tuple(
+            tuple(limit.concurrent_limits) for limit in self.fine_grain_element_limits or []
+        )
+        self.element_names: Tuple[str, ...] = FineGrainElementLimit.collect_element_names(
+            self.fine_grain_element_limits or []
+        )
+
     def verify(self, plate: SteelPlate) -> bool:
-        if self.fine_grain_element_limits is None or len(self.fine_grain_element_limits) == 0:
+        if len(self.alternatives) == 0:
             return True
         else:
-            if FineGrainElementLimitCombination.verify_limit(plate, self.fine_grain_element_limits):
+            if FineGrainElementLimitCombination.verify_limit(plate, self.alternatives):
                 return True
             else:
                 for element in self.get_element(plate):
@@ -287,21 +309,19 @@ class FineGrainElementLimitCombination(Limit):
                 return False
 
     @staticmethod
-    def verify_limit(plate: SteelPlate, limits_to_check: List[FineGrainElementLimit]):
-        limit = limits_to_check[0]
-        if limit.verify(plate):
-            return True
-        else:
-            if len(limits_to_check) > 1:
-                return FineGrainElementLimitCombination.verify_limit(plate, limits_to_check[1:])
+    def verify_limit(plate: SteelPlate,
+                     alternatives: Tuple[Tuple[Union[ChemicalCompositionLimit, BaoSteelAlLimit], ...], ...]) -> bool:
+        for concurrent_limits in alternatives:
+            if FineGrainElementLimit.verify_limit(plate, concurrent_limits):
+                return True
+        return False
 
     # DO NOT USE
     def verify_value(self, value) -> Tuple[bool, str]:
         pass
 
-    def get_element(self, plate: SteelPlate):
-        return reduce(lambda x, y: x + [element for element in y if element not in x],
-                      [limit.get_element(plate) for limit in self.fine_grain_element_limits])
+    def get_element(self, plate: SteelPlate) -> List[ChemicalElementValue]:
+        return [ChemicalCompositionLimit.get_element_by_name(plate, name) for name in self.element_names]
 
 
 # class ChemicalCompositionCombinedLimit(Limit):
@@ -573,21 +593,20 @@ class ThicknessLimit(Limit):
     limit_type: LimitType = LimitType.RANGE
     unit: str = 'mm'
 
-    def verify_value(self, value: float) -> Tuple[bool, str]:
-        if self.minimum < value <= self.maximum:
-            message = (
+    def evaluate(self, value: float) -> LimitResult:
+        return LimitResult(self, value, self.minimum < value <= self.maximum)
+
+    def render_message(self, value: float, valid_flag: bool) -> str:
+        if valid_flag:
+            return (
                 f"[PASS] Thickness value is {value}, meets the valid range ({self.minimum}, {self.maximum}] "
                 f"{self.unit}."
             )
-            print(message)
-            return True, message
         else:
-            message = (
+            return (
                 f"[FAIL] Thickness value is {value}, violates the valid range ({self.minimum}, {self.maximum}] "
                 f"{self.unit}."
             )
-            print(message)
-            return False, message
 
     def get_element(self, plate: SteelPlate) -> Thickness:
         if plate.thickness:
@@ -600,7 +619,8 @@ class ThicknessLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         thickness = self.get_element(plate)
-        thickness.valid_flag, thickness.message = self.verify_value(thickness.value)
+        result = self.evaluate(thickness.value)
+        thickness.valid_flag, thickness.message = result.valid_flag, LimitMessage.join(result)
         return thickness.valid_flag
 
 
@@ -609,15 +629,14 @@ class SpecificationLimit(Limit):
     scope: List[str]
     limit_type: LimitType = LimitType.SCOPE
 
-    def verify_value(self, value: str) -> Tuple[bool, str]:
-        if value in self.scope:
-            message = f"[PASS] Specification value is {value}, meets the valid scope {self.scope}."
-            print(message)
-            return True, message
+    def evaluate(self, value: str) -> LimitResult:
+        return LimitResult(self, value, value in self.scope)
+
+    def render_message(self, value: str, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Specification value is {value}, meets the valid scope {self.scope}."
         else:
-            message = f"[FAIL] Specification value is {value}, violates the valid scope {self.scope}."
-            print(message)
-            return False, message
+            return f"[FAIL] Specification value is {value}, violates the valid scope {self.scope}."
 
     def get_element(self, plate: SteelPlate) -> Specification:
         if plate.specification:
@@ -630,7 +649,8 @@ class SpecificationLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         specification = self.get_element(plate)
-        specification.valid_flag, specification.message = self.verify_value(specification.value)
+        result = self.evaluate(specification.value)
+        specification.valid_flag, specification.message = result.valid_flag, LimitMessage.join(result)
         return specification.valid_flag
 
 
@@ -639,15 +659,14 @@ class PositionDirectionImpactLimit(Limit):
     scope: Tuple[Direction] = (Direction.LONGITUDINAL, Direction.TRANSVERSE)
     limit_type: LimitType = LimitType.SCOPE
 
-    def verify_value(self, value: Direction) -> Tuple[bool, str]:
-        if value in self.scope:
-            message = f"[PASS] Direction value is {value}, meets the valid scope {self.scope}."
-            print(message)
-            return True, message
+    def evaluate(self, value: Direction) -> LimitResult:
+        return LimitResult(self, value, value in self.scope)
+
+    def render_message(self, value: Direction, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Direction value is {value}, meets the valid scope {self.scope}."
         else:
-            message = f"[FAIL] Direction value is {value}, violates the valid scope {self.scope}."
-            print(message)
-            return False, message
+            return f"[FAIL] Direction value is {value}, violates the valid scope {self.scope}."
 
     def get_element(self, plate: SteelPlate) -> PositionDirectionImpact:
         if plate.position_direction_impact:
@@ -660,7 +679,8 @@ class PositionDirectionImpactLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         direction = self.get_element(plate)
-        direction.valid_flag, direction.message = self.verify_value(direction.value)
+        result = self.evaluate(direction.value)
+        direction.valid_flag, direction.message = result.valid_flag, LimitMessage.join(result)
         return direction.valid_flag
 
 
@@ -669,15 +689,14 @@ class DeliveryConditionLimit(Limit):
     scope: List[str]
     limit_type: LimitType = LimitType.SCOPE
 
-    def verify_value(self, value: str) -> Tuple[bool, str]:
-        if value in self.scope:
-            message = f"[PASS] Delivery condition value is {value}, meets the valid scope {self.scope}."
-            print(message)
-            return True, message
+    def evaluate(self, value: str) -> LimitResult:
+        return LimitResult(self, value, value in self.scope)
+
+    def render_message(self, value: str, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Delivery condition value is {value}, meets the valid scope {self.scope}."
         else:
-            message = f"[FAIL] Delivery condition value is {value}, violates the valid scope {self.scope}."
-            print(message)
-            return False, message
+            return f"[FAIL] Delivery condition value is {value}, violates the valid scope {self.scope}."
 
     def get_element(self, plate: SteelPlate) -> DeliveryCondition:
         if plate.delivery_condition:
@@ -690,7 +709,8 @@ class DeliveryConditionLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         delivery_condition = self.get_element(plate)
-        delivery_condition.valid_flag, delivery_condition.message = self.verify_value(delivery_condition.value)
+        result = self.evaluate(delivery_condition.value)
+        delivery_condition.valid_flag, delivery_condition.message = result.valid_flag, LimitMessage.join(result)
         return delivery_condition.valid_flag
 
 
@@ -700,15 +720,14 @@ class YieldStrengthLimit(Limit):
     limit_type: LimitType = LimitType.MINIMUM
     unit: str = 'MPa'
 
-    def verify_value(self, value: int) -> Tuple[bool, str]:
-        if value >= self.minimum:
-            message = f"[PASS] Yield Strength value is {value}, meets the minimum limit {self.minimum} {self.unit}."
-            print(message)
-            return True, message
+    def evaluate(self, value: int) -> LimitResult:
+        return LimitResult(self, value, value >= self.minimum)
+
+    def render_message(self, value: int, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Yield Strength value is {value}, meets the minimum limit {self.minimum} {self.unit}."
         else:
-            message = f"[FAIL] Yield Strength value is {value}, violates the minimum limit {self.minimum} {self.unit}."
-            print(message)
-            return False, message
+            return f"[FAIL] Yield Strength value is {value}, violates the minimum limit {self.minimum} {self.unit}."
 
     def get_element(self, plate: SteelPlate) -> YieldStrength:
         if plate.yield_strength:
@@ -721,7 +740,8 @@ class YieldStrengthLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         yield_strength = self.get_element(plate)
-        yield_strength.valid_flag, yield_strength.message = self.verify_value(yield_strength.value)
+        result = self.evaluate(yield_strength.value)
+        yield_strength.valid_flag, yield_strength.message = result.valid_flag, LimitMessage.join(result)
         return yield_strength.valid_flag
 
 
@@ -732,21 +752,20 @@ class TensileStrengthLimit(Limit):
     limit_type: LimitType = LimitType.RANGE
     unit: str = 'MPa'
 
-    def verify_value(self, value: int) -> Tuple[bool, str]:
-        if self.minimum <= value <= self.maximum:
-            message = (
+    def evaluate(self, value: int) -> LimitResult:
+        return LimitResult(self, value, self.minimum <= value <= self.maximum)
+
+    def render_message(self, value: int, valid_flag: bool) -> str:
+        if valid_flag:
+            return (
                 f"[PASS] Tensile Strength value is {value}, meets the valid range {self.minimum} - {self.maximum} "
                 f"{self.unit}."
             )
-            print(message)
-            return True, message
         else:
-            message = (
+            return (
                 f"[FAIL] Tensile Strength value is {value}, violates the valid range {self.minimum} - {self.maximum} "
                 f"{self.unit}."
             )
-            print(message)
-            return False, message
 
     def get_element(self, plate: SteelPlate) -> TensileStrength:
         if plate.tensile_strength:
@@ -759,7 +778,8 @@ class TensileStrengthLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         tensile_strength = self.get_element(plate)
-        tensile_strength.valid_flag, tensile_strength.message = self.verify_value(tensile_strength.value)
+        result = self.evaluate(tensile_strength.value)
+        tensile_strength.valid_flag, tensile_strength.message = result.valid_flag, LimitMessage.join(result)
         return tensile_strength.valid_flag
 
 
@@ -769,15 +789,14 @@ class ElongationLimit(Limit):
     limit_type: LimitType = LimitType.MINIMUM
     unit: str = '%'
 
-    def verify_value(self, value: int) -> Tuple[bool, str]:
-        if value >= self.minimum:
-            message = f"[PASS] Elongation value is {value}, meets the minimum limit {self.minimum} {self.unit}."
-            print(message)
-            return True, message
+    def evaluate(self, value: int) -> LimitResult:
+        return LimitResult(self, value, value >= self.minimum)
+
+    def render_message(self, value: int, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Elongation value is {value}, meets the minimum limit {self.minimum} {self.unit}."
         else:
-            message = f"[FAIL] Elongation value is {value}, violates the minimum limit {self.minimum} {self.unit}."
-            print(message)
-            return False, message
+            return f"[FAIL] Elongation value is {value}, violates the minimum limit {self.minimum} {self.unit}."
 
     def get_element(self, plate: SteelPlate) -> Elongation:
         if plate.elongation:
@@ -790,7 +809,8 @@ class ElongationLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         elongation = self.get_element(plate)
-        elongation.valid_flag, elongation.message = self.verify_value(elongation.value)
+        result = self.evaluate(elongation.value)
+        elongation.valid_flag, elongation.message = result.valid_flag, LimitMessage.join(result)
         return elongation.valid_flag
 
 
@@ -832,15 +852,14 @@ class TemperatureLimit(Limit):
     limit_type: LimitType = LimitType.MAXIMUM
     unit: str = 'Degrees Celsius'
 
-    def verify_value(self, value: int) -> Tuple[bool, str]:
-        if value <= self.maximum:
-            message = f"[PASS] Temperature value is {value}, meets the maximum value {self.maximum} {self.unit}."
-            print(message)
-            return True, message
+    def evaluate(self, value: int) -> LimitResult:
+        return LimitResult(self, value, value <= self.maximum)
+
+    def render_message(self, value: int, valid_flag: bool) -> str:
+        if valid_flag:
+            return f"[PASS] Temperature value is {value}, meets the maximum value {self.maximum} {self.unit}."
         else:
-            message = f"[FAIL] Temperature value is {value}, violates the maximum value {self.maximum} {self.unit}."
-            print(message)
-            return False, message
+            return f"[FAIL] Temperature value is {value}, violates the maximum value {self.maximum} {self.unit}."
 
     def get_element(self, plate: SteelPlate) -> Temperature:
         if plate.temperature:
@@ -853,7 +872,8 @@ class TemperatureLimit(Limit):
 
     def verify(self, plate: SteelPlate) -> bool:
         temperature = self.get_element(plate)
-        temperature.valid_flag, temperature.message = self.verify_value(temperature.value)
+        result = self.evaluate(temperature.value)
+        temperature.valid_flag, temperature.message = result.valid_flag, LimitMessage.join(result)
         return temperature.valid_flag
 
 
@@ -863,21 +883,20 @@ class ImpactEnergyLimit(Limit):
     limit_type: LimitType = LimitType.MINIMUM
     unit: str = 'J'
 
-    def verify_value(self, value: int) -> Tuple[bool, str]:
-        if value >= self.minimum:
-            message = (
+    def evaluate(self, value: int) -> LimitResult:
+        return LimitResult(self, value, value >= self.minimum)
+
+    def render_message(self, value: int, valid_flag: bool) -> str:
+        if valid_flag:
+            return (
                 f"[PASS] Impact Energy value is {value}, meets the "
                 f"minimum limit {self.minimum} {self.unit}."
             )
-            print(message)
-            return True, message
         else:
-            message = (
+            return (
                 f"[FAIL] Impact Energy value is {value}, meets the "
                 f"minimum limit {self.minimum} {self.unit}."
             )
-            print(message)
-            return False, message
 
     def get_element(self, plate: SteelPlate) -> List[ImpactEnergy]:
         if plate.impact_energy_list and len(plate.impact_energy_list) == 4:
@@ -890,10 +909,17 @@ class ImpactEnergyLimit(Limit):
     def verify(self, plate: SteelPlate) -> bool:
         impact_energy_list = self.get_element(plate)
         for impact_energy in impact_energy_list:
-            impact_energy.valid_flag, impact_energy.message = self.verify_value(impact_energy.value)
+            result = self.evaluate(impact_energy.value)
+            impact_energy.valid_flag, impact_energy.message = result.valid_flag, LimitMessage.join(result)
         return all([energy.valid_flag for energy in impact_energy_list])
 
 
+# Each verify counted while limit statistics are collected (see limit_statistics)
+count_evaluations(ChemicalCompositionLimit, BaoSteelAlLimit, FineGrainElementLimit, FineGrainElementLimitCombination,
+                  ThicknessLimit, SpecificationLimit, PositionDirectionImpactLimit, DeliveryConditionLimit,
+                  YieldStrengthLimit, TensileStrengthLimit, ElongationLimit, TemperatureLimit, ImpactEnergyLimit)
+
+
 class RuleMaker(metaclass=SingletonABCMeta):
 
     @staticmethod
@@ -1323,6 +1349,7 @@ class RuleMaker(metaclass=SingletonABCMeta):
 class LongTengRuleMaker(RuleMaker):
 
     @staticmethod
+    @instrumented('rules.get_rules')
     def get_rules(plate: SteelPlate) -> List[Limit]:
         standard_rules = LongTengRuleMaker.get_standard_rules(plate)
         special_rules = LongTengRuleMaker.get_special_rules(plate)
@@ -1571,6 +1598,7 @@ class LongTengRuleMaker(RuleMaker):
 class BaoSteelRuleMaker(RuleMaker):
 
     @staticmethod
+    @instrumented('rules.get_rules')
     def get_rules(plate: SteelPlate) -> List[Limit]:
         return BaoSteelRuleMaker.get_special_rules() + BaoSteelRuleMaker.get_standard_rules(
             plate) + BaoSteelRuleMaker.get_fine_grain_elements_rules(plate)
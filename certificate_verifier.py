@@ -1,13 +1,37 @@
+import functools
+from typing import List, Optional
+
 from certificate_verification import RuleMaker
 from common import Certificate, SingletonMeta
+from instrumentation import instrumented
+from rule_compiler import RuleCompiler
+from rule_space import RuleSpace
 
 
 class CertificateVerifier(metaclass=SingletonMeta):
     @staticmethod
-    def verify(cert: Certificate, rule_maker: RuleMaker) -> bool:
+    def verify(cert: Certificate, rule_maker: RuleMaker, compiled: bool = False,
+               rule_space: Optional[RuleSpace] = None) -> bool:
         # In short, it is to check whether each steel plate in the certificate has passed all the verification rules
         # The return value indicates whether everything in the given certificate pass the test
-        return all([all([limit.verify(plate) for limit in rule_maker.get_rules(plate)]) for plate in cert.steel_plates])
+        return all(CertificateVerifier.verify_plates(cert, rule_maker, compiled, rule_space))
+
+    @staticmethod
+    @instrumented('verify')
+    def verify_plates(cert: Certificate, rule_maker: RuleMaker, compiled: bool = False,
+                      rule_space: Optional[RuleSpace] = None) -> List[bool]:
+        # The verdict of each steel plate, all its rules are verified (and their elements annotated) even after one
+        # fails.
+        # With a rule space (see rule_space), the rule sets are looked up in the precomputed snapshot instead of being
+        # built for each steel plate.
+        get_rules = rule_maker.get_rules
+        if rule_space is not None:
+            get_rules = functools.partial(rule_space.get_rules, rule_maker)
+        if compiled:
+            # Same verdict and annotations, but each rule set is evaluated by a generated function (see rule_compiler)
+            compiler = RuleCompiler()
+            return [compiler.verify(plate, get_rules(plate)) for plate in cert.steel_plates]
+        return [all([limit.verify(plate) for limit in get_rules(plate)]) for plate in cert.steel_plates]
 
 
 class BaoSteelCertificateVerifier(CertificateVerifier):
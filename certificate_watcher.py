@@ -0,0 +1,271 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from certificate_processor import BatchResult, BatchRouter, FileResult, ProcessOptions, CERTIFICATE_EXTENSIONS, \
+    list_certificate_files, write_summaries, open_passed_workbook, get_pool_context, warm_up, add_option_arguments, \
+    get_options, get_metrics_exporter
+
+# Watch mode: the certificate files dropped into a directory are verified and routed to PASS, FAIL or EXCEPTION as they
+# arrive, instead of scanning the directory in batches. New files are noticed with inotify on Linux and by scanning
+# the directory elsewhere (or when inotify is not available). The directory is also scanned when the inotify queue
+# overflows and every rescan_intervals intervals, so that a file whose event was lost is processed too. A file is only
+# processed once its size and modification time have not changed for settle_seconds, so that files which are still
+# being copied are not read. The workers are forked once, when the watcher starts, and verify the files of every
+# round. The results are routed and recorded like the ones of certificate_processor, with the same options (see
+# ProcessOptions), the timings, limit statistics and profiles are written when the watcher stops.
+#
+# The summary workbooks are rotated by day and by size: they summarize the files of the day until there are
+# summary_size of them (checked before each round), then PASS_<date>_2.xlsx... are started. The rows of the passed
+# certificates are streamed to PASS_<date>.xlsx, which is saved when the summaries rotate and when the watcher stops.
+# EXCEPTION_<date>.xlsx is rewritten after each round, only the results of the current summaries are kept. A file
+# which cannot be routed, e.g. deleted once settled, is logged and the watcher goes on.
+#
+#     python certificate_watcher.py [directory] [--workers N] [--settle SECONDS] [--poll] [--summary-size N]
+#                                   [--metrics-port PORT]
+
+FileSignature = Tuple[int, int]
+SUMMARY_SIZE = 1000
+RESCAN_INTERVALS = 60
+
+
+class PollingWatcher:
+
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+
+    def wait(self, timeout: float) -> Set[str]:
+        # Returns the names of the certificate files which may have changed
+        time.sleep(min(timeout, self.interval))
+        return set(list_certificate_files(self.directory))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    # struct inotify_event: int wd, uint32_t mask, uint32_t cookie, uint32_t len, char name[len]
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"Failed to initialize inotify: {os.strerror(ctypes.get_errno())}")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"Failed to watch {directory}: {os.strerror(ctypes.get_errno())}")
+
+    def wait(self, timeout: float) -> Set[str]:
+        names = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, event_mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                if event_mask & self.IN_Q_OVERFLOW:
+                    # Events were dropped, all the files are reported instead
+                    names.update(list_certificate_files(self.directory))
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if is_certificate_file(name):
+                    names.add(name)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def is_certificate_file(name: str) -> bool:
+    # Word keeps a lock file named ~$... next to the documents it opens
+    return name.lower().endswith(CERTIFICATE_EXTENSIONS) and not name.startswith('~$')
+
+
+def create_directory_watcher(directory: str, poll: bool = False, interval: float = 1.0):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available ({e}), the directory is scanned every {interval} s instead.")
+    return PollingWatcher(directory, interval)
+
+
+class CertificateWatcher:
+
+    def __init__(self, directory: str = '.', settle_seconds: float = 2.0, poll: bool = False, interval: float = 1.0,
+                 summary_size: int = SUMMARY_SIZE, rescan_intervals: int = RESCAN_INTERVALS,
+                 options: Optional[ProcessOptions] = None):
+        self.router = BatchRouter(directory, options)
+        self.directory = self.router.directory
+        self.workers = self.router.options.workers or os.cpu_count() or 1
+        self.settle_seconds = settle_seconds
+        self.poll = poll
+        self.interval = interval
+        self.summary_size = summary_size
+        self.rescan_intervals = rescan_intervals
+        self.scanned_at = 0.0
+        self.watcher = None
+        self.pool = None
+        # Files waiting to settle: last signature seen and when it last changed
+        self.pending: Dict[str, Tuple[FileSignature, float]] = dict()
+        # The results of the current summaries, the workbook of their passed certificates, day, part and number of files
+        self.batch_result = BatchResult()
+        self.passed_workbook = None
+        self.summary_day: Optional[str] = None
+        self.summary_part = 0
+        self.summary_files = 0
+
+    def start(self):
+        # Forked warm, after the hooks are registered so that the workers create the spans too
+        self.router.start()
+        warm_up()
+        if self.workers > 1:
+            self.pool = get_pool_context().Pool(processes=self.workers, initializer=warm_up)
+        # Watch before listing, so that no file arriving in between is missed
+        self.watcher = create_directory_watcher(self.directory, self.poll, self.interval)
+        self.scanned_at = time.monotonic()
+        self.update(list_certificate_files(self.directory))
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.save_summaries()
+        self.router.stop()
+
+    def get_signature(self, name: str) -> Optional[FileSignature]:
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def update(self, names):
+        now = time.monotonic()
+        for name in names:
+            if not is_certificate_file(name):
+                continue
+            signature = self.get_signature(name)
+            if signature is None:
+                self.pending.pop(name, None)
+            elif name not in self.pending or self.pending[name][0] != signature:
+                self.pending[name] = (signature, now)
+
+    def get_ready_files(self) -> List[str]:
+        now = time.monotonic()
+        ready = []
+        for name in sorted(self.pending):
+            signature, changed_at = self.pending[name]
+            current_signature = self.get_signature(name)
+            if current_signature is None:
+                del self.pending[name]
+            elif current_signature != signature:
+                self.pending[name] = (current_signature, now)
+            elif now - changed_at >= self.settle_seconds:
+                del self.pending[name]
+                ready.append(name)
+        return ready
+
+    def get_summary_suffix(self) -> str:
+        return f"_{self.summary_day}" if self.summary_part == 1 else f"_{self.summary_day}_{self.summary_part}"
+
+    def save_summaries(self):
+        if self.passed_workbook is not None:
+            self.passed_workbook.save()
+            self.passed_workbook = None
+
+    def rotate_summaries(self):
+        day = time.strftime('%Y-%m-%d')
+        if self.passed_workbook is not None and day == self.summary_day and self.summary_files < self.summary_size:
+            return
+        self.save_summaries()
+        if day != self.summary_day:
+            self.summary_day, self.summary_part = day, 0
+        # The summaries of an earlier watcher of the same day are not overwritten
+        self.summary_part += 1
+        while os.path.exists(os.path.join(self.directory, 'PASS', f"PASS{self.get_summary_suffix()}.xlsx")):
+            self.summary_part += 1
+        self.batch_result = BatchResult()
+        self.passed_workbook = open_passed_workbook(self.directory, suffix=self.get_summary_suffix())
+        self.summary_files = 0
+
+    def process_files(self, names: List[str]) -> List[FileResult]:
+        if not names:
+            return []
+        self.rotate_summaries()
+        results = [
+            result for _, result in self.router.route_files(names, self.batch_result, self.passed_workbook,
+                                                            pool=self.pool, keep_going=True)
+        ]
+        self.summary_files += len(results)
+        write_summaries(self.directory, self.batch_result, suffix=self.get_summary_suffix())
+        return results
+
+    def run_once(self, timeout: Optional[float] = None) -> List[FileResult]:
+        # Waits for changes (at most timeout seconds), then processes the files which have settled
+        if timeout is None:
+            timeout = max(self.settle_seconds / 2, 0.1) if self.pending else self.interval
+        names = self.watcher.wait(timeout)
+        if time.monotonic() - self.scanned_at >= self.rescan_intervals * self.interval:
+            names.update(list_certificate_files(self.directory))
+            self.scanned_at = time.monotonic()
+        self.update(names)
+        results = self.process_files(self.get_ready_files())
+        self.router.set_pending(len(self.pending))
+        return results
+
+    def run(self):
+        self.start()
+        print(f"Watching {self.directory} for certificate files, press Ctrl+C to stop.")
+        try:
+            while True:
+                try:
+                    self.run_once()
+                except Exception as e:
+                    # The files of the round are found again by the next scan
+                    print(f"Failed to process the files: {e.__class__.__name__}: {e}")
+                    time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the certificate files dropped into a directory.')
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help='seconds a file must stay unchanged before it is processed')
+    parser.add_argument('--poll', action='store_true', help='scan the directory instead of using inotify')
+    parser.add_argument('--summary-size', type=int, default=SUMMARY_SIZE,
+                        help='files after which new summary workbooks are started (and every day)')
+    add_option_arguments(parser)
+    arguments = parser.parse_args()
+    options = get_options(arguments)
+    with get_metrics_exporter(arguments, options):
+        CertificateWatcher(arguments.directory, arguments.settle, arguments.poll, summary_size=arguments.summary_size,
+                           options=options).run()
@@ -1,35 +1,101 @@
+import importlib
 import os
+import threading
 from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import List, Tuple, Union, Dict, Optional
+from types import ModuleType
+from typing import Any, Callable, List, Tuple, Union, Dict, Optional
 from enum import Enum, unique
 
-import pdfplumber
-from win32com import client as wc
-from docx import Document
+from instrumentation import instrumented, span
+
+
+def import_backend(module_name: str, purpose: str) -> ModuleType:
+    # The document backends (pdfplumber, python-docx, pywin32) are imported when a file is opened, so that the rules
+    # can be imported and run without them
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"The package {module_name} is needed to {purpose}, but it could not be imported: {e}") from e
+
+
+class SingletonRegistry:
+    # Holds the single instance of each class using SingletonMeta or SingletonABCMeta (certificate factories, rule
+    # makers, verifiers and the caches of rule_compiler and rule_space). The instances are created lazily under a lock,
+    # so threads racing on the first call get the same instance. A forked worker inherits the instances built by the
+    # parent, with their caches: call warm_up in the parent before creating the workers, and in each worker (e.g. in
+    # the initializer of the pool) to run the per-process warm-up hooks.
+
+    _lock = threading.RLock()
+    _instances: Dict[type, Any] = {}
+    _warm_up_hooks: List[Callable[[], None]] = []
+    _warmed_up_pid: Optional[int] = None
+
+    @classmethod
+    def get_instance(cls, singleton_class: type, create: Callable[..., Any], *args, **kwargs) -> Any:
+        instance = cls._instances.get(singleton_class)
+        if instance is None:
+            # Reentrant, as the constructor of a singleton may use other singletons
+            with cls._lock:
+                instance = cls._instances.get(singleton_class)
+                if instance is None:
+                    instance = create(*args, **kwargs)
+                    cls._instances[singleton_class] = instance
+        return instance
+
+    @classmethod
+    def add_warm_up_hook(cls, hook: Callable[[], None]) -> Callable[[], None]:
+        with cls._lock:
+            cls._warm_up_hooks.append(hook)
+        return hook
+
+    @classmethod
+    def remove_warm_up_hook(cls, hook: Callable[[], None]):
+        with cls._lock:
+            cls._warm_up_hooks.remove(hook)
+
+    @classmethod
+    def warm_up(cls, *singleton_classes: type):
+        # Creates the instances of the given classes, then runs the warm-up hooks once in the current process
+        for singleton_class in singleton_classes:
+            singleton_class()
+        with cls._lock:
+            if cls._warmed_up_pid == os.getpid():
+                return
+            for hook in cls._warm_up_hooks:
+                hook()
+            cls._warmed_up_pid = os.getpid()
+
+    @classmethod
+    def is_warmed_up(cls) -> bool:
+        return cls._warmed_up_pid == os.getpid()
+
+    @classmethod
+    def after_fork_in_child(cls):
+        # The lock may have been held by another thread of the parent when it forked, and the instances may hold locks
+        # of their own: they are reset through their after_fork method.
+        cls._lock = threading.RLock()
+        for instance in list(cls._instances.values()):
+            after_fork = getattr(instance, 'after_fork', None)
+            if after_fork is not None:
+                after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonRegistry.after_fork_in_child)
 
 
 class SingletonMeta(type):
 
-    _instances = {}
-
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
-        return cls._instances[cls]
+        return SingletonRegistry.get_instance(cls, super().__call__, *args, **kwargs)
 
 
 class SingletonABCMeta(ABCMeta):
 
-    _instances = {}
-
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
-        return cls._instances[cls]
+        return SingletonRegistry.get_instance(cls, super().__call__, *args, **kwargs)
 
 
 @unique
@@ -50,6 +116,54 @@ class Direction(Enum):
         return self._name_
 
 
+@dataclass
+class LimitResult:
+    limit: 'Limit'
+    value: Any
+    valid_flag: bool
+
+    def __str__(self):
+        return self.limit.render_message(self.value, self.valid_flag)
+
+
+# The annotation of a verified element is kept as the limit results that produced it, the text is only rendered when
+# somebody actually reads it (e.g. the comment of a failed cell in the Excel report).
+class LimitMessage:
+
+    __slots__ = ('parts',)
+
+    def __init__(self, parts: Tuple[Union[LimitResult, str], ...]):
+        self.parts = parts
+
+    @staticmethod
+    def join(*messages: Union['LimitMessage', LimitResult, str, None]) -> 'LimitMessage':
+        parts = []
+        for message in messages:
+            if message is None:
+                continue
+            elif isinstance(message, LimitMessage):
+                parts.extend(message.parts)
+            else:
+                parts.append(message)
+        return LimitMessage(tuple(parts))
+
+    def __str__(self):
+        return ' '.join([str(part) for part in self.parts])
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __contains__(self, text: str):
+        return text in str(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (str, LimitMessage)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
 @dataclass
 class CertificateElement:
     table_index: Optional[int]
@@ -66,7 +180,7 @@ class CertificateElementInPlate(CertificateElement):
 @dataclass
 class CertificateElementToVerify(CertificateElementInPlate):
     valid_flag: bool
-    message: Optional[str]
+    message: Optional[Union[str, LimitMessage]]
 
     def is_valid(self):
         return self.valid_flag
@@ -286,9 +400,17 @@ class Certificate(metaclass=ABCMeta):
 
 class Limit(metaclass=ABCMeta):
 
-    @abstractmethod
     def verify_value(self, value) -> Tuple[bool, str]:
-        pass
+        result = self.evaluate(value)
+        message = str(result)
+        print(message)
+        return result.valid_flag, message
+
+    def evaluate(self, value) -> LimitResult:
+        raise NotImplementedError(f"{self.__class__.__name__} does not support evaluating a single value.")
+
+    def render_message(self, value, valid_flag: bool) -> str:
+        raise NotImplementedError(f"{self.__class__.__name__} does not support rendering a message.")
 
     @abstractmethod
     def verify(self, plate: SteelPlate) -> bool:
@@ -300,22 +422,60 @@ class Limit(metaclass=ABCMeta):
         pass
 
 
+def get_table_shapes(tables: List[List[List[Any]]]) -> List[str]:
+    # rows x columns of each table, e.g. for the traces (see tracer)
+    return [f"{len(table)}x{max([len(row) for row in table], default=0)}" for table in tables]
+
+
+def read_docx_table(table, row_count: Optional[int] = None) -> List[List[str]]:
+    # The text of the cells of the first row_count rows of a python-docx table, or of all its rows
+    return [[cell.text for cell in row.cells] for row in table.rows[:row_count]]
+
+
 class CertificateFile:
 
-    def __init__(self, file_path: str):
+    # With header_only, only the steel plant is read when the file is opened, the tables are extracted by
+    # extract_tables, and get_table reads a single table (e.g. to look up the certificate numbers before the rest)
+    def __init__(self, file_path: str, header_only: bool = False):
         self.file_path = file_path if os.path.isabs(file_path) else os.path.abspath(file_path)
+        self.header_only = header_only
+        self.tables: Optional[List[List[List[Optional[str]]]]] = None
 
 
 class PdfFile(CertificateFile):
 
+    @instrumented('open')
     def __enter__(self):
-        self.pdf = pdfplumber.open(self.file_path)
-        self.page = self.pdf.pages[0]  # Always has only one page
-        self.tables = self.page.extract_tables()
-        self.content = self.page.extract_text()
-        self.steel_plant = self.extract_steel_plant()
+        with span('open.load'):
+            pdfplumber = import_backend('pdfplumber', 'read PDF certificates')
+            self.pdf = pdfplumber.open(self.file_path)
+            self.page = self.pdf.pages[0]  # Always has only one page
+            self.found_tables = None
+        if not self.header_only:
+            self.extract_tables()
+        with span('open.text'):
+            self.content = self.page.extract_text()
+            self.steel_plant = self.extract_steel_plant()
         return self
 
+    def find_tables(self):
+        # The same tables as page.extract_tables(), found once and extracted one at a time
+        if self.found_tables is None:
+            self.found_tables = self.page.find_tables()
+        return self.found_tables
+
+    def extract_tables(self):
+        if self.tables is None:
+            with span('open.tables') as tables_span:
+                self.tables = [table.extract() for table in self.find_tables()]
+                if tables_span is not None:
+                    tables_span.attributes['table_shapes'] = get_table_shapes(self.tables)
+
+    def get_table(self, index: int, row_count: Optional[int] = None) -> List[List[Optional[str]]]:
+        # The other tables are not extracted
+        table = self.tables[index] if self.tables is not None else self.find_tables()[index].extract()
+        return table[:row_count]
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         # pass
         if self.pdf:
@@ -332,12 +492,14 @@ class PdfFile(CertificateFile):
 
 class DocxFile(CertificateFile):
 
+    @instrumented('open')
     def __enter__(self):
         ext = os.path.splitext(self.file_path)[-1]
         if ext == '.docx':
             pass
         elif ext == '.doc':
             # Convert doc format to docx
+            wc = import_backend('win32com.client', 'convert .doc certificates to .docx')
             word = wc.Dispatch("Word.Application")
             doc = word.Documents.Open(self.file_path)
             doc.SaveAs(f"{self.file_path}x", 12)
@@ -350,11 +512,31 @@ class DocxFile(CertificateFile):
                 f"The extension name of file path {self.file_path} passed to DocxFile constructor is neither docx "
                 f"nor doc."
             )
-        self.document = Document(self.file_path)
-        self.steel_plant = self.extract_steel_plant()
-        self.tables = [[[cell.text for cell in row.cells] for row in table.rows] for table in self.document.tables]
+        with span('open.load'):
+            docx = import_backend('docx', 'read Word certificates')
+            self.document = docx.Document(self.file_path)
+        with span('open.text'):
+            self.steel_plant = self.extract_steel_plant()
+        if not self.header_only:
+            self.extract_tables()
         return self
 
+    def extract_tables(self):
+        if self.tables is None:
+            with span('open.tables') as tables_span:
+                self.tables = [read_docx_table(table) for table in self.document.tables]
+                if tables_span is not None:
+                    tables_span.attributes['table_shapes'] = get_table_shapes(self.tables)
+
+    def get_table_count(self) -> int:
+        return len(self.document.tables)
+
+    def get_table(self, index: int, row_count: Optional[int] = None) -> List[List[str]]:
+        # The first row_count rows of the table, the cells of the other rows are not read
+        if self.tables is not None:
+            return self.tables[index][:row_count]
+        return read_docx_table(self.document.tables[index], row_count)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
@@ -380,16 +562,16 @@ class CommonUtils:
 
     @staticmethod
     @contextmanager
-    def open_file(file_path: str) -> CertificateFile:
+    def open_file(file_path: str, header_only: bool = False) -> CertificateFile:
         if file_path.lower().endswith('.pdf'):
-            with PdfFile(file_path) as pdf_file:
+            with PdfFile(file_path, header_only) as pdf_file:
                 try:
                     yield pdf_file
                 finally:
                     # pdf_file.pdf.close()
                     pass
         elif file_path.lower().endswith('.doc') or file_path.lower().endswith('.docx'):
-            with DocxFile(file_path) as docx_file:
+            with DocxFile(file_path, header_only) as docx_file:
                 try:
                     yield docx_file
                 finally:
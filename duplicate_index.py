@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Index of the certificate files already verified, to route the files submitted again without reading and verifying
+# them again. A file is a duplicate if it has the same bytes as an indexed file (a copy, even renamed), or if one of its
+# certificates (steel plant and certificate no., read right after opening the file) is in an indexed file (a file
+# scanned or saved again). A duplicate is routed to DUPLICATE with the name and the verdict of the earlier file.
+#
+# The files are hashed and looked up by the workers (see read_and_verify), the tables of a file are only extracted once
+# its certificates were not found.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    content_hash TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    processed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS certificates (
+    steel_plant TEXT NOT NULL,
+    certificate_no TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (steel_plant, certificate_no)
+);
+'''
+
+# The earlier file: its name and where it was routed
+EarlierFile = Tuple[str, str]
+
+
+def hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DuplicateIndex:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def find_by_hash(self, content_hash: str) -> Optional[EarlierFile]:
+        row = self.connection.execute(
+            'SELECT file_name, destination FROM files WHERE content_hash = ?', (content_hash,)
+        ).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def find_by_certificate_nos(self, steel_plant: str, certificate_nos: List[str]) -> Optional[EarlierFile]:
+        for certificate_no in certificate_nos:
+            row = self.connection.execute(
+                'SELECT file_name, destination FROM certificates WHERE steel_plant = ? AND certificate_no = ?',
+                (steel_plant, certificate_no)
+            ).fetchone()
+            if row is not None:
+                return row[0], row[1]
+        return None
+
+    def add(self, content_hash: str, file_name: str, destination: str, steel_plant: Optional[str],
+            certificate_nos: List[str]):
+        # The first file stays the reference of its duplicates
+        processed_at = time.time()
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute(
+                'INSERT OR IGNORE INTO files (content_hash, file_name, destination, processed_at) VALUES (?, ?, ?, ?)',
+                (content_hash, file_name, destination, processed_at)
+            )
+            if steel_plant is not None:
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO certificates (steel_plant, certificate_no, file_name, destination, '
+                    'processed_at) VALUES (?, ?, ?, ?, ?)',
+                    [(steel_plant, certificate_no, file_name, destination, processed_at)
+                     for certificate_no in certificate_nos]
+                )
+
+
+# The connections of the current process, a forked worker must not use the connection of its parent
+indexes: Dict[Tuple[int, str], DuplicateIndex] = dict()
+
+
+def get_duplicate_index(path: str) -> DuplicateIndex:
+    key = (os.getpid(), path)
+    if key not in indexes:
+        indexes[key] = DuplicateIndex(path)
+    return indexes[key]
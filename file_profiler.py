@@ -0,0 +1,144 @@
+import cProfile
+import heapq
+import itertools
+import marshal
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Profiling of the slowest files of a batch: once enabled, the reading and verification of each file (opening, reading
+# and verifying its certificates) runs under cProfile in the worker, and the profile is sent back with the result. Only
+# the profiles of the N slowest files are kept (in a heap of size N), and written to the PROFILE subdirectory:
+#
+#     <file name>.prof              the cProfile statistics, e.g. for python -m pstats or snakeviz
+#     <file name>.collapsed.txt     collapsed stacks (frame;frame;frame microseconds) for flamegraph.pl or speedscope
+#
+#     python certificate_processor.py <directory> --profile 5
+#
+# cProfile only records the callers of each function, not the whole stacks: the time of a function is split between
+# its callers in proportion to the time each of them spent in it, and the stacks of less than MIN_FRACTION of the
+# profile are left out.
+
+PROFILE_DIRECTORY = 'PROFILE'
+MIN_FRACTION = 0.0001
+# (file name, line, function) -> (primitive calls, calls, own seconds, cumulative seconds, callers)
+Stats = Dict[Tuple[str, int, str], Tuple[int, int, float, float, Dict[Tuple[str, int, str], Tuple]]]
+
+enabled = False
+
+
+@dataclass
+class FileProfile:
+    seconds: float = 0
+    stats: Stats = field(default_factory=dict)
+
+
+def enable_profiling():
+    # Enabled before the worker processes are forked, so that they profile the files too
+    global enabled
+    enabled = True
+
+
+def disable_profiling():
+    global enabled
+    enabled = False
+
+
+@contextmanager
+def profile_file() -> Iterator[Optional[FileProfile]]:
+    # The profile of the block, None when not enabled
+    if not enabled:
+        yield None
+        return
+    file_profile = FileProfile()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield file_profile
+    finally:
+        profiler.disable()
+        file_profile.seconds = time.perf_counter() - start
+        profiler.create_stats()
+        file_profile.stats = profiler.stats
+
+
+def get_frame_name(function: Tuple[str, int, str]) -> str:
+    file_name, line, name = function
+    if file_name == '~':
+        # Built-in functions
+        return name.replace(';', ':')
+    return f"{name} ({os.path.basename(file_name)}:{line})".replace(';', ':')
+
+
+def get_collapsed_stacks(stats: Stats) -> Dict[str, int]:
+    # Microseconds of own time per stack
+    callees: Dict[Tuple[str, int, str], List[Tuple[Tuple[str, int, str], float]]] = dict()
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, caller_seconds) in callers.items():
+            callees.setdefault(caller, []).append((function, caller_seconds))
+    roots = [function for function, (_, _, _, _, callers) in stats.items() if not callers]
+    total = sum([stats[function][3] for function in roots])
+    stacks: Dict[str, float] = dict()
+
+    def walk(function: Tuple[str, int, str], frames: Tuple[str, ...], on_stack: frozenset, fraction: float):
+        _, _, own_seconds, seconds, _ = stats[function]
+        frames = frames + (get_frame_name(function),)
+        stack = ';'.join(frames)
+        stacks[stack] = stacks.get(stack, 0) + own_seconds * fraction
+        on_stack = on_stack | {function}
+        for callee, caller_seconds in callees.get(function, []):
+            callee_seconds = stats[callee][3]
+            # Recursive calls are already in the cumulative time of the first call
+            if callee in on_stack or callee_seconds <= 0 or caller_seconds * fraction < total * MIN_FRACTION:
+                continue
+            walk(callee, frames, on_stack, fraction * caller_seconds / callee_seconds)
+
+    for root in roots:
+        walk(root, (), frozenset(), 1.0)
+    return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if round(seconds * 1e6) > 0}
+
+
+class SlowestProfiles:
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f"The number of profiles to keep must be at least 1, {size} is given.")
+        self.size = size
+        # Min-heap of (seconds, order, file name, profile), the fastest of the kept profiles first
+        self.heap: List[Tuple[float, int, str, FileProfile]] = []
+        self.order = itertools.count()
+
+    def add(self, file_name: str, file_profile: FileProfile):
+        entry = (file_profile.seconds, next(self.order), file_name, file_profile)
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, entry)
+        elif entry[0] > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def get_slowest(self) -> List[Tuple[str, FileProfile]]:
+        return [(file_name, file_profile) for _, _, file_name, file_profile in sorted(self.heap, reverse=True)]
+
+    def write(self, directory: str) -> List[str]:
+        # Returns the paths of the .prof files, from the slowest file
+        profile_directory = os.path.join(directory, PROFILE_DIRECTORY)
+        os.makedirs(profile_directory, exist_ok=True)
+        paths = []
+        for file_name, file_profile in self.get_slowest():
+            path = os.path.join(profile_directory, f"{file_name}.prof")
+            # The format of pstats.Stats.dump_stats
+            with open(path, 'wb') as f:
+                marshal.dump(file_profile.stats, f)
+            with open(os.path.join(profile_directory, f"{file_name}.collapsed.txt"), 'w', encoding='utf-8') as f:
+                for stack, microseconds in sorted(get_collapsed_stacks(file_profile.stats).items()):
+                    f.write(f"{stack} {microseconds}\n")
+            paths.append(path)
+        return paths
+
+    def __str__(self):
+        return '\n'.join(
+            [f"{file_profile.seconds:>9.3f} s  {file_name}" for file_name, file_profile in self.get_slowest()]
+        )
+
@@ -0,0 +1,99 @@
+import errno
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+# Routing of the certificate files to PASS, FAIL, EXCEPTION... On the same filesystem a file is hard linked under its
+# new name, then unlinked from the source, which does not copy any byte. Across devices it is copied aside into the
+# destination, flushed to disk, linked, and only then removed from the source, so that a crash leaves at worst the
+# file in both places, never a partial file. A file never overwrites another file of the destination: it is given the
+# first free name among "<stem>.<suffix>", "<stem> (1).<suffix>", "<stem> (2).<suffix>"...
+#
+# The link fails if the name was taken since it was looked up, e.g. by another node routing to the same destination
+# (see certificate_node), and the next free name is tried. On a filesystem without hard links, the name is reserved
+# with an empty placeholder created with O_EXCL, which the file then replaces.
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_free_name(directory: str, file_name: str) -> str:
+    stem, suffix = os.path.splitext(file_name)
+    free_name = file_name
+    number = 0
+    while os.path.lexists(os.path.join(directory, free_name)):
+        number += 1
+        free_name = f"{stem} ({number}){suffix}"
+    return free_name
+
+
+def fsync_directory(directory: str):
+    # The directory entries of the rename, directories cannot be opened on Windows
+    if os.name != 'posix':
+        return
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def copy_file(source: str, destination: str) -> str:
+    # Returns the path of the copy in the destination directory, flushed to disk
+    descriptor, temporary = tempfile.mkstemp(suffix='.partial', prefix='.', dir=destination)
+    try:
+        with open(source, 'rb') as source_file, os.fdopen(descriptor, 'wb') as temporary_file:
+            shutil.copyfileobj(source_file, temporary_file, COPY_BUFFER_SIZE)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        shutil.copymode(source, temporary)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return temporary
+
+
+def place(source: str, target: str):
+    # Renames the file, FileExistsError if the target exists
+    try:
+        os.link(source, target)
+    except OSError as e:
+        if e.errno not in (errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS, errno.EMLINK):
+            raise
+        # No hard links on this filesystem
+        os.close(os.open(target, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        try:
+            os.replace(source, target)
+        except BaseException:
+            os.remove(target)
+            raise
+        return
+    os.remove(source)
+
+
+def route(file_path: str, destination: str, file_name: Optional[str] = None) -> str:
+    # Moves the file into the destination directory, returns its new path. The file is given file_name if it is free.
+    os.makedirs(destination, exist_ok=True)
+    target = os.path.join(destination, file_name or get_free_name(destination, os.path.basename(file_path)))
+    # The file itself, or its copy in the destination when it is on another device
+    source = file_path
+    try:
+        while True:
+            try:
+                place(source, target)
+                break
+            except FileExistsError:
+                # Taken since it was looked up
+                target = os.path.join(destination, get_free_name(destination, os.path.basename(file_path)))
+            except OSError as e:
+                if e.errno != errno.EXDEV or source != file_path:
+                    raise
+                source = copy_file(file_path, destination)
+    except BaseException:
+        if source != file_path and os.path.exists(source):
+            os.remove(source)
+        raise
+    if source != file_path:
+        fsync_directory(destination)
+        os.remove(file_path)
+    return target
@@ -0,0 +1,169 @@
+import functools
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Timing of the stages of the verification of a certificate file, in named spans:
+#
+#     file                              read_and_verify of a file (see certificate_processor)
+#     open, open.load, open.tables,     CommonUtils.open_file: loading the document, extracting its tables and text
+#     open.text                         (open.tables follows open for a file opened with header_only)
+#     extract.<field>                   each CertificateFactory.extract_* step
+#     rules.get_rules                   RuleMaker.get_rules
+#     verify                            CertificateVerifier.verify_plates
+#     report.<writer>                   the output_excel writers
+#
+# The spans are only created while a hook is registered: otherwise span() returns a shared no-op context manager and
+# the instrumented functions call the wrapped function directly, so that the overhead is a check of the hooks. The
+# hooks are called with each finished span, e.g. to add timers or counters. A span also sums the durations of the
+# spans nested in it by name (its stages), which gives the per-file timing records of the batch summaries.
+
+Hook = Callable[['Span'], None]
+
+hooks: Tuple[Hook, ...] = ()
+current = threading.local()
+
+
+class Span:
+    __slots__ = ('name', 'attributes', 'parent', 'start', 'end', 'stages')
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional['Span']):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start = 0.0
+        self.end = 0.0
+        self.stages: Dict[str, float] = dict()
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class SpanContext:
+    __slots__ = ('span',)
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.span = Span(name, attributes, getattr(current, 'span', None))
+
+    def __enter__(self) -> Span:
+        current.span = self.span
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        span = self.span
+        span.end = time.perf_counter()
+        current.span = span.parent
+        if span.parent is not None:
+            stages = span.parent.stages
+            stages[span.name] = stages.get(span.name, 0) + span.duration
+            for name, seconds in span.stages.items():
+                stages[name] = stages.get(name, 0) + seconds
+        if exc_type is not None:
+            span.attributes['error'] = exc_type.__name__
+        for hook in hooks:
+            hook(span)
+        return False
+
+
+class NoSpan:
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+def span(name: str, **attributes: Any):
+    # with span('open.load'): ... binds the span (None without hooks)
+    return SpanContext(name, attributes) if hooks else NO_SPAN
+
+
+def set_attributes(**attributes: Any):
+    # Adds the attributes to the innermost span, e.g. the shapes of the tables read (nothing without hooks)
+    if hooks and (current_span := getattr(current, 'span', None)) is not None:
+        current_span.attributes.update(attributes)
+
+
+def instrumented(name: str) -> Callable[[Callable], Callable]:
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not hooks:
+                return function(*args, **kwargs)
+            with SpanContext(name, dict()):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_methods(cls: type, prefix: str, span_prefix: str):
+    # Wraps the methods of the class whose names start with the prefix, e.g. extract_mass in the span extract.mass
+    for name, attribute in list(vars(cls).items()):
+        if not name.startswith(prefix):
+            continue
+        span_name = f"{span_prefix}.{name[len(prefix):]}"
+        if isinstance(attribute, staticmethod):
+            setattr(cls, name, staticmethod(instrumented(span_name)(attribute.__func__)))
+        elif callable(attribute):
+            setattr(cls, name, instrumented(span_name)(attribute))
+
+
+def add_hook(hook: Hook):
+    global hooks
+    hooks = hooks + (hook,)
+
+
+def remove_hook(hook: Hook):
+    global hooks
+    hooks = tuple([registered_hook for registered_hook in hooks if registered_hook != hook])
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percentile * len(ordered) / 100) - 1, 0)]
+
+
+class TimingSummary:
+    # A hook for the spans which are not nested in a file (e.g. the summary reports), and the per-file timing records
+
+    def __init__(self):
+        self.seconds: Dict[str, List[float]] = dict()
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, finished_span: Span):
+        if finished_span.parent is None and finished_span.name != 'file':
+            self.seconds.setdefault(finished_span.name, []).append(finished_span.duration)
+
+    def add_record(self, record: Dict[str, Any]):
+        # A record has the name of the file and the seconds of each stage
+        self.records.append(record)
+        for name, seconds in record['timings'].items():
+            self.seconds.setdefault(name, []).append(seconds)
+
+    def summarize(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'count': len(values), 'total': sum(values), 'p50': get_percentile(values, 50),
+                'p95': get_percentile(values, 95), 'p99': get_percentile(values, 99)
+            }
+            for name, values in sorted(self.seconds.items())
+        }
+
+    def __str__(self):
+        lines = [f"{'stage':<48}{'count':>7}{'total (s)':>11}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"]
+        for name, summary in self.summarize().items():
+            lines.append(
+                f"{name:<48}{summary['count']:>7}{summary['total']:>11.3f}{summary['p50'] * 1000:>10.2f}"
+                f"{summary['p95'] * 1000:>10.2f}{summary['p99'] * 1000:>10.2f}"
+            )
+        return '\n'.join(lines)
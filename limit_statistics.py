@@ -0,0 +1,164 @@
+import csv
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, is_dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Counters of the evaluations of the limits: how often each limit is verified, how often it fails (i.e. rejects a
+# steel plate) or raises, and the time spent in its verify method, per steel plant and specification. A limit is
+# known by its class and its parameters, e.g.
+#
+#     ChemicalCompositionLimit(chemical_element='C', limit_type=MAXIMUM, maximum=0.18)
+#
+# The verify methods of the limits of certificate_verification are wrapped by count_evaluations; they only record
+# anything while statistics are collected (with collect_limit_statistics, once enabled), otherwise the wrapper calls
+# the method directly. The compiled rule sets (see rule_compiler) only call the verify methods of the limits they don't
+# know about, the others are not counted.
+#
+#     python certificate_processor.py <directory> --limit-statistics limit_statistics.csv
+
+enabled = False
+state = threading.local()
+# Long texts which don't tell the limits apart
+IGNORED_PARAMETERS = ('unit', 'error_message')
+
+
+@dataclass
+class LimitCounter:
+    evaluations: int = 0
+    failures: int = 0
+    errors: int = 0
+    seconds: float = 0
+
+    def add(self, other: 'LimitCounter'):
+        self.evaluations += other.evaluations
+        self.failures += other.failures
+        self.errors += other.errors
+        self.seconds += other.seconds
+
+
+def render_parameter(value: Any) -> str:
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return f"[{', '.join([render_parameter(item) for item in value])}]"
+    if is_dataclass(value):
+        return get_limit_key(value)
+    return repr(value)
+
+
+def get_limit_key(limit) -> str:
+    # The limits are dataclasses, the parameters left unset (None) are skipped
+    parameters = [
+        f"{limit_field.name}={render_parameter(getattr(limit, limit_field.name))}" for limit_field in fields(limit)
+        if limit_field.name not in IGNORED_PARAMETERS and getattr(limit, limit_field.name) not in (None, (None,))
+    ]
+    return f"{type(limit).__name__}({', '.join(parameters)})"
+
+
+@dataclass
+class LimitStatistics:
+    steel_plant: Optional[str] = None
+    # (steel plant, specification, limit) -> counter
+    counters: Dict[Tuple[Optional[str], Optional[str], str], LimitCounter] = field(default_factory=dict)
+
+    def record(self, limit, plate, valid_flag: Optional[bool], seconds: float):
+        # valid_flag is None when the verification raised
+        specification = plate.specification.value if plate.specification is not None else None
+        key = (self.steel_plant, specification, get_limit_key(limit))
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = LimitCounter()
+        counter.evaluations += 1
+        counter.seconds += seconds
+        if valid_flag is None:
+            counter.errors += 1
+        elif not valid_flag:
+            counter.failures += 1
+
+    def merge(self, other: 'LimitStatistics'):
+        for key, counter in other.counters.items():
+            self.counters.setdefault(key, LimitCounter()).add(counter)
+
+    def get_groups(self) -> Dict[Tuple[str, str], List[Tuple[str, LimitCounter]]]:
+        # The limits of each steel plant and specification, those rejecting the most plates first, then the slowest
+        groups: Dict[Tuple[str, str], List[Tuple[str, LimitCounter]]] = dict()
+        for (steel_plant, specification, limit_key), counter in sorted(
+                self.counters.items(), key=lambda item: (-item[1].failures, -item[1].seconds, item[0][2])):
+            groups.setdefault((steel_plant or '-', specification or '-'), []).append((limit_key, counter))
+        return dict(sorted(groups.items()))
+
+    def write_csv(self, output_file: str):
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['steel_plant', 'specification', 'limit', 'evaluations', 'failures', 'errors', 'seconds'])
+            for (steel_plant, specification), limits in self.get_groups().items():
+                for limit_key, counter in limits:
+                    writer.writerow([steel_plant, specification, limit_key, counter.evaluations, counter.failures,
+                                     counter.errors, f"{counter.seconds:.6f}"])
+
+    def __str__(self):
+        lines = []
+        for (steel_plant, specification), limits in self.get_groups().items():
+            lines.append(f"{steel_plant} / {specification}")
+            lines.append(
+                f"    {'evaluations':>11}{'failures':>10}{'errors':>8}{'total (ms)':>12}{'mean (us)':>11}  limit"
+            )
+            for limit_key, counter in limits:
+                lines.append(
+                    f"    {counter.evaluations:>11}{counter.failures:>10}{counter.errors:>8}"
+                    f"{counter.seconds * 1000:>12.3f}{counter.seconds / counter.evaluations * 1e6:>11.1f}  {limit_key}"
+                )
+        return '\n'.join(lines)
+
+
+def enable_limit_statistics():
+    # Enabled before the worker processes are forked, so that they collect statistics too
+    global enabled
+    enabled = True
+
+
+def disable_limit_statistics():
+    global enabled
+    enabled = False
+
+
+@contextmanager
+def collect_limit_statistics(steel_plant: Optional[str] = None) -> Iterator[Optional[LimitStatistics]]:
+    # The statistics of the evaluations in the block, None when not enabled
+    if not enabled:
+        yield None
+        return
+    statistics = LimitStatistics(steel_plant)
+    previous = getattr(state, 'statistics', None)
+    state.statistics = statistics
+    try:
+        yield statistics
+    finally:
+        state.statistics = previous
+
+
+def counted(verify: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    @functools.wraps(verify)
+    def wrapper(limit, plate) -> bool:
+        statistics = getattr(state, 'statistics', None)
+        if statistics is None:
+            return verify(limit, plate)
+        start = time.perf_counter()
+        try:
+            valid_flag = verify(limit, plate)
+        except Exception:
+            statistics.record(limit, plate, None, time.perf_counter() - start)
+            raise
+        statistics.record(limit, plate, valid_flag, time.perf_counter() - start)
+        return valid_flag
+
+    return wrapper
+
+
+def count_evaluations(*limit_classes: type):
+    for limit_class in limit_classes:
+        limit_class.verify = counted(limit_class.verify)
@@ -0,0 +1,342 @@
+import bisect
+import collections
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from instrumentation import Span
+from rule_compiler import RuleCompiler
+from rule_space import RuleSpace
+
+# Live metrics of the batch and watch runs, in the Prometheus text format (version 0.0.4): written periodically to a
+# file (e.g. for the textfile collector of the node exporter, the file is replaced atomically) and/or served on
+# http://127.0.0.1:<port>/metrics.
+#
+#     python certificate_processor.py <directory> --metrics-file certificates.prom [--metrics-interval 15]
+#     python certificate_watcher.py <directory> --metrics-port 9108
+#
+#     certificate_files_total{verdict}                    files routed, by PASS, FAIL, EXCEPTION or DUPLICATE
+#     certificate_plates_total                            steel plates read
+#     certificate_exceptions_total{exception_class}       files routed to EXCEPTION, by class of the exception
+#     certificate_files_per_second, _plates_per_second    throughput over the last THROUGHPUT_WINDOW seconds (or since
+#                                                         the start, for a shorter run)
+#     certificate_files_pending                           files listed but not routed yet
+#     certificate_file_seconds                            histogram of the time of each file
+#     certificate_stage_seconds{stage}                    histogram of the time of each stage (see instrumentation)
+#     certificate_cache_lookups_total{cache,result}       lookups found (hit) or not (miss) in the caches of rule sets
+#                                                         (rule_space, rule_compiler_identity, rule_compiler_signature)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+THROUGHPUT_WINDOW = 60
+
+Labels = Tuple[str, ...]
+# (cache, hit or miss) -> lookups
+CacheLookups = Dict[Tuple[str, str], int]
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join([f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]) + '}'
+
+
+def write_textfile(path: str, text: str):
+    # Replaced atomically, the scraper never reads a partial file
+    partial_path = f"{path}.{os.getpid()}.partial"
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(partial_path, path)
+
+
+def get_cache_lookups() -> CacheLookups:
+    # The lookups of the caches of the current process since it started, see get_cache_lookups_since
+    rule_space = RuleSpace()
+    compiler = RuleCompiler()
+    return {
+        ('rule_space', 'hit'): rule_space.hits,
+        ('rule_space', 'miss'): rule_space.misses,
+        ('rule_compiler_identity', 'hit'): compiler.identity_hits,
+        ('rule_compiler_identity', 'miss'): compiler.signature_hits + compiler.misses,
+        ('rule_compiler_signature', 'hit'): compiler.signature_hits,
+        ('rule_compiler_signature', 'miss'): compiler.misses,
+    }
+
+
+def get_cache_lookups_since(lookups: CacheLookups) -> CacheLookups:
+    # The lookups since the given ones, e.g. of a file in a worker
+    return {
+        key: count - lookups.get(key, 0) for key, count in get_cache_lookups().items() if count > lookups.get(key, 0)
+    }
+
+
+class Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+
+    def get_labels(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"The labels of {self.name} are {self.label_names}, {tuple(labels)} are given.")
+        return tuple([str(labels[name]) for name in self.label_names])
+
+    def render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        with self.lock:
+            samples = self.render_samples()
+        return '\n'.join([f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"] + samples)
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[Labels, float] = dict()
+
+    def inc(self, amount: float = 1, **labels: str):
+        if amount < 0:
+            raise ValueError(f"The counter {self.name} can only increase, {amount} is given.")
+        key = self.get_labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self.get_labels(labels), 0)
+
+    def render_samples(self) -> List[str]:
+        return [
+            f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels: str):
+        key = self.get_labels(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: the counts of each bucket (not cumulative, the last one for +Inf), the sum of the values
+        self.counts: Dict[Labels, List[int]] = dict()
+        self.sums: Dict[Labels, float] = dict()
+
+    def observe(self, value: float, **labels: str):
+        key = self.get_labels(labels)
+        with self.lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+                self.sums[key] = 0
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sums[key] += value
+
+    def get_count(self, **labels: str) -> int:
+        return sum(self.counts.get(self.get_labels(labels), []))
+
+    def render_samples(self) -> List[str]:
+        samples = []
+        names = self.label_names + ('le',)
+        for key, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(f"{self.name}_bucket{format_labels(names, key + (format_value(bound),))} {cumulative}")
+            samples.append(f"{self.name}_sum{format_labels(self.label_names, key)} {format_value(self.sums[key])}")
+            samples.append(f"{self.name}_count{format_labels(self.label_names, key)} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = dict()
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"The metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, description, label_names))
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, description, label_names))
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, label_names, buckets))
+
+    def render(self) -> str:
+        return '\n'.join([metric.render() for metric in self.metrics.values()]) + '\n'
+
+
+class CertificateMetrics:
+    # The metrics of the files routed by the calling process. It is also a hook (see instrumentation), so that the
+    # workers time the stages of the files, and the stages outside of the files (the summaries) are observed.
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.files = self.registry.counter('certificate_files_total', 'Certificate files routed.', ['verdict'])
+        self.plates = self.registry.counter('certificate_plates_total', 'Steel plates read.')
+        self.exceptions = self.registry.counter('certificate_exceptions_total',
+                                                'Certificate files routed to EXCEPTION.', ['exception_class'])
+        self.files_per_second = self.registry.gauge(
+            'certificate_files_per_second', f"Certificate files routed per second over the last {THROUGHPUT_WINDOW} s."
+        )
+        self.plates_per_second = self.registry.gauge(
+            'certificate_plates_per_second', f"Steel plates read per second over the last {THROUGHPUT_WINDOW} s."
+        )
+        self.pending = self.registry.gauge('certificate_files_pending', 'Certificate files listed but not routed yet.')
+        self.file_seconds = self.registry.histogram('certificate_file_seconds', 'Seconds to read and verify a file.')
+        self.stage_seconds = self.registry.histogram('certificate_stage_seconds', 'Seconds of each stage.', ['stage'])
+        self.cache_lookups = self.registry.counter('certificate_cache_lookups_total',
+                                                   'Lookups in the caches of the rule sets.', ['cache', 'result'])
+        # (monotonic time, files, plates) of the routed files within the throughput window
+        self.recent: Deque[Tuple[float, int, int]] = collections.deque()
+        self.lock = threading.Lock()
+        # The rates of a run shorter than the window are over the time since it started
+        self.start = time.monotonic()
+
+    def __call__(self, finished_span: Span):
+        if finished_span.parent is None and finished_span.name != 'file':
+            self.stage_seconds.observe(finished_span.duration, stage=finished_span.name)
+
+    def record(self, result, verdict: str):
+        # The result of a file (see certificate_processor.FileResult) and where it was routed
+        plates = sum([len(certificate.steel_plates) for certificate in result.certificates])
+        self.files.inc(verdict=verdict)
+        self.plates.inc(plates)
+        if verdict == 'EXCEPTION':
+            self.exceptions.inc(exception_class=result.exception_class or 'Exception')
+        if result.timings is not None:
+            for stage, seconds in result.timings.items():
+                if stage == 'file':
+                    self.file_seconds.observe(seconds)
+                else:
+                    self.stage_seconds.observe(seconds, stage=stage)
+        for (cache, lookup_result), count in result.cache_lookups.items():
+            self.cache_lookups.inc(count, cache=cache, result=lookup_result)
+        with self.lock:
+            self.recent.append((time.monotonic(), 1, plates))
+        self.update_throughput()
+
+    def update_throughput(self):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0][0] > THROUGHPUT_WINDOW:
+                self.recent.popleft()
+            files = sum([files for _, files, _ in self.recent])
+            plates = sum([plates for _, _, plates in self.recent])
+        seconds = min(THROUGHPUT_WINDOW, now - self.start)
+        self.files_per_second.set(files / seconds if seconds > 0 else 0)
+        self.plates_per_second.set(plates / seconds if seconds > 0 else 0)
+
+    def set_pending(self, files: int):
+        self.pending.set(files)
+
+    def render(self) -> str:
+        self.update_throughput()
+        return self.registry.render()
+
+
+class MetricsExporter:
+    # Writes the metrics to the textfile every interval seconds (and when stopped), and/or serves them on the port
+
+    def __init__(self, metrics: CertificateMetrics, textfile: Optional[str] = None, port: Optional[int] = None,
+                 interval: float = 15):
+        self.metrics = metrics
+        self.textfile = textfile
+        self.port = port
+        self.interval = interval
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.stopped = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def write(self):
+        if self.textfile is not None:
+            write_textfile(self.textfile, self.metrics.render())
+
+    def start(self):
+        if self.port is not None:
+            self.server = ThreadingHTTPServer(('127.0.0.1', self.port), self.create_handler())
+            self.port = self.server.server_address[1]
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+            print(f"Serving the metrics on http://127.0.0.1:{self.port}/metrics")
+        if self.textfile is not None:
+            self.write()
+            self.threads.append(threading.Thread(target=self.write_periodically, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def write_periodically(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.write()
+
+    def create_handler(self):
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -1,13 +1,19 @@
 import os
-from typing import Any, Tuple, Union, List
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple, Union, List
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell, MergedCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.comments import Comment
+from openpyxl.worksheet.cell_range import CellRange
 from openpyxl.worksheet.worksheet import Worksheet
 
 from common import Certificate, CommonUtils, CertificateElementToVerify, CertificateElementInPlate, \
     ChemicalElementValue, PositionDirectionImpact
+from instrumentation import instrumented
 
 normal_font = Font(bold=False)
 bold_font = Font(bold=True)
@@ -21,6 +27,15 @@ redFill = PatternFill(
 thick = Side(border_style="thick", color="000000")
 thick_outsides_border = Border(top=thick, bottom=thick, left=thick, right=thick)
 
+# The styles of the cells are named styles, registered once per workbook and applied by name: the font, alignment,
+# border and fill of each cell are not looked up in the style tables of the workbook one by one.
+TITLE_STYLE = 'certificate_title'
+# The cells covered by a merged title, with the borders openpyxl gives them, the last one closing the border
+MERGED_TITLE_STYLE = 'certificate_merged_title'
+MERGED_TITLE_END_STYLE = 'certificate_merged_title_end'
+VALUE_STYLE = 'certificate_value'
+INVALID_VALUE_STYLE = 'certificate_invalid_value'
+
 # def output_title(sheet, row_cursor: int, element: CertificateElementToVerify):
 #     sheet.cell(row=row_cursor, column=1).value = element.__class__.__name__.upper()
 #     sheet.cell(row=row_cursor, column=1).font = bold_font
@@ -30,20 +45,34 @@ thick_outsides_border = Border(top=thick, bottom=thick, left=thick, right=thick)
 #         sheet.cell(row=row_cursor, column=2).comment = Comment(element.message, 'CMC_Verification')
 
 
-def write_title(sheet, row_cursor: int, column_cursor: int, value: Any, font: Font = bold_font,
-                alignment: Alignment = center_aligned_text, border: Border = thick_outsides_border):
+def create_named_styles() -> List[NamedStyle]:
+    # New objects for each workbook, a named style is bound to the workbook it is added to
+    return [
+        NamedStyle(TITLE_STYLE, font=bold_font, alignment=center_aligned_text, border=thick_outsides_border),
+        NamedStyle(MERGED_TITLE_STYLE, font=DEFAULT_FONT, border=Border(top=thick, bottom=thick)),
+        NamedStyle(MERGED_TITLE_END_STYLE, font=DEFAULT_FONT, border=Border(top=thick, bottom=thick, right=thick)),
+        NamedStyle(VALUE_STYLE, font=normal_font, alignment=left_aligned_text, border=DEFAULT_BORDER),
+        NamedStyle(INVALID_VALUE_STYLE, font=normal_font, alignment=left_aligned_text, border=DEFAULT_BORDER,
+                   fill=redFill),
+    ]
+
+
+def create_workbook(write_only: bool = False) -> Workbook:
+    workbook = Workbook(write_only=write_only)
+    for named_style in create_named_styles():
+        workbook.add_named_style(named_style)
+    return workbook
+
+
+def write_title(sheet, row_cursor: int, column_cursor: int, value: Any, style: str = TITLE_STYLE):
     cell = sheet.cell(row_cursor, column_cursor)
     cell.value = value
-    cell.font = font
-    cell.alignment = alignment
-    cell.border = border
+    cell.style = style
 
 
-def write_value(sheet, row_cursor: int, column_cursor: int, element: Union[CertificateElementInPlate, str],
-                font: Font = normal_font, alignment: Alignment = left_aligned_text):
+def write_value(sheet, row_cursor: int, column_cursor: int, element: Union[CertificateElementInPlate, str]):
     cell = sheet.cell(row=row_cursor, column=column_cursor)
-    cell.font = font
-    cell.alignment = alignment
+    cell.style = VALUE_STYLE
     if isinstance(element, str):
         cell.value = element
     else:
@@ -54,15 +83,14 @@ def write_value(sheet, row_cursor: int, column_cursor: int, element: Union[Certi
         else:
             cell.value = element.value
         if isinstance(element, CertificateElementToVerify) and not element.valid_flag:
-            cell.fill = redFill
-            cell.comment = Comment(element.message, 'CMC_Verification')
+            cell.style = INVALID_VALUE_STYLE
+            # The message is kept as limit results during verification and only rendered here.
+            cell.comment = Comment(str(element.message), 'CMC_Verification')
 
 
-def initialize_workbook(sheet_name: str) -> Tuple[Workbook, Worksheet, int, int]:
-    # Initialize excel workbook
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = sheet_name
+def build_header(sheet) -> int:
+    # Writes the two rows of the header from scratch, returns the first row after it. Only used to build the header
+    # template, the workbooks get a clone of the template (see initialize_workbook)
     row_cursor, column_cursor = 1, 1
 
     # Prepare the title area
@@ -128,14 +156,57 @@ def initialize_workbook(sheet_name: str) -> Tuple[Workbook, Worksheet, int, int]
     write_title(sheet, row_cursor := row_cursor - 1, column_cursor := column_cursor + 1, 'DELIVERY CONDITION')
     write_title(sheet, row_cursor := row_cursor + 1, column_cursor, '')
 
-    row_cursor += 1
-    column_cursor = 1
+    return row_cursor + 1
+
 
-    return workbook, sheet, row_cursor, column_cursor
+@dataclass
+class HeaderTemplate:
+    # The cells of the header (value and named style) by row and column, its merged ranges and the first row after it
+    rows: List[List[Tuple[Any, str]]]
+    merged_ranges: List[str]
+    row_cursor: int
 
-    # print(row_cursor, column_cursor)
+    def clone(self, sheet) -> int:
+        # The sheet is a worksheet or a RowBuffer, returns the first row after the header
+        for row_index, row in enumerate(self.rows, 1):
+            for column_index, (value, style) in enumerate(row, 1):
+                write_title(sheet, row_index, column_index, value, style)
+        for merged_range in self.merged_ranges:
+            sheet.merge_cells(merged_range)
+        return self.row_cursor
 
-    # workbook.save(filename=output_file)
+
+def create_header_template() -> HeaderTemplate:
+    sheet = create_workbook().active
+    row_cursor = build_header(sheet)
+    rows = []
+    for row in sheet.iter_rows():
+        rows.append([
+            (None, MERGED_TITLE_END_STYLE if cell.border.right.style else MERGED_TITLE_STYLE)
+            if isinstance(cell, MergedCell) else (cell.value, cell.style)
+            for cell in row
+        ])
+    return HeaderTemplate(rows, [merged_range.coord for merged_range in sheet.merged_cells.ranges], row_cursor)
+
+
+# Built once per process by get_header_template
+header_template: Optional[HeaderTemplate] = None
+
+
+def get_header_template() -> HeaderTemplate:
+    global header_template
+    if header_template is None:
+        header_template = create_header_template()
+    return header_template
+
+
+def initialize_workbook(sheet_name: str) -> Tuple[Workbook, Worksheet, int, int]:
+    # Initialize excel workbook
+    workbook = create_workbook()
+    sheet = workbook.active
+    sheet.title = sheet_name
+    row_cursor = get_header_template().clone(sheet)
+    return workbook, sheet, row_cursor, 1
 
 
 def write_single_certificate(certificate: Certificate, sheet, row_cursor: int) -> int:
@@ -202,23 +273,85 @@ def write_single_certificate(certificate: Certificate, sheet, row_cursor: int) -
     return row_cursor + len(certificate.steel_plates)
 
 
+@instrumented('report.write_single_certificate_to_excel')
 def write_single_certificate_to_excel(certificate: Certificate, sheet_name: str, output_file: str):
     workbook, sheet, row_cursor, column_cursor = initialize_workbook(sheet_name)
     write_single_certificate(certificate, sheet, row_cursor)
     workbook.save(filename=output_file)
 
 
-def write_multiple_certificates_to_excel(certificates: List[Certificate], sheet_name: str = 'PASS',
+class RowBuffer:
+    # Stands in for the worksheet of write_title and write_value: the cells are kept until flushed, then appended to the
+    # write-only worksheet row by row (the rows of a write-only worksheet can only be appended, in order)
+
+    def __init__(self, sheet: Any, row_cursor: int = 1):
+        # The sheet is the write-only worksheet (Workbook.create_sheet of a write-only workbook)
+        self.sheet = sheet
+        self.row_cursor = row_cursor
+        self.rows: Dict[int, Dict[int, WriteOnlyCell]] = dict()
+
+    def cell(self, row: int, column: int) -> WriteOnlyCell:
+        if row < self.row_cursor:
+            raise ValueError(f"Row {row} is already written, the next row is {self.row_cursor}.")
+        cells = self.rows.setdefault(row, dict())
+        if column not in cells:
+            cells[column] = WriteOnlyCell(self.sheet)
+        return cells[column]
+
+    def flush(self):
+        while self.rows:
+            cells = self.rows.pop(self.row_cursor, dict())
+            self.sheet.append([cells.get(column) for column in range(1, max(cells, default=0) + 1)])
+            self.row_cursor += 1
+
+    def merge_cells(self, range_string: str):
+        # Written with the worksheet, after the rows
+        self.sheet.merged_cells.add(CellRange(range_string))
+
+
+class StreamingCertificateWorkbook:
+    # Writes the rows of the certificates as they come to a write-only workbook, after a clone of the header template.
+    # The memory does not grow with the number of rows, only the comments of the invalid values are kept until saved.
+    #
+    #     with StreamingCertificateWorkbook(os.path.join('PASS', 'PASS.xlsx')) as workbook:
+    #         for certificate in certificates:
+    #             workbook.write(certificate)
+
+    def __init__(self, output_file: str, sheet_name: str = 'PASS'):
+        self.output_file = output_file
+        self.workbook = create_workbook(write_only=True)
+        self.rows = RowBuffer(self.workbook.create_sheet(sheet_name))
+        get_header_template().clone(self.rows)
+        self.rows.flush()
+
+    def write(self, certificate: Certificate):
+        write_single_certificate(certificate, self.rows, self.rows.row_cursor)
+        self.rows.flush()
+
+    def save(self):
+        self.workbook.save(filename=self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # A write-only workbook can only be saved once, it is not saved when the writing failed
+        if exc_type is None:
+            self.save()
+
+
+@instrumented('report.write_multiple_certificates_to_excel')
+def write_multiple_certificates_to_excel(certificates: Iterable[Certificate], sheet_name: str = 'PASS',
                                          output_file: str = os.path.join('PASS', 'PASS.xlsx')):
-    workbook, sheet, row_cursor, column_cursor = initialize_workbook(sheet_name)
-    for certificate in certificates:
-        row_cursor = write_single_certificate(certificate, sheet, row_cursor)
-    workbook.save(filename=output_file)
+    with StreamingCertificateWorkbook(output_file, sheet_name) as workbook:
+        for certificate in certificates:
+            workbook.write(certificate)
 
 
+@instrumented('report.write_certificates_with_exception')
 def write_certificates_with_exception(certificates_with_exception: List[Tuple[str, str]], sheet_name: str = 'EXCEPTION',
                                       output_file: str = os.path.join('EXCEPTION', 'EXCEPTION.xlsx')):
-    workbook = Workbook()
+    workbook = create_workbook()
     sheet = workbook.active
     sheet.title = sheet_name
     write_title(sheet, row_cursor := 1, column_cursor := 1, 'FILE NAME')
@@ -229,6 +362,22 @@ def write_certificates_with_exception(certificates_with_exception: List[Tuple[st
     workbook.save(filename=output_file)
 
 
+@instrumented('report.write_duplicates')
+def write_duplicates(duplicates: List[Tuple[str, str, str]], sheet_name: str = 'DUPLICATE',
+                     output_file: str = os.path.join('DUPLICATE', 'DUPLICATE.xlsx')):
+    workbook = create_workbook()
+    sheet = workbook.active
+    sheet.title = sheet_name
+    write_title(sheet, row_cursor := 1, column_cursor := 1, 'FILE NAME')
+    write_title(sheet, row_cursor, column_cursor + 1, 'DUPLICATE OF')
+    write_title(sheet, row_cursor, column_cursor + 2, 'VERDICT')
+    for file_name, earlier_file_name, verdict in duplicates:
+        write_value(sheet, row_cursor := row_cursor + 1, column_cursor := 1, file_name)
+        write_value(sheet, row_cursor, column_cursor + 1, earlier_file_name)
+        write_value(sheet, row_cursor, column_cursor + 2, verdict)
+    workbook.save(filename=output_file)
+
+
 if __name__ == '__main__':
     # output_single_certificate_to_excel(None, 'Test', 'test.xlsx')
     pass
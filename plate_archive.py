@@ -0,0 +1,298 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from common import Certificate, SteelPlate, CommonUtils
+from results_store import get_plate_verdict
+
+# Columnar archive of the verified steel plates, for audits scanning years of data. The archive is partitioned by steel
+# plant and by the month the certificates were verified (see FileResult.verified_at), and each export adds a chunk to
+# its partitions:
+#
+#     <root>/plant=BAOSHAN_IRON_STEEL_CO_LTD/month=2020-12/chunk-000001/meta.json
+#                                                                       specification.bin
+#                                                                       C.bin ...
+#
+# Each column is a file of fixed width values: float64 for the numbers (NaN when missing), and int32 codes into the
+# dictionary kept in meta.json for the strings (-1 when missing). The reader memory-maps the columns, prunes the
+# partitions by plant and month, evaluates the filters on the dictionary codes, and only materializes the values of the
+# matching rows of the requested columns.
+#
+# The certificates are exported from the job journal of a batch (see certificate_journal) once it is reported, e.g.
+# after each batch. An export skips the certificates whose number is already in their partition, so exporting the same
+# journal again, or a journal resumed since, does not add the same plates twice.
+#
+#     python plate_archive.py export <journal> <archive> [--month YYYY-MM]
+#     python plate_archive.py query <archive> [--plant PLANT] [--month YYYY-MM] [--specification SPEC]
+#                                   [--delivery-condition CONDITION] [--columns COLUMN ...]
+
+STRING_COLUMNS = [
+    'steel_plant', 'certificate_no', 'batch_no', 'plate_no', 'specification', 'delivery_condition',
+    'steel_making_type', 'direction', 'verdict'
+]
+IMPACT_ENERGY_COLUMNS = ['impact_energy_1', 'impact_energy_2', 'impact_energy_3', 'impact_energy_4']
+NUMBER_COLUMNS = [
+    'serial_number', 'thickness', 'quantity', 'mass', 'yield_strength', 'tensile_strength', 'elongation',
+    'temperature'
+] + IMPACT_ENERGY_COLUMNS + CommonUtils.chemical_elements_table
+COLUMNS = STRING_COLUMNS + NUMBER_COLUMNS
+
+# array type codes: the columns of strings hold the codes of the values in their dictionary
+STRING_TYPE = 'i'
+NUMBER_TYPE = 'd'
+
+
+def get_partition_name(steel_plant: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', steel_plant or 'UNKNOWN').strip('_')
+
+
+def get_month(timestamp: Optional[float] = None) -> str:
+    return time.strftime('%Y-%m', time.localtime(timestamp))
+
+
+def get_number(element) -> float:
+    if element is None or element.value is None:
+        return math.nan
+    try:
+        return float(element.value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def get_string(element) -> Optional[str]:
+    return None if element is None or element.value is None else str(element.value)
+
+
+def get_plate_row(certificate: Certificate, plate: SteelPlate) -> Dict[str, Any]:
+    row = {
+        'steel_plant': certificate.steel_plant,
+        'certificate_no': certificate.certificate_no,
+        'batch_no': get_string(plate.batch_no),
+        'plate_no': get_string(plate.plate_no),
+        'specification': get_string(plate.specification),
+        'delivery_condition': get_string(plate.delivery_condition),
+        'steel_making_type': get_string(plate.steel_making_type),
+        'direction': get_string(plate.position_direction_impact),
+        'verdict': get_plate_verdict(plate),
+        'serial_number': get_number(plate.serial_number),
+        'thickness': get_number(plate.thickness),
+        'quantity': get_number(plate.quantity),
+        'mass': get_number(plate.mass),
+        'yield_strength': get_number(plate.yield_strength),
+        'tensile_strength': get_number(plate.tensile_strength),
+        'elongation': get_number(plate.elongation),
+        'temperature': get_number(plate.temperature)
+    }
+    for index, column in enumerate(IMPACT_ENERGY_COLUMNS):
+        row[column] = get_number(plate.impact_energy_list[index]) if index < len(plate.impact_energy_list) else math.nan
+    for element in CommonUtils.chemical_elements_table:
+        value = plate.chemical_compositions.get(element)
+        row[element] = math.nan if value is None or value.calculated_value is None else float(value.calculated_value)
+    return row
+
+
+class MappedColumn:
+
+    def __init__(self, path: str, type_code: str):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.values = memoryview(self.mmap).cast(type_code)
+
+    def close(self):
+        self.values.release()
+        self.mmap.close()
+
+
+class PlateArchive:
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def export(self, certificates: List[Certificate], month: Optional[str] = None) -> List[str]:
+        # Adds the plates of the certificates to the partitions of the month (the current one unless given), returns
+        # the chunks written
+        month = month or get_month()
+        return self.export_months([(month, certificate) for certificate in certificates])
+
+    def export_results(self, results: Iterable[Any], month: Optional[str] = None) -> List[str]:
+        # The certificates of the results of certificate_processor (see FileResult), in the partitions of the month
+        # they were verified, unless a month is given
+        return self.export_months([
+            (month or get_month(result.verified_at), certificate)
+            for result in results for certificate in result.certificates
+        ])
+
+    def export_months(self, certificates: List[Tuple[str, Certificate]]) -> List[str]:
+        partitions: Dict[Tuple[str, str], List[Certificate]] = dict()
+        for month, certificate in certificates:
+            partitions.setdefault((get_partition_name(certificate.steel_plant), month), []).append(certificate)
+        chunks = []
+        for (plant, month), partition_certificates in partitions.items():
+            # Exported before, or twice in the certificates
+            certificate_nos = self.get_certificate_nos(plant, month)
+            rows = []
+            for certificate in partition_certificates:
+                if certificate.certificate_no not in certificate_nos:
+                    certificate_nos.add(certificate.certificate_no)
+                    rows.extend(get_plate_row(certificate, plate) for plate in certificate.steel_plates)
+            if rows:
+                chunks.append(self.write_chunk(plant, month, rows))
+        return chunks
+
+    def get_certificate_nos(self, plant: str, month: str) -> Set[str]:
+        # The certificate numbers of a partition, from the dictionaries of its chunks
+        certificate_nos = set()
+        for chunk in self.get_chunks(month=month, partition=plant):
+            with open(os.path.join(chunk, 'meta.json'), encoding='utf-8') as f:
+                certificate_nos.update(json.load(f)['dictionaries']['certificate_no'])
+        return certificate_nos
+
+    def write_chunk(self, plant: str, month: str, rows: List[Dict[str, Any]]) -> str:
+        partition = os.path.join(self.root, f"plant={plant}", f"month={month}")
+        os.makedirs(partition, exist_ok=True)
+        chunk_numbers = [int(name[6:]) for name in os.listdir(partition) if re.fullmatch(r'chunk-\d+', name)]
+        chunk = os.path.join(partition, f"chunk-{max(chunk_numbers, default=0) + 1:06d}")
+        # Written aside and renamed, so that a reader never sees a partial chunk
+        temporary = f"{chunk}.tmp"
+        os.makedirs(temporary)
+        meta = {'rows': len(rows), 'byteorder': sys.byteorder, 'dictionaries': dict()}
+        for column in STRING_COLUMNS:
+            dictionary: Dict[str, int] = dict()
+            codes = array(STRING_TYPE, [
+                -1 if row[column] is None else dictionary.setdefault(row[column], len(dictionary)) for row in rows
+            ])
+            meta['dictionaries'][column] = list(dictionary)
+            with open(os.path.join(temporary, f"{column}.bin"), 'wb') as f:
+                codes.tofile(f)
+        for column in NUMBER_COLUMNS:
+            with open(os.path.join(temporary, f"{column}.bin"), 'wb') as f:
+                array(NUMBER_TYPE, [row[column] for row in rows]).tofile(f)
+        with open(os.path.join(temporary, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temporary, chunk)
+        return chunk
+
+    def get_chunks(self, plant: Optional[str] = None, month: Optional[str] = None,
+                   partition: Optional[str] = None) -> List[str]:
+        # The partitions of other plants (or another partition name, see get_partition_name) or months are skipped by
+        # their directory name
+        chunks = []
+        if not os.path.isdir(self.root):
+            return chunks
+        partition = partition or (None if plant is None else get_partition_name(plant))
+        for plant_directory in sorted(os.listdir(self.root)):
+            if partition is not None and plant_directory != f"plant={partition}":
+                continue
+            plant_path = os.path.join(self.root, plant_directory)
+            for month_directory in sorted(os.listdir(plant_path)):
+                if month is not None and month_directory != f"month={month}":
+                    continue
+                month_path = os.path.join(plant_path, month_directory)
+                chunks.extend(
+                    os.path.join(month_path, name) for name in sorted(os.listdir(month_path))
+                    if re.fullmatch(r'chunk-\d+', name)
+                )
+        return chunks
+
+    def read(self, columns: Optional[List[str]] = None, plant: Optional[str] = None, month: Optional[str] = None,
+             **filters: Optional[str]) -> Dict[str, List[Any]]:
+        # Returns the values of the columns for the plates matching all the filters, which are string columns
+        # (specification, delivery_condition, verdict...) and the value they must be equal to.
+        columns = columns or COLUMNS
+        unknown_columns = [column for column in list(columns) + list(filters) if column not in COLUMNS]
+        if unknown_columns:
+            raise ValueError(f"The columns {unknown_columns} are not in the plate archive.")
+        for column in filters:
+            if column not in STRING_COLUMNS:
+                raise ValueError(f"The plate archive can only be filtered by the string columns, not by {column}.")
+        result: Dict[str, List[Any]] = {column: [] for column in columns}
+        for chunk in self.get_chunks(plant, month):
+            for column, values in self.read_chunk(chunk, columns, filters).items():
+                result[column].extend(values)
+        return result
+
+    def scan(self, columns: Optional[List[str]] = None, plant: Optional[str] = None, month: Optional[str] = None,
+             **filters: Optional[str]) -> Iterator[Dict[str, Any]]:
+        # The rows of read, chunk by chunk
+        columns = columns or COLUMNS
+        for chunk in self.get_chunks(plant, month):
+            values = self.read_chunk(chunk, columns, filters)
+            for index in range(len(values[columns[0]])):
+                yield {column: values[column][index] for column in columns}
+
+    @staticmethod
+    def read_chunk(chunk: str, columns: List[str], filters: Dict[str, Optional[str]]) -> Dict[str, List[Any]]:
+        with open(os.path.join(chunk, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError(f"The chunk {chunk} was written with {meta['byteorder']} endian values.")
+        result: Dict[str, List[Any]] = {column: [] for column in columns}
+        # The filters are compared on the codes, a value absent from the dictionary excludes the whole chunk
+        codes = dict()
+        for column, value in filters.items():
+            if value is None:
+                continue
+            dictionary = meta['dictionaries'][column]
+            if value not in dictionary:
+                return result
+            codes[column] = dictionary.index(value)
+        if meta['rows'] == 0:
+            return result
+        mapped_columns: Dict[str, MappedColumn] = dict()
+        try:
+            def get_column(name: str) -> memoryview:
+                if name not in mapped_columns:
+                    type_code = STRING_TYPE if name in STRING_COLUMNS else NUMBER_TYPE
+                    mapped_columns[name] = MappedColumn(os.path.join(chunk, f"{name}.bin"), type_code)
+                return mapped_columns[name].values
+
+            indices = range(meta['rows'])
+            for column, code in codes.items():
+                values = get_column(column)
+                indices = [index for index in indices if values[index] == code]
+            for column in columns:
+                values = get_column(column)
+                if column in STRING_COLUMNS:
+                    dictionary = meta['dictionaries'][column]
+                    result[column] = [None if values[index] < 0 else dictionary[values[index]] for index in indices]
+                else:
+                    result[column] = [values[index] for index in indices]
+        finally:
+            for mapped_column in mapped_columns.values():
+                mapped_column.close()
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export and query the archive of the verified steel plates.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='export the certificates of a job journal')
+    export_parser.add_argument('journal')
+    export_parser.add_argument('archive')
+    export_parser.add_argument('--month', default=None, help='YYYY-MM (default: the month of the verification)')
+    query_parser = subparsers.add_parser('query', help='print the plates of the archive')
+    query_parser.add_argument('archive')
+    query_parser.add_argument('--plant', default=None)
+    query_parser.add_argument('--month', default=None)
+    query_parser.add_argument('--specification', default=None)
+    query_parser.add_argument('--delivery-condition', default=None)
+    query_parser.add_argument('--columns', nargs='+', default=None)
+    arguments = parser.parse_args()
+    if arguments.command == 'export':
+        from certificate_journal import JobJournal
+        journal = JobJournal(arguments.journal)
+        exported_results = [file_result for _, file_result in journal.get_results()]
+        for written_chunk in PlateArchive(arguments.archive).export_results(exported_results, arguments.month):
+            print(f"Written {written_chunk}")
+    else:
+        for plate_row in PlateArchive(arguments.archive).scan(
+                arguments.columns, arguments.plant, arguments.month, specification=arguments.specification,
+                delivery_condition=arguments.delivery_condition):
+            print(plate_row)
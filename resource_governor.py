@@ -0,0 +1,195 @@
+import collections
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Iterator, List, Optional, Tuple
+
+# Governor of the worker processes reading the certificate files: a pathological file (pdfplumber extracting the tables
+# of a PDF for minutes, or without bound on memory) must not stall the batch. Each worker reads one file at a time, and
+# its file is given up, with the worker killed and replaced, when it runs longer than the timeout or when the resident
+# memory of the worker grows by more than the ceiling. The file gets the result of on_failure with the reason, e.g.
+# "timeout after 30 s", which certificate_processor routes to EXCEPTION. The results are yielded as the files complete,
+# with the index of their file. The workers are also recycled after max_tasks files, and after a file which left them
+# above the memory ceiling. The workers are stopped at the end of each run, unless the caller keeps them across its
+# runs (see keep_workers).
+#
+# The ceiling applies to the growth of the worker above its baseline, the resident memory it reports once started and
+# warmed up: a forked worker starts with the pages of the parent (shared until written), which grow over a batch. The
+# timeout is counted from the baseline too, the warm-up of a new worker is not charged to its first file.
+#
+#     python certificate_processor.py <directory> [--timeout 30] [--max-rss 2048] [--max-tasks 50]
+#
+# The memory is read from /proc, the ceiling is not enforced on the systems without it (Windows).
+
+MEBIBYTE = 1024 * 1024
+
+
+def get_rss(pid: int) -> Optional[int]:
+    # The resident memory of the process in bytes, None if it cannot be read
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def serve(connection, function: Callable[[str], Any], initializer: Optional[Callable[[], None]]):
+    # The loop of a worker: its baseline memory out once warmed up, then a file path in, the result of the function out,
+    # None to stop
+    if initializer is not None:
+        initializer()
+    connection.send(get_rss(os.getpid()))
+    while (file_path := connection.recv()) is not None:
+        connection.send(function(file_path))
+
+
+class GovernedWorker:
+
+    def __init__(self, context, function: Callable[[str], Any], initializer: Optional[Callable[[], None]]):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve, args=(child_connection, function, initializer), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.tasks = 0
+        self.task: Optional[Tuple[int, str]] = None
+        # When the worker started on its file: at submit, or once warmed up for the first file of a new worker
+        self.started_at = 0.0
+        # The resident memory once started, None until the worker sends it (or if it cannot be read)
+        self.ready = False
+        self.baseline_rss: Optional[int] = None
+
+    def get_rss_growth(self) -> Optional[int]:
+        # The resident memory above the baseline, None while it is not known
+        if self.baseline_rss is None:
+            return None
+        rss = get_rss(self.process.pid)
+        return rss - self.baseline_rss if rss is not None else None
+
+    def submit(self, index: int, file_path: str):
+        self.task = (index, file_path)
+        self.started_at = time.monotonic()
+        self.tasks += 1
+        self.connection.send(file_path)
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class ResourceGovernor:
+
+    def __init__(self, timeout: Optional[float] = None, max_rss: Optional[int] = None, max_tasks: Optional[int] = None,
+                 poll_interval: float = 0.1):
+        # timeout in seconds, max_rss in bytes
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.max_tasks = max_tasks
+        self.poll_interval = poll_interval
+        self.recycled_workers = 0
+        self.killed_workers = 0
+        # The idle workers kept between the runs, None unless keep_workers was called
+        self.kept_workers: Optional[List[GovernedWorker]] = None
+
+    def keep_workers(self):
+        # Until stop_workers, the idle workers are kept for the next run, e.g. of a node verifying its files in rounds
+        # (see certificate_node). A kept worker runs the function it was started with, the runs must use the same one.
+        if self.kept_workers is None:
+            self.kept_workers = []
+
+    def stop_workers(self):
+        for worker in self.kept_workers or []:
+            worker.stop()
+        self.kept_workers = None
+
+    def get_reason(self, worker: GovernedWorker) -> Optional[str]:
+        # Why the file of the worker is given up, None while it is within the limits
+        if self.timeout is not None and worker.ready and time.monotonic() - worker.started_at > self.timeout:
+            return f"timeout after {self.timeout:g} s"
+        growth = worker.get_rss_growth() if self.max_rss is not None else None
+        if growth is not None and growth > self.max_rss:
+            return f"memory above the ceiling of {self.max_rss // MEBIBYTE} MiB (+{growth // MEBIBYTE} MiB)"
+        if not worker.process.is_alive():
+            return f"worker exited with code {worker.process.exitcode}"
+        return None
+
+    def should_recycle(self, worker: GovernedWorker) -> bool:
+        if self.max_tasks is not None and worker.tasks >= self.max_tasks:
+            return True
+        growth = worker.get_rss_growth() if self.max_rss is not None else None
+        return growth is not None and growth > self.max_rss
+
+    def run(self, file_paths: List[str], workers: int, function: Callable[[str], Any],
+            on_failure: Callable[[str, str], Any], context=None,
+            initializer: Optional[Callable[[], None]] = None) -> Iterator[Tuple[int, Any]]:
+        # Yields the index of each file with its result as the files complete, they are dispatched in the given order
+        context = context or multiprocessing.get_context()
+        queue: Deque[int] = collections.deque(range(len(file_paths)))
+        pool: List[GovernedWorker] = self.kept_workers if self.kept_workers is not None else []
+        # A kept worker may have died while idle
+        for worker in [worker for worker in pool if not worker.process.is_alive()]:
+            self.replace(pool, worker, killed=True)
+        completed = 0
+        try:
+            while completed < len(file_paths):
+                while queue and len(pool) < workers:
+                    pool.append(GovernedWorker(context, function, initializer))
+                for worker in pool:
+                    if worker.task is None and queue:
+                        index = queue.popleft()
+                        worker.submit(index, file_paths[index])
+                busy_workers = [worker for worker in pool if worker.task is not None]
+                ready = wait([worker.connection for worker in busy_workers], timeout=self.poll_interval)
+                results: List[Tuple[int, Any]] = []
+                for worker in busy_workers:
+                    index, file_path = worker.task
+                    if worker.connection in ready:
+                        try:
+                            if not worker.ready:
+                                worker.baseline_rss, worker.ready = worker.connection.recv(), True
+                                worker.started_at = time.monotonic()
+                                if not worker.connection.poll():
+                                    # Still reading its file
+                                    continue
+                            results.append((index, worker.connection.recv()))
+                        except (EOFError, OSError):
+                            self.replace(pool, worker, killed=True)
+                            reason = f"worker exited with code {worker.process.exitcode}"
+                            results.append((index, on_failure(file_path, reason)))
+                            continue
+                        worker.task = None
+                        if self.should_recycle(worker):
+                            self.replace(pool, worker, killed=False)
+                    elif (reason := self.get_reason(worker)) is not None:
+                        print(f"Gave up {os.path.basename(file_path)}: {reason}")
+                        results.append((index, on_failure(file_path, reason)))
+                        self.replace(pool, worker, killed=True)
+                completed += len(results)
+                yield from results
+        finally:
+            for worker in list(pool):
+                if worker.task is not None:
+                    pool.remove(worker)
+                    worker.kill()
+                elif self.kept_workers is None:
+                    worker.stop()
+
+    def replace(self, pool: List[GovernedWorker], worker: GovernedWorker, killed: bool):
+        # The worker is removed from the pool, a new one is started when there is a file for it
+        pool.remove(worker)
+        if killed:
+            self.killed_workers += 1
+            worker.kill()
+        else:
+            self.recycled_workers += 1
+            worker.stop()
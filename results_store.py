@@ -0,0 +1,216 @@
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from common import Certificate, SteelPlate, CertificateElementInPlate, CertificateElementToVerify
+
+# Persistent store of the certificates read by the batch drivers, to look up plates and verdicts without reading the
+# files again. One row per certificate (or per file with an exception), per steel plate, per chemical element and per
+# mechanical test result:
+#
+#     certificates (certificate_no, steel_plant, file_name, verdict, exception_message, processed_at)
+#     plates (certificate_id, serial_number, batch_no, plate_no, specification, thickness, ..., verdict)
+#     chemistry (plate_id, element, value, valid_flag, message)
+#     mechanical (plate_id, test, test_number, value, direction, valid_flag, message)
+#
+# The verdicts are the ones given by the verifier (see CertificateVerifier.verify_plates): a plate is PASS when all its
+# rules pass, a certificate is PASS when all its plates pass, and EXCEPTION for the files which could not be read.
+# file_name is the name of the file in its destination, e.g. PASS/<stem> (1).pdf is stored as <stem> (1).pdf.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS certificates (
+    id INTEGER PRIMARY KEY,
+    certificate_no TEXT,
+    steel_plant TEXT,
+    file_name TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    exception_message TEXT,
+    processed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plates (
+    id INTEGER PRIMARY KEY,
+    certificate_id INTEGER NOT NULL REFERENCES certificates (id),
+    serial_number INTEGER,
+    batch_no TEXT,
+    plate_no TEXT,
+    specification TEXT,
+    thickness REAL,
+    quantity INTEGER,
+    mass REAL,
+    delivery_condition TEXT,
+    steel_making_type TEXT,
+    verdict TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chemistry (
+    plate_id INTEGER NOT NULL REFERENCES plates (id),
+    element TEXT NOT NULL,
+    value REAL,
+    valid_flag INTEGER,
+    message TEXT
+);
+CREATE TABLE IF NOT EXISTS mechanical (
+    plate_id INTEGER NOT NULL REFERENCES plates (id),
+    test TEXT NOT NULL,
+    test_number TEXT,
+    value REAL,
+    direction TEXT,
+    valid_flag INTEGER,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS certificates_certificate_no ON certificates (certificate_no);
+CREATE INDEX IF NOT EXISTS certificates_verdict ON certificates (verdict);
+CREATE INDEX IF NOT EXISTS certificates_processed_at ON certificates (processed_at);
+CREATE INDEX IF NOT EXISTS plates_certificate_id ON plates (certificate_id);
+CREATE INDEX IF NOT EXISTS plates_batch_no ON plates (batch_no);
+CREATE INDEX IF NOT EXISTS plates_plate_no ON plates (plate_no);
+CREATE INDEX IF NOT EXISTS plates_specification_thickness ON plates (specification, thickness);
+CREATE INDEX IF NOT EXISTS plates_verdict ON plates (verdict);
+CREATE INDEX IF NOT EXISTS chemistry_plate_id ON chemistry (plate_id);
+CREATE INDEX IF NOT EXISTS mechanical_plate_id ON mechanical (plate_id);
+'''
+
+
+def get_value(element: Optional[CertificateElementInPlate]) -> Any:
+    return None if element is None else element.value
+
+
+def get_message(element: CertificateElementToVerify) -> Optional[str]:
+    return None if element.message is None else str(element.message)
+
+
+def get_verified_elements(plate: SteelPlate) -> List[CertificateElementToVerify]:
+    elements = [
+        plate.specification, plate.thickness, plate.delivery_condition, plate.yield_strength, plate.tensile_strength,
+        plate.elongation, plate.temperature
+    ] + plate.impact_energy_list + list(plate.chemical_compositions.values())
+    return [element for element in elements if element is not None]
+
+
+def get_plate_verdict(plate: SteelPlate) -> str:
+    # From the annotations of a plate, for the plates whose verdict was not kept (see certificate_service and
+    # plate_archive)
+    return get_verdict(all([element.valid_flag for element in get_verified_elements(plate)]))
+
+
+def get_verdict(valid_flag: bool) -> str:
+    return 'PASS' if valid_flag else 'FAIL'
+
+
+class ResultsStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        # Used by one thread at a time, not always the one which created it (e.g. the route thread of
+        # certificate_pipeline)
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_result(self, file_name: str, certificates: List[Certificate], plate_flags: List[List[bool]],
+                   exception_message: Optional[str] = None):
+        # Stores the certificates read from a file (with their annotations) and the verdicts of their plates by
+        # certificate, or the exception raised reading it
+        processed_at = time.time()
+        with self.connection:
+            if exception_message is not None:
+                self.connection.execute(
+                    'INSERT INTO certificates (file_name, verdict, exception_message, processed_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (file_name, 'EXCEPTION', exception_message, processed_at)
+                )
+                return
+            if len(plate_flags) != len(certificates):
+                raise ValueError(f"{len(plate_flags)} lists of plate verdicts for {len(certificates)} certificates")
+            for certificate, flags in zip(certificates, plate_flags):
+                self.add_certificate(file_name, certificate, flags, processed_at)
+
+    def add_certificate(self, file_name: str, certificate: Certificate, plate_flags: List[bool], processed_at: float):
+        verdicts = [get_verdict(flag) for flag in plate_flags]
+        certificate_id = self.connection.execute(
+            'INSERT INTO certificates (certificate_no, steel_plant, file_name, verdict, processed_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (certificate.certificate_no, certificate.steel_plant, file_name, get_verdict(all(plate_flags)),
+             processed_at)
+        ).lastrowid
+        for plate, verdict in zip(certificate.steel_plates, verdicts):
+            plate_id = self.connection.execute(
+                'INSERT INTO plates (certificate_id, serial_number, batch_no, plate_no, specification, thickness, '
+                'quantity, mass, delivery_condition, steel_making_type, verdict) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (certificate_id, get_value(plate.serial_number), get_value(plate.batch_no),
+                 get_value(plate.plate_no), get_value(plate.specification), get_value(plate.thickness),
+                 get_value(plate.quantity), get_value(plate.mass), get_value(plate.delivery_condition),
+                 get_value(plate.steel_making_type), verdict)
+            ).lastrowid
+            self.connection.executemany(
+                'INSERT INTO chemistry (plate_id, element, value, valid_flag, message) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (plate_id, element, value.calculated_value, value.valid_flag, get_message(value))
+                    for element, value in plate.chemical_compositions.items()
+                ]
+            )
+            direction = get_value(plate.position_direction_impact)
+            direction = None if direction is None else str(direction)
+            tests = [
+                ('yield_strength', None, plate.yield_strength), ('tensile_strength', None, plate.tensile_strength),
+                ('elongation', None, plate.elongation), ('temperature', None, plate.temperature)
+            ] + [('impact_energy', energy.test_number, energy) for energy in plate.impact_energy_list]
+            self.connection.executemany(
+                'INSERT INTO mechanical (plate_id, test, test_number, value, direction, valid_flag, message) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (plate_id, test, test_number, element.value, direction, element.valid_flag, get_message(element))
+                    for test, test_number, element in tests if element is not None
+                ]
+            )
+
+    def find_certificates(self, certificate_no: Optional[str] = None, batch_no: Optional[str] = None,
+                          plate_no: Optional[str] = None, verdict: Optional[str] = None) -> List[Dict[str, Any]]:
+        conditions, parameters = [], []
+        if certificate_no is not None:
+            conditions.append('c.certificate_no = ?')
+            parameters.append(certificate_no)
+        if verdict is not None:
+            conditions.append('c.verdict = ?')
+            parameters.append(verdict)
+        for column, value in [('batch_no', batch_no), ('plate_no', plate_no)]:
+            if value is not None:
+                conditions.append(f"c.id IN (SELECT certificate_id FROM plates WHERE {column} = ?)")
+                parameters.append(value)
+        return self.query('SELECT c.* FROM certificates c', conditions, parameters, 'c.id')
+
+    def find_plates(self, specification: Optional[str] = None, min_thickness: Optional[float] = None,
+                    max_thickness: Optional[float] = None, verdict: Optional[str] = None,
+                    batch_no: Optional[str] = None, plate_no: Optional[str] = None,
+                    certificate_no: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None) -> List[Dict[str, Any]]:
+        # The thickness range is inclusive, since and until are timestamps of processing
+        conditions, parameters = [], []
+        for condition, value in [
+            ('p.specification = ?', specification), ('p.thickness >= ?', min_thickness),
+            ('p.thickness <= ?', max_thickness), ('p.verdict = ?', verdict), ('p.batch_no = ?', batch_no),
+            ('p.plate_no = ?', plate_no), ('c.certificate_no = ?', certificate_no), ('c.processed_at >= ?', since),
+            ('c.processed_at < ?', until)
+        ]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        return self.query(
+            'SELECT p.*, c.certificate_no, c.steel_plant, c.file_name, c.processed_at '
+            'FROM plates p JOIN certificates c ON c.id = p.certificate_id',
+            conditions, parameters, 'p.id'
+        )
+
+    def get_chemistry(self, plate_id: int) -> List[Dict[str, Any]]:
+        return self.query('SELECT * FROM chemistry', ['plate_id = ?'], [plate_id], 'rowid')
+
+    def get_mechanical(self, plate_id: int) -> List[Dict[str, Any]]:
+        return self.query('SELECT * FROM mechanical', ['plate_id = ?'], [plate_id], 'rowid')
+
+    def query(self, select: str, conditions: List[str], parameters: List[Any], order: str) -> List[Dict[str, Any]]:
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return [dict(row) for row in self.connection.execute(f"{select}{where} ORDER BY {order}", parameters)]
@@ -0,0 +1,353 @@
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+from typing import Callable, Dict, List, Tuple, Any, Optional
+
+from certificate_verification import LimitType, ChemicalCompositionLimit, BaoSteelAlLimit, FineGrainElementLimit, \
+    FineGrainElementLimitCombination, ThicknessLimit, SpecificationLimit, PositionDirectionImpactLimit, \
+    DeliveryConditionLimit, YieldStrengthLimit, TensileStrengthLimit, ElongationLimit, TemperatureLimit, \
+    ImpactEnergyLimit
+from common import Limit, SteelPlate, SingletonMeta, LimitResult, LimitMessage
+
+# The verification of a steel plate walks through a list of Limit objects, and each of them looks up its element(s) in
+# the steel plate and evaluates it. The RuleCompiler turns a rule set (the list of limits returned by a RuleMaker) into
+# one generated Python function which reads each field of the steel plate only once and evaluates all the bounds
+# inline. The generated function gives the same verdict and annotations (valid_flag and message) as calling
+# limit.verify(plate) for each limit of the rule set. The limits the compiler doesn't know about are verified by
+# calling their own verify method from the generated function.
+
+VerificationFunction = Callable[[SteelPlate], bool]
+
+# Limits checking a single element of the steel plate: the attribute of the element in the steel plate, and the
+# condition the value of the element has to meet.
+FIELD_LIMITS: Dict[type, Tuple[str, Callable[[Any, str, Callable[[Any], str]], str]]] = {
+    ThicknessLimit: (
+        'thickness',
+        lambda limit, value, const: f"{const(limit.minimum)} < {value} <= {const(limit.maximum)}"
+    ),
+    SpecificationLimit: (
+        'specification',
+        lambda limit, value, const: f"{value} in {const(limit.scope)}"
+    ),
+    PositionDirectionImpactLimit: (
+        'position_direction_impact',
+        lambda limit, value, const: f"{value} in {const(limit.scope)}"
+    ),
+    DeliveryConditionLimit: (
+        'delivery_condition',
+        lambda limit, value, const: f"{value} in {const(limit.scope)}"
+    ),
+    YieldStrengthLimit: (
+        'yield_strength',
+        lambda limit, value, const: f"{value} >= {const(limit.minimum)}"
+    ),
+    TensileStrengthLimit: (
+        'tensile_strength',
+        lambda limit, value, const: f"{const(limit.minimum)} <= {value} <= {const(limit.maximum)}"
+    ),
+    ElongationLimit: (
+        'elongation',
+        lambda limit, value, const: f"{value} >= {const(limit.minimum)}"
+    ),
+    TemperatureLimit: (
+        'temperature',
+        lambda limit, value, const: f"{value} <= {const(limit.maximum)}"
+    ),
+}
+
+# Names of the dataclass fields of each limit class, used to compute the signature of a rule set.
+FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+class CodeWriter:
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.indent = 1
+        self.namespace: Dict[str, Any] = {
+            'LimitResult': LimitResult,
+            'LimitMessage': LimitMessage,
+            'get_element_by_name': ChemicalCompositionLimit.get_element_by_name,
+        }
+        self.references: Dict[int, str] = {}
+        self.counter = 0
+
+    def write(self, line: str):
+        self.lines.append('    ' * self.indent + line)
+
+    def new_name(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}_{self.counter}"
+
+    # Objects used by the generated code (limits, scopes) are passed in the global namespace of the function.
+    def reference(self, obj: Any) -> str:
+        if id(obj) not in self.references:
+            name = self.new_name('ref')
+            self.references[id(obj)] = name
+            self.namespace[name] = obj
+        return self.references[id(obj)]
+
+    # Numbers are written in the code as literals, everything else is referenced.
+    def constant(self, value: Any) -> str:
+        if type(value) in (int, float):
+            return repr(value)
+        return self.reference(value)
+
+
+# The variables already holding an element or field of the steel plate. A nested block (a branch of the fine grain
+# element alternatives) sees the variables loaded by its parents, but what it loads is not visible after the block
+# because the branch might not have been executed.
+class Scope:
+
+    def __init__(self, writer: CodeWriter, parent: Optional['Scope'] = None):
+        self.writer = writer
+        self.variables: Dict[str, str] = dict(parent.variables) if parent else dict()
+
+    def chemical_element(self, element_name: str) -> str:
+        key = f"chemical:{element_name}"
+        if key not in self.variables:
+            variable = self.writer.new_name('element')
+            self.writer.write(
+                f"{variable} = chemical_compositions.get({element_name!r}) or "
+                f"get_element_by_name(plate, {element_name!r})"
+            )
+            self.variables[key] = variable
+        return self.variables[key]
+
+    def field(self, attribute: str, limit: Limit) -> str:
+        key = f"field:{attribute}"
+        if key not in self.variables:
+            variable = self.writer.new_name(attribute)
+            # get_element of the limit raises the same error as the interpreted verification if the field is missing.
+            self.writer.write(f"{variable} = plate.{attribute} or {self.writer.reference(limit)}.get_element(plate)")
+            self.variables[key] = variable
+        return self.variables[key]
+
+
+class RuleCompiler(metaclass=SingletonMeta):
+
+    # Number of rule sets remembered by identity, see compile.
+    identity_cache_size = 256
+
+    def __init__(self):
+        self._functions: Dict[Tuple, VerificationFunction] = {}
+        self._functions_by_identity: 'OrderedDict[Tuple[int, ...], Tuple[List[Limit], VerificationFunction]]' = \
+            OrderedDict()
+        # Only taken on a cache miss, the lookups are safe without it
+        self._lock = threading.Lock()
+        # Rule sets found by identity, found by signature, or generated (see metrics)
+        self.identity_hits = self.signature_hits = self.misses = 0
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_signature(rules: List[Limit]) -> Tuple:
+        return tuple([RuleCompiler.get_limit_signature(limit) for limit in rules])
+
+    @staticmethod
+    def get_limit_signature(value: Any) -> Any:
+        # Limits are dataclasses, the signature of a limit is made of its class and the signatures of its fields.
+        value_type = type(value)
+        field_names = FIELD_NAMES.get(value_type)
+        if field_names is None and isinstance(value, Limit):
+            field_names = FIELD_NAMES[value_type] = tuple([field.name for field in fields(value)])
+        if field_names is not None:
+            return (value_type,) + tuple(
+                [RuleCompiler.get_limit_signature(getattr(value, name)) for name in field_names]
+            )
+        elif value_type is list or value_type is tuple:
+            return tuple([RuleCompiler.get_limit_signature(item) for item in value])
+        else:
+            # The type is kept because 20 == 20.0 but they are not rendered the same in the messages.
+            return value_type, value
+
+    def compile(self, rules: List[Limit]) -> VerificationFunction:
+        # Computing the signature costs about as much as building the rule set, so the rule sets which are used again
+        # (the very same limit objects) are first looked up by identity. The rule set is kept in the cache with the
+        # function, so that the identities can't be reused by other objects while the entry exists.
+        # The limits must not be modified once get_rules has returned them (the rule sets of the rule space are shared
+        # by all the steel plates): a rule set found by identity gets the function generated for its first bounds.
+        identity = tuple([id(limit) for limit in rules])
+        entry = self._functions_by_identity.get(identity)
+        if entry is not None:
+            self.identity_hits += 1
+            return entry[1]
+        signature = RuleCompiler.get_signature(rules)
+        with self._lock:
+            function = self._functions.get(signature)
+            if function is None:
+                self.misses += 1
+                function = RuleCompiler.generate(rules)
+                self._functions[signature] = function
+            else:
+                self.signature_hits += 1
+            self._functions_by_identity[identity] = (list(rules), function)
+            if len(self._functions_by_identity) > self.identity_cache_size:
+                self._functions_by_identity.popitem(last=False)
+        return function
+
+    def verify(self, plate: SteelPlate, rules: List[Limit]) -> bool:
+        return self.compile(rules)(plate)
+
+    def clear(self):
+        with self._lock:
+            self._functions.clear()
+            self._functions_by_identity.clear()
+            self.identity_hits = self.signature_hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._functions)
+
+    @staticmethod
+    def generate_source(rules: List[Limit]) -> Tuple[str, Dict[str, Any]]:
+        writer = CodeWriter()
+        scope = Scope(writer)
+        writer.write("valid_flag = True")
+        writer.write("chemical_compositions = plate.chemical_compositions")
+        for limit in rules:
+            RuleCompiler.write_limit(writer, scope, limit)
+        writer.write("return valid_flag")
+        source = '\n'.join(["def verify(plate):"] + writer.lines) + '\n'
+        return source, writer.namespace
+
+    @staticmethod
+    def generate(rules: List[Limit]) -> VerificationFunction:
+        source, namespace = RuleCompiler.generate_source(rules)
+        exec(compile(source, '<compiled rules>', 'exec'), namespace)
+        function = namespace['verify']
+        function.source = source
+        return function
+
+    @staticmethod
+    def write_limit(writer: CodeWriter, scope: Scope, limit: Limit):
+        limit_class = type(limit)
+        flag = writer.new_name('valid_flag')
+        if limit_class is ChemicalCompositionLimit:
+            elements, value = RuleCompiler.write_chemical_value(writer, scope, limit)
+            result = writer.new_name('result')
+            writer.write(f"{flag} = {RuleCompiler.chemical_condition(writer, limit, value)}")
+            writer.write(f"{result} = LimitResult({writer.reference(limit)}, {value}, {flag})")
+            for element in elements:
+                writer.write(f"{element}.valid_flag = {flag}")
+                writer.write(f"if {flag}:")
+                writer.write(f"    {element}.message = LimitMessage.join({element}.message, {result})")
+                writer.write(f"else:")
+                writer.write(f"    {element}.message = LimitMessage.join({result}, {element}.message)")
+        elif limit_class in FIELD_LIMITS:
+            attribute, condition = FIELD_LIMITS[limit_class]
+            field = scope.field(attribute, limit)
+            writer.write(f"{flag} = {condition(limit, f'{field}.value', writer.constant)}")
+            writer.write(f"{field}.valid_flag = {flag}")
+            writer.write(
+                f"{field}.message = LimitMessage((LimitResult({writer.reference(limit)}, {field}.value, {flag}),))"
+            )
+        elif limit_class is ImpactEnergyLimit:
+            energies = scope.field('impact_energy_list', limit)
+            reference = writer.reference(limit)
+            writer.write(f"if len({energies}) != 4:")
+            writer.write(f"    {reference}.get_element(plate)")
+            writer.write(f"{flag} = True")
+            writer.write(f"for impact_energy in {energies}:")
+            writer.write(f"    impact_energy.valid_flag = impact_energy.value >= {writer.constant(limit.minimum)}")
+            writer.write(
+                f"    impact_energy.message = "
+                f"LimitMessage((LimitResult({reference}, impact_energy.value, impact_energy.valid_flag),))"
+            )
+            writer.write(f"    if not impact_energy.valid_flag:")
+            writer.write(f"        {flag} = False")
+        elif limit_class is FineGrainElementLimitCombination and RuleCompiler.is_compilable_combination(limit):
+            RuleCompiler.write_combination(writer, scope, limit, flag)
+        else:
+            writer.write(f"{flag} = {writer.reference(limit)}.verify(plate)")
+        writer.write(f"if not {flag}:")
+        writer.write(f"    valid_flag = False")
+
+    @staticmethod
+    def is_compilable_combination(limit: FineGrainElementLimitCombination) -> bool:
+        return all(
+            type(fine_grain_element_limit) is FineGrainElementLimit and all(
+                type(concurrent_limit) in (ChemicalCompositionLimit, BaoSteelAlLimit)
+                for concurrent_limit in fine_grain_element_limit.concurrent_limits
+            )
+            for fine_grain_element_limit in limit.fine_grain_element_limits or []
+        )
+
+    @staticmethod
+    def write_combination(writer: CodeWriter, scope: Scope, limit: FineGrainElementLimitCombination, flag: str):
+        # Any of the alternatives passes (OR) when all of its limits pass (AND), the alternatives are tried in order
+        # and the first one passing stops the checking.
+        if len(limit.alternatives) == 0:
+            writer.write(f"{flag} = True")
+            return
+        writer.write(f"{flag} = False")
+        for concurrent_limits in limit.alternatives:
+            writer.write(f"if not {flag}:")
+            writer.indent += 1
+            RuleCompiler.write_concurrent_limits(writer, Scope(writer, scope), list(concurrent_limits), [], flag)
+            writer.indent -= 1
+        writer.write(f"if not {flag}:")
+        writer.write(f"    for element in {writer.reference(limit)}.get_element(plate):")
+        writer.write(f"        element.valid_flag = False")
+        writer.write(f"        element.message = {writer.reference(limit)}.error_message")
+
+    @staticmethod
+    def write_concurrent_limits(writer: CodeWriter, scope: Scope, limits: List[Limit],
+                                passed: List[Tuple[Limit, List[str], str]], flag: str):
+        limit = limits[0]
+        if type(limit) is BaoSteelAlLimit:
+            alt = scope.chemical_element('Alt')
+            als = scope.chemical_element('Als')
+            elements = [alt, als]
+            value = writer.new_name('value')
+            writer.write(f"{value} = ({alt}.calculated_value, {als}.calculated_value)")
+            condition = (
+                f"{RuleCompiler.chemical_condition(writer, limit.alt_limit, f'{value}[0]')} or "
+                f"{RuleCompiler.chemical_condition(writer, limit.als_limit, f'{value}[1]')}"
+            )
+        else:
+            elements, value = RuleCompiler.write_chemical_value(writer, scope, limit)
+            condition = RuleCompiler.chemical_condition(writer, limit, value)
+        writer.write(f"if {condition}:")
+        writer.indent += 1
+        passed = passed + [(limit, elements, value)]
+        if len(limits) == 1:
+            # Every limit passed, the elements are annotated from the last limit to the first one.
+            for passed_limit, passed_elements, passed_value in reversed(passed):
+                result = writer.new_name('result')
+                writer.write(f"{result} = LimitResult({writer.reference(passed_limit)}, {passed_value}, True)")
+                for element in passed_elements:
+                    writer.write(f"{element}.valid_flag = True")
+                    writer.write(f"{element}.message = LimitMessage.join({element}.message, {result})")
+            writer.write(f"{flag} = True")
+        else:
+            RuleCompiler.write_concurrent_limits(writer, Scope(writer, scope), limits[1:], passed, flag)
+        writer.indent -= 1
+
+    @staticmethod
+    def write_chemical_value(writer: CodeWriter, scope: Scope,
+                             limit: ChemicalCompositionLimit) -> Tuple[List[str], str]:
+        elements = [scope.chemical_element(name) for name in limit.get_element_names()]
+        values = [f"{element}.calculated_value" for element in elements]
+        value = writer.new_name('value')
+        # Same calculation as ChemicalCompositionLimit.get_element
+        if limit.chemical_element == 'C + 1/6 Mn':
+            writer.write(f"{value} = {values[0]} + {values[1]} / 6")
+        elif limit.chemical_element == 'Nb + V + Ti':
+            writer.write(f"{value} = {values[0]} + {values[1]} + {values[2]}")
+        else:
+            writer.write(f"{value} = {values[0]}")
+        return elements, value
+
+    @staticmethod
+    def chemical_condition(writer: CodeWriter, limit: ChemicalCompositionLimit, value: str) -> str:
+        if limit.limit_type == LimitType.MAXIMUM:
+            return f"{value} <= {writer.constant(limit.maximum)}"
+        elif limit.limit_type == LimitType.MINIMUM:
+            return f"{value} >= {writer.constant(limit.minimum)}"
+        elif limit.limit_type == LimitType.RANGE:
+            return f"{writer.constant(limit.minimum)} <= {value} <= {writer.constant(limit.maximum)}"
+        else:
+            raise ValueError(
+                f"The limit type {limit.limit_type} is not expected in ChemicalCompositionLimit."
+            )
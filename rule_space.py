@@ -0,0 +1,302 @@
+import ast
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import time
+from bisect import bisect_left
+from statistics import mean
+from typing import Dict, List, Tuple, Any, Optional, Type, Iterator
+
+import certificate_verification
+from certificate_verification import RuleMaker, BaoSteelRuleMaker, LongTengRuleMaker, SpecificationLimit, \
+    DeliveryConditionLimit
+from common import Limit, SteelPlate, SingletonMeta, SerialNumber, Specification, DeliveryCondition, Thickness, \
+    SteelMakingType, PositionDirectionImpact, ImpactEnergy, Direction
+from rule_compiler import RuleCompiler
+
+# The rules of a steel plate only depend on a few of its fields: the specification, the delivery condition, the
+# thickness band, the steel making type, the impact test direction and whether there are impact energy values. The
+# RuleSpace enumerates all the combinations of these fields for each RuleMaker, calls get_rules once per combination
+# and keeps the resulting rule sets, so that the rules of a steel plate are looked up instead of being rebuilt. The
+# snapshot of the rule space is written by running this module and loaded once at startup.
+#
+#     python rule_space.py [snapshot file]
+
+RULE_SPACE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rule_space.pickle')
+RULE_SPACE_VERSION = 1
+
+# Used in the key of the steel plates where the steel making type or the impact test direction are absent, which the
+# rule makers handle differently from a present element with value None.
+MISSING = '<missing>'
+
+RULE_MAKERS: List[Type[RuleMaker]] = [BaoSteelRuleMaker, LongTengRuleMaker]
+
+RuleSpaceKey = Tuple[str, str, str, int, Optional[str], Any, bool]
+
+
+def source_digest() -> Optional[str]:
+    # The snapshot is only valid for the rule makers it was built from
+    try:
+        source = inspect.getsource(certificate_verification)
+    except (OSError, TypeError):
+        return None
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+class RuleSpaceDimensions:
+
+    def __init__(self, rule_maker: RuleMaker):
+        self.rule_maker = rule_maker
+        self.thickness_boundaries: List[float] = []
+        self.specifications: List[str] = []
+        self.delivery_conditions: List[str] = []
+        self.steel_making_types: List[Optional[str]] = []
+        self.collect()
+
+    @staticmethod
+    def get_attribute(node: ast.AST) -> Optional[str]:
+        # plate.thickness.value -> 'thickness'
+        if isinstance(node, ast.Attribute) and node.attr == 'value' and isinstance(node.value, ast.Attribute):
+            return node.value.attr
+        return None
+
+    @staticmethod
+    def get_constants(node: ast.AST) -> List[Any]:
+        if isinstance(node, ast.Constant):
+            return [node.value]
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return [element.value for element in node.elts if isinstance(element, ast.Constant)]
+        return []
+
+    def collect(self):
+        # Reads the conditions of the rule maker (and the standard rules of the base class) on the fields of the plate
+        thickness_boundaries, delivery_conditions, steel_making_types = set(), [], []
+        for cls in type(self.rule_maker).__mro__:
+            if not issubclass(cls, RuleMaker):
+                continue
+            for node in ast.walk(ast.parse(inspect.getsource(cls).lstrip())):
+                if isinstance(node, ast.Compare):
+                    operands = [node.left] + node.comparators
+                    attributes = [self.get_attribute(operand) for operand in operands]
+                    constants = [value for operand in operands for value in self.get_constants(operand)]
+                    if 'thickness' in attributes:
+                        thickness_boundaries.update(
+                            value for value in constants if isinstance(value, (int, float)) and value is not True
+                        )
+                    elif 'delivery_condition' in attributes:
+                        delivery_conditions.extend(value for value in constants if isinstance(value, str))
+                    elif 'steel_making_type' in attributes:
+                        steel_making_types.extend(value for value in constants if isinstance(value, str))
+        # The scopes of the specification and delivery condition limits don't depend on the plate
+        probe = RuleSpace.create_plate('VL A', 'AR', 10, next(iter(steel_making_types), None), Direction.LONGITUDINAL,
+                                       True)
+        for limit in self.rule_maker.get_rules(probe):
+            if isinstance(limit, SpecificationLimit):
+                self.specifications.extend(limit.scope)
+            elif isinstance(limit, DeliveryConditionLimit):
+                delivery_conditions.extend(limit.scope)
+        self.specifications = list(dict.fromkeys(self.specifications))
+        self.thickness_boundaries = sorted(thickness_boundaries)
+        self.delivery_conditions = list(dict.fromkeys(delivery_conditions))
+        self.steel_making_types = list(dict.fromkeys(steel_making_types)) + [None, MISSING]
+
+    def get_thickness_bands(self) -> List[Tuple[float, float]]:
+        # The rule makers compare the thickness as 'thickness <= boundary' or 'boundary < thickness', so the rules are
+        # the same within (lower boundary, upper boundary]. Each band is checked on its lower and upper edge.
+        boundaries = self.thickness_boundaries
+        bands = []
+        for index in range(len(boundaries) + 1):
+            lower = boundaries[index - 1] if index > 0 else 0
+            upper = boundaries[index] if index < len(boundaries) else lower * 2
+            bands.append((lower + 0.1, upper))
+        return bands
+
+    def __iter__(self) -> Iterator[Tuple[str, str, int, Optional[str], Any, bool]]:
+        for specification in self.specifications:
+            for delivery_condition in self.delivery_conditions:
+                for band in range(len(self.thickness_boundaries) + 1):
+                    for steel_making_type in self.steel_making_types:
+                        for direction in list(Direction) + [None, MISSING]:
+                            for impact_energy in [True, False]:
+                                yield specification, delivery_condition, band, steel_making_type, direction, \
+                                      impact_energy
+
+
+class RuleSpace(metaclass=SingletonMeta):
+
+    def __init__(self):
+        self.thickness_boundaries: Dict[str, List[float]] = dict()
+        self.rule_sets: Dict[RuleSpaceKey, List[Limit]] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def create_plate(specification: str, delivery_condition: str, thickness: float, steel_making_type: Optional[str],
+                     direction: Any, impact_energy: bool) -> SteelPlate:
+        plate = SteelPlate(serial_number=SerialNumber(table_index=None, x_coordinate=None, y_coordinate=None, value=1))
+        plate.specification = Specification(None, None, None, specification, None, True, None)
+        plate.delivery_condition = DeliveryCondition(None, None, None, delivery_condition, None, True, None)
+        plate.thickness = Thickness(None, None, None, thickness, None, True, None)
+        if steel_making_type != MISSING:
+            plate.steel_making_type = SteelMakingType(None, None, None, steel_making_type, None)
+        if direction != MISSING:
+            plate.position_direction_impact = PositionDirectionImpact(None, None, None, direction, None)
+        if impact_energy:
+            plate.impact_energy_list = [
+                ImpactEnergy(None, None, None, 0, None, True, None, test_number)
+                for test_number in ['1', '2', '3', 'AVE.']
+            ]
+        return plate
+
+    def get_key(self, rule_maker: RuleMaker, plate: SteelPlate) -> RuleSpaceKey:
+        name = type(rule_maker).__name__
+        return (
+            name,
+            plate.specification.value,
+            plate.delivery_condition.value,
+            bisect_left(self.thickness_boundaries[name], plate.thickness.value),
+            plate.steel_making_type.value if plate.steel_making_type else MISSING,
+            plate.position_direction_impact.value if plate.position_direction_impact else MISSING,
+            len(plate.impact_energy_list) > 0
+        )
+
+    def get_rules(self, rule_maker: RuleMaker, plate: SteelPlate) -> List[Limit]:
+        # The rule sets are shared by all the steel plates with the same key, they must not be modified. Plates outside
+        # of the rule space (or with elements missing) get their rules (or their error) from the rule maker.
+        try:
+            rules = self.rule_sets.get(self.get_key(rule_maker, plate))
+        except (AttributeError, KeyError, TypeError):
+            rules = None
+        if rules is None:
+            self.misses += 1
+            return rule_maker.get_rules(plate)
+        self.hits += 1
+        return rules
+
+    def clear(self):
+        self.thickness_boundaries.clear()
+        self.rule_sets.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.rule_sets)
+
+    def build(self, rule_makers: List[RuleMaker]) -> List[Dict[str, Any]]:
+        # Returns the report of each combination: the time taken by get_rules, and the number of limits or the error
+        self.clear()
+        rule_sets_by_signature: Dict[Tuple, List[Limit]] = dict()
+        limits_by_signature: Dict[Any, Limit] = dict()
+        records = []
+        for rule_maker in rule_makers:
+            name = type(rule_maker).__name__
+            dimensions = RuleSpaceDimensions(rule_maker)
+            self.thickness_boundaries[name] = dimensions.thickness_boundaries
+            bands = dimensions.get_thickness_bands()
+            for specification, delivery_condition, band, steel_making_type, direction, impact_energy in dimensions:
+                lower, upper = bands[band]
+                record = {
+                    'rule_maker': name, 'specification': specification, 'delivery_condition': delivery_condition,
+                    'thickness': upper, 'steel_making_type': steel_making_type, 'direction': direction,
+                    'impact_energy': impact_energy, 'limits': None, 'error': None
+                }
+                records.append(record)
+                plate = self.create_plate(specification, delivery_condition, upper, steel_making_type, direction,
+                                          impact_energy)
+                start = time.perf_counter()
+                try:
+                    rules = rule_maker.get_rules(plate)
+                except (ValueError, AttributeError, TypeError) as e:
+                    record['seconds'] = time.perf_counter() - start
+                    record['error'] = f"{type(e).__name__}: {e}"
+                    continue
+                record['seconds'] = time.perf_counter() - start
+                record['limits'] = len(rules)
+                signature = RuleCompiler.get_signature(rules)
+                lower_plate = self.create_plate(specification, delivery_condition, lower, steel_making_type, direction,
+                                                impact_energy)
+                if RuleCompiler.get_signature(rule_maker.get_rules(lower_plate)) != signature:
+                    raise ValueError(
+                        f"The rules of {name} for {specification} {delivery_condition} are not the same from "
+                        f"{lower} mm to {upper} mm, the thickness boundaries {dimensions.thickness_boundaries} are "
+                        f"incomplete."
+                    )
+                if signature not in rule_sets_by_signature:
+                    # Equal limits are shared by the rule sets to keep the snapshot compact
+                    rule_sets_by_signature[signature] = [
+                        limits_by_signature.setdefault(limit_signature, limit)
+                        for limit_signature, limit in zip(signature, rules)
+                    ]
+                key = (name, specification, delivery_condition, band, steel_making_type, direction, impact_energy)
+                self.rule_sets[key] = rule_sets_by_signature[signature]
+        return records
+
+    def save(self, path: str = RULE_SPACE_FILE):
+        with open(path, 'wb') as f:
+            pickle.dump(
+                {
+                    'version': RULE_SPACE_VERSION,
+                    'source_digest': source_digest(),
+                    'thickness_boundaries': self.thickness_boundaries,
+                    'rule_sets': self.rule_sets
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+    def load(self, path: str = RULE_SPACE_FILE) -> bool:
+        # Returns False (and leaves the rule space empty) if the snapshot is missing or out of date
+        self.clear()
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get('version') != RULE_SPACE_VERSION:
+            print(f"The rule space snapshot {path} has version {snapshot.get('version')}, it is ignored.")
+            return False
+        digest = source_digest()
+        if digest is not None and snapshot['source_digest'] is not None and digest != snapshot['source_digest']:
+            print(f"The rule space snapshot {path} was built from other rules, it is ignored.")
+            return False
+        self.thickness_boundaries = snapshot['thickness_boundaries']
+        self.rule_sets = snapshot['rule_sets']
+        return True
+
+
+def print_report(records: List[Dict[str, Any]], rule_space: RuleSpace):
+    for name in dict.fromkeys(record['rule_maker'] for record in records):
+        rule_maker_records = [record for record in records if record['rule_maker'] == name]
+        valid_records = [record for record in rule_maker_records if record['error'] is None]
+        seconds = [record['seconds'] for record in rule_maker_records]
+        limits = [record['limits'] for record in valid_records]
+        rule_sets = {id(rules) for key, rules in rule_space.rule_sets.items() if key[0] == name}
+        print(
+            f"{name}: {len(rule_maker_records)} combinations, {len(valid_records)} rule sets "
+            f"({len(rule_sets)} distinct), {len(rule_maker_records) - len(valid_records)} errors, "
+            f"thickness boundaries {rule_space.thickness_boundaries[name]}"
+        )
+        print(
+            f"    get_rules: {sum(seconds):.2f} s in total, {mean(seconds) * 1e6:.0f} us on average, "
+            f"{max(seconds) * 1e6:.0f} us at most"
+        )
+        if limits:
+            print(f"    limits: {min(limits)} to {max(limits)}, {mean(limits):.1f} on average")
+        slowest = max(valid_records, key=lambda record: record['seconds'], default=None)
+        if slowest is not None:
+            print(
+                f"    slowest: {slowest['specification']} {slowest['delivery_condition']} {slowest['thickness']} mm "
+                f"{slowest['steel_making_type']} {slowest['direction']}, {slowest['seconds'] * 1e6:.0f} us"
+            )
+
+
+if __name__ == '__main__':
+    output = sys.argv[1] if len(sys.argv) > 1 else RULE_SPACE_FILE
+    space = RuleSpace()
+    report = space.build([rule_maker_class() for rule_maker_class in RULE_MAKERS])
+    print_report(report, space)
+    space.save(output)
+    print(f"{len(space)} rule sets written to {output} ({os.path.getsize(output) / 1024:.0f} KiB).")
+    start_time = time.perf_counter()
+    RuleSpace().load(output)
+    print(f"Loaded in {(time.perf_counter() - start_time) * 1e3:.1f} ms.")
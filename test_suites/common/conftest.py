@@ -1,9 +1,192 @@
-from typing import List, Union, Tuple
+import os
+import random
+import shutil
+from typing import Any, Callable, List, Union, Tuple
 
+import docx
+import pytest
+from openpyxl import load_workbook
+
+from certificate_factory import LongTengCertificate, BaoSteelCertificate
 from certificate_verification import LimitType, ChemicalCompositionLimit, ThicknessLimit, SpecificationLimit, \
     YieldStrengthLimit, TensileStrengthLimit, ElongationLimit, TemperatureLimit, ImpactEnergyLimit, \
-    DeliveryConditionLimit, FineGrainElementLimitCombination, BaoSteelAlLimit, FineGrainElementLimit
-from common import Limit, SteelPlate, Direction
+    DeliveryConditionLimit, FineGrainElementLimitCombination, BaoSteelAlLimit, FineGrainElementLimit, \
+    BaoSteelRuleMaker
+from common import Limit, SteelPlate, Direction, SerialNumber, Specification, DeliveryCondition, Thickness, \
+    ChemicalElementValue, YieldStrength, TensileStrength, Elongation, PositionDirectionImpact, Temperature, \
+    ImpactEnergy, SteelMakingType, CommonUtils, BatchNo
+
+# The helpers shared by the test modules are given to the tests as fixtures, e.g. prepare_directory. The constants
+# used in the parameters of the tests (BAOSTEEL_SPECIFICATIONS, BAOSHAN) are imported from here, like BaseTester.
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_data')
+
+
+def prepare_directory(directory) -> str:
+    os.makedirs(directory)
+    for file_name in os.listdir(TEST_DATA):
+        if file_name.lower().endswith(('.pdf', '.docx')):
+            shutil.copy(os.path.join(TEST_DATA, file_name), directory)
+    with open(os.path.join(directory, 'broken.pdf'), 'wb') as f:
+        f.write(b'not a pdf')
+    return str(directory)
+
+
+def save_failed_certificate(file_path: str, carbon: str = '0.50'):
+    # The certificate of the test data, with too much carbon in the first steel plate
+    document = docx.Document(os.path.join(TEST_DATA, 'DNVGL_LONGTENG.docx'))
+    document.tables[0].cell(6, 8).text = carbon
+    document.save(file_path)
+
+
+def read_workbook(file_path: str):
+    sheet = load_workbook(file_path).active
+    return [
+        [(cell.value, cell.comment.text if cell.comment else None) for cell in row]
+        for row in sheet.iter_rows()
+    ]
+
+
+def read_outcome(directory: str):
+    outcome = {}
+    for destination in ['PASS', 'FAIL', 'EXCEPTION']:
+        for file_name in sorted(os.listdir(os.path.join(directory, destination))):
+            file_path = os.path.join(directory, destination, file_name)
+            outcome[(destination, file_name)] = read_workbook(file_path) if file_name.endswith('.xlsx') else None
+    return outcome
+
+
+BAOSTEEL_SPECIFICATIONS = [
+    'VL A', 'VL B', 'VL D', 'VL E',
+    'VL A27S', 'VL D27S', 'VL E27S', 'VL F27S',
+    'VL A32', 'VL D32', 'VL E32', 'VL F32',
+    'VL A36', 'VL D36', 'VL E36', 'VL F36',
+    'VL A40', 'VL D40', 'VL E40', 'VL F40'
+]
+LONGTENG_SPECIFICATIONS = ['VL A', 'VL B', 'VL D', 'VL A32', 'VL A36', 'VL D32', 'VL D36']
+
+
+# Typical values (in thousandths of % by weight) of the chemical elements, with a few of them out of the limits.
+CHEMICAL_RANGES = {
+    'C': (100, 160), 'Si': (100, 350), 'Mn': (900, 1500), 'P': (10, 25), 'S': (5, 25), 'Cu': (0, 300),
+    'Cr': (0, 200), 'Ni': (0, 400), 'Mo': (0, 80), 'Ceq': (300, 340), 'Als': (10, 40), 'Alt': (15, 50),
+    'Nb': (10, 50), 'Ti': (7, 20), 'V': (30, 40), 'Al': (15, 40)
+}
+
+
+def create_plate(specification: str, delivery_condition: str, thickness: float, steel_making_type: str,
+                 direction: Direction, generator: random.Random) -> SteelPlate:
+
+    def sample(minimum: int, maximum: int) -> int:
+        if generator.random() < 0.9:
+            return generator.randint(minimum, maximum)
+        return generator.randint(0, maximum * 2)
+
+    plate = SteelPlate(serial_number=SerialNumber(table_index=None, x_coordinate=None, y_coordinate=None, value=1))
+    plate.specification = Specification(None, None, None, specification, None, True, None)
+    plate.delivery_condition = DeliveryCondition(None, None, None, delivery_condition, None, True, None)
+    plate.thickness = Thickness(None, None, None, thickness, None, True, None)
+    plate.steel_making_type = SteelMakingType(None, None, None, steel_making_type, None)
+    for element in CommonUtils.chemical_elements_table:
+        plate.chemical_compositions[element] = ChemicalElementValue(
+            table_index=None,
+            x_coordinate=None,
+            y_coordinate=None,
+            value=sample(*CHEMICAL_RANGES[element]),
+            index=None,
+            valid_flag=True,
+            message=None,
+            element=element,
+            precision=3
+        )
+    plate.yield_strength = YieldStrength(None, None, None, sample(360, 420), None, True, None)
+    plate.tensile_strength = TensileStrength(None, None, None, sample(520, 540), None, True, None)
+    plate.elongation = Elongation(None, None, None, sample(22, 26), None, True, None)
+    plate.position_direction_impact = PositionDirectionImpact(None, None, None, direction, None)
+    plate.temperature = Temperature(None, None, None, generator.choice([20, 0, -20, -40, -60]), None, True, None)
+    plate.impact_energy_list = [
+        ImpactEnergy(None, None, None, sample(40, 80), None, True, None, test_number)
+        for test_number in ['1', '2', '3', 'AVE.']
+    ]
+    return plate
+
+
+def snapshot(plate: SteelPlate):
+    elements = [
+        plate.specification, plate.delivery_condition, plate.thickness, plate.yield_strength, plate.tensile_strength,
+        plate.elongation, plate.position_direction_impact, plate.temperature
+    ] + plate.impact_energy_list + list(plate.chemical_compositions.values())
+    return [
+        (getattr(element, 'valid_flag', None), str(getattr(element, 'message', None)))
+        for element in elements
+    ]
+
+
+BAOSHAN = 'BAOSHAN IRON & STEEL CO., LTD.'
+LONGTENG = 'CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.'
+
+
+def create_certificates(generator: random.Random):
+    certificates = []
+    for number in range(6):
+        steel_plant = BAOSHAN if number % 2 == 0 else LONGTENG
+        plates = []
+        for serial_number in range(1, 4):
+            plate = create_plate(generator.choice(['VL A', 'VL D36']), generator.choice(['AR', 'TM']),
+                                 generator.choice([12, 30, 45]), 'BOC, CC', Direction.TRANSVERSE, generator)
+            plate.serial_number.value = serial_number
+            plate.batch_no = BatchNo(None, None, None, f"B{number}{serial_number}", None)
+            if steel_plant == BAOSHAN:
+                for limit in BaoSteelRuleMaker.get_rules(plate):
+                    limit.verify(plate)
+            plates.append(plate)
+        arguments = dict(file_path=f"{number}.pdf", steel_plant=steel_plant, certificate_no=f"C{number}",
+                         serial_numbers=None, steel_plates=plates, chemical_elements=None)
+        if steel_plant == BAOSHAN:
+            certificates.append(BaoSteelCertificate(**arguments, specification=None, thickness=None))
+        else:
+            certificates.append(LongTengCertificate(**arguments, delivery_condition=None))
+    return certificates
+
+
+@pytest.fixture(name='test_data')
+def test_data_fixture() -> str:
+    return TEST_DATA
+
+
+@pytest.fixture(name='prepare_directory')
+def prepare_directory_fixture() -> Callable[[Any], str]:
+    return prepare_directory
+
+
+@pytest.fixture(name='save_failed_certificate')
+def save_failed_certificate_fixture() -> Callable[..., None]:
+    return save_failed_certificate
+
+
+@pytest.fixture(name='read_workbook')
+def read_workbook_fixture() -> Callable[[str], List]:
+    return read_workbook
+
+
+@pytest.fixture(name='read_outcome')
+def read_outcome_fixture() -> Callable[[str], dict]:
+    return read_outcome
+
+
+@pytest.fixture(name='create_plate')
+def create_plate_fixture() -> Callable[..., SteelPlate]:
+    return create_plate
+
+
+@pytest.fixture(name='snapshot')
+def snapshot_fixture() -> Callable[[SteelPlate], List]:
+    return snapshot
+
+
+@pytest.fixture(name='create_certificates')
+def create_certificates_fixture() -> Callable[[random.Random], List]:
+    return create_certificates
 
 
 class BaseTester:
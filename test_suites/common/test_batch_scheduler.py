@@ -0,0 +1,107 @@
+import json
+import os
+import time
+import zipfile
+
+from batch_scheduler import BatchScheduler, get_work_units
+from certificate_processor import ProcessOptions, process
+from resource_governor import ResourceGovernor
+
+
+def create_docx(path, tables: int) -> str:
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', '<w:body>' + '<w:tbl></w:tbl>' * tables + '</w:body>')
+    return str(path)
+
+
+def create_pdf(path, pages: int) -> str:
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n/Type /Pages\n' + b'/Type /Page\n' * pages)
+    return str(path)
+
+
+def sleep_for_units(file_path: str) -> str:
+    time.sleep(get_work_units(file_path)[1] / 100)
+    return os.path.basename(file_path)
+
+
+def test_schedule_longest_first(tmp_path):
+    file_paths = [
+        create_docx(tmp_path / 'small.docx', 2), create_pdf(tmp_path / 'small.pdf', 1),
+        create_docx(tmp_path / 'large.docx', 40), create_pdf(tmp_path / 'large.pdf', 3),
+        create_docx(tmp_path / 'empty.docx', 0)
+    ]
+    assert get_work_units(file_paths[2]) == ('docx_tables', 40)
+    assert get_work_units(file_paths[3]) == ('pdf_pages', 3)
+    scheduler = BatchScheduler()
+    # 3 pages cost more than 40 tables with the default rates, which cost more than a page: the longest files of both
+    # plants start before the short ones
+    assert [os.path.basename(f.file_path) for f in scheduler.schedule(file_paths)] == \
+           ['large.pdf', 'large.docx', 'small.pdf', 'small.docx', 'empty.docx']
+
+
+def test_schedule_groups_the_ties_by_plant(tmp_path):
+    # 30 tables cost as much as a page with the default rates
+    file_paths = [
+        create_docx(tmp_path / 'a.docx', 30), create_pdf(tmp_path / 'b.pdf', 1), create_docx(tmp_path / 'c.docx', 30),
+        create_pdf(tmp_path / 'd.pdf', 1), create_docx(tmp_path / 'e.docx', 60)
+    ]
+    scheduled_files = BatchScheduler().schedule(file_paths)
+    assert [os.path.basename(f.file_path) for f in scheduled_files] == ['e.docx', 'b.pdf', 'd.pdf', 'a.docx', 'c.docx']
+
+
+def test_schedule_runs_the_files_of_a_plant_within_a_band(tmp_path):
+    # From 1.1 to 1.6 s with the default rates: one band, the plant of the longest file first
+    file_paths = [
+        create_docx(tmp_path / 'a.docx', 32), create_pdf(tmp_path / 'b.pdf', 1), create_docx(tmp_path / 'c.docx', 22),
+        create_docx(tmp_path / 'd.docx', 28), create_docx(tmp_path / 'e.docx', 80)
+    ]
+    scheduled_files = BatchScheduler().schedule(file_paths)
+    assert [os.path.basename(f.file_path) for f in scheduled_files] == ['e.docx', 'a.docx', 'd.docx', 'c.docx', 'b.pdf']
+
+
+def test_run_yields_as_completed_and_learns(tmp_path):
+    file_paths = [create_docx(tmp_path / f"{tables}.docx", tables) for tables in [1, 5, 20, 2, 10]]
+    history_path = str(tmp_path / 'history.json')
+    for workers in [1, 3]:
+        scheduler = BatchScheduler(history_path)
+        results = list(scheduler.run(file_paths, workers, sleep_for_units))
+        assert sorted(results) == [(index, os.path.basename(file_path)) for index, file_path in enumerate(file_paths)]
+        if workers == 1:
+            # In the order of dispatch, the longest first
+            assert [index for index, _ in results] == [2, 4, 1, 3, 0]
+        report = scheduler.report
+        assert report.workers == workers and report.files == 5
+        assert report.makespan >= 0.2 and sum(report.busy_time.values()) >= 0.38
+        assert report.get_idle_time() >= 0
+    with open(history_path) as f:
+        seconds, units = json.load(f)['docx_tables']
+    assert units == 76 and 0.009 < seconds / units < 0.05
+    assert BatchScheduler(history_path).get_rate('docx_tables') == seconds / units
+
+
+def test_scheduled_process_matches_serial(tmp_path, prepare_directory, read_outcome):
+    directory = prepare_directory(tmp_path / 'batch')
+    serial_result = process(directory, ProcessOptions(workers=1))
+    serial_outcome = read_outcome(directory)
+    scheduler = BatchScheduler()
+    prepare_directory(tmp_path / 'scheduled')
+    scheduled_result = process(str(tmp_path / 'scheduled'), ProcessOptions(workers=2, scheduler=scheduler))
+    # Routed as they complete
+    assert sorted(scheduled_result.passed_certificate_nos) == sorted(serial_result.passed_certificate_nos)
+    assert sorted([name for name, _ in scheduled_result.certificates_with_exception]) == \
+           sorted([name for name, _ in serial_result.certificates_with_exception])
+    assert set(read_outcome(str(tmp_path / 'scheduled'))) == set(serial_outcome)
+    assert scheduler.report.files == len([key for key in serial_outcome if not key[1].endswith('.xlsx')])
+
+
+def test_governed_schedule_is_reported(tmp_path, capsys, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    file_count = len(os.listdir(directory))
+    scheduler = BatchScheduler()
+    batch_result = process(directory, ProcessOptions(workers=2, scheduler=scheduler,
+                                                     governor=ResourceGovernor(timeout=60)))
+    assert scheduler.report.files == file_count and scheduler.report.makespan > 0
+    assert len(scheduler.report.busy_time) >= 1
+    assert f"Schedule: {scheduler.report}" in capsys.readouterr().out
+    assert 'broken.pdf' in [name for name, _ in batch_result.certificates_with_exception]
@@ -0,0 +1,92 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import certificate_journal
+from certificate_journal import JobJournal, JobState, JOURNAL_FILE, get_journal, read_and_verify_journaled, \
+    route_result, set_routed_name
+from certificate_processor import BatchResult, BatchRouter, ProcessOptions, process, list_certificate_files, \
+    create_destinations, move_result
+
+
+def test_journal_resume(tmp_path, monkeypatch, prepare_directory, read_outcome):
+    directory = prepare_directory(tmp_path / 'batch')
+    process(directory, ProcessOptions(workers=1))
+    serial_outcome = read_outcome(directory)
+    shutil.rmtree(directory)
+    prepare_directory(directory)
+
+    # A batch which died after routing the first file and verifying the second one
+    file_names = list_certificate_files(directory)
+    create_destinations(directory)
+    journal_path = os.path.join(directory, JOURNAL_FILE)
+    journal = get_journal(journal_path)
+    journal.queue(file_names)
+    result = read_and_verify_journaled(journal_path, os.path.join(directory, file_names[0]))
+    route_result(BatchRouter(directory), journal, result, BatchResult())
+    read_and_verify_journaled(journal_path, os.path.join(directory, file_names[1]))
+    assert list(journal.get_states().values()) == \
+           [JobState.ROUTED, JobState.VERIFIED] + [JobState.QUEUED] * (len(file_names) - 2)
+
+    with pytest.raises(ValueError):
+        certificate_journal.process(directory, ProcessOptions(workers=1))
+
+    read_files = []
+
+    def read_and_verify(file_path, on_read=None, duplicates_path=None):
+        read_files.append(os.path.basename(file_path))
+        return certificate_processor_read_and_verify(file_path, on_read, duplicates_path)
+
+    certificate_processor_read_and_verify = certificate_journal.read_and_verify
+    monkeypatch.setattr(certificate_journal, 'read_and_verify', read_and_verify)
+    certificate_journal.process(directory, ProcessOptions(workers=1), resume=True)
+    assert read_files == file_names[2:]
+    assert read_outcome(directory) == serial_outcome
+    assert set(journal.get_states().values()) == {JobState.REPORTED}
+    assert [file_name for file_name, _ in journal.get_results()] == file_names
+
+    # The workbooks are rebuilt from the journal without reading the files again
+    os.remove(os.path.join(directory, 'PASS', 'PASS.xlsx'))
+    certificate_journal.process(directory, ProcessOptions(workers=1), resume=True)
+    assert read_files == file_names[2:]
+    assert read_outcome(directory) == serial_outcome
+
+
+def test_journal_reports_a_file_moved_before_the_batch_died(tmp_path, save_failed_certificate, test_data):
+    directory = str(tmp_path)
+    save_failed_certificate(os.path.join(directory, 'certificate.docx'))
+    # FAIL has a file with the same name, the failed file is given the name stored in the journal
+    create_destinations(directory)
+    shutil.copy(os.path.join(test_data, 'DNVGL_LONGTENG.docx'), os.path.join(directory, 'FAIL', 'certificate.docx'))
+    journal_path = os.path.join(directory, JOURNAL_FILE)
+    journal = get_journal(journal_path)
+    journal.queue(['certificate.docx'])
+    result = read_and_verify_journaled(journal_path, os.path.join(directory, 'certificate.docx'))
+    set_routed_name(journal, directory, result)
+    move_result(directory, result)
+    assert journal.get_states() == {'certificate.docx': JobState.VERIFIED}
+
+    batch_result = certificate_journal.process(directory, ProcessOptions(workers=1), resume=True)
+    assert batch_result.failed_files == ['certificate (1).docx']
+    assert journal.get_result('certificate.docx').routed_name == 'certificate (1).docx'
+    assert sorted(os.listdir(os.path.join(directory, 'FAIL'))) == [
+        'certificate (1).docx', 'certificate (1).xlsx', 'certificate.docx'
+    ]
+    assert journal.get_states() == {'certificate.docx': JobState.REPORTED}
+
+
+def test_journal_of_another_version_is_refused(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / JOURNAL_FILE)
+    JobJournal(journal_path).close()
+    JobJournal(journal_path).close()
+    monkeypatch.setattr(certificate_journal, 'get_result_format', lambda: 'another format')
+    with pytest.raises(ValueError, match='another version of FileResult'):
+        JobJournal(journal_path)
+    # A journal written before the journals had a version
+    connection = sqlite3.connect(str(tmp_path / 'old.sqlite3'))
+    connection.execute('CREATE TABLE jobs (file_name TEXT PRIMARY KEY)')
+    connection.close()
+    with pytest.raises(ValueError, match='has version 0, expected version'):
+        JobJournal(str(tmp_path / 'old.sqlite3'))
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import time
+
+from certificate_node import CertificateNode, LeaseDirectory
+from certificate_processor import ProcessOptions, get_pool_context, list_certificate_files
+from resource_governor import ResourceGovernor
+
+
+def run_node(arguments):
+    directory, node = arguments
+    # The nodes run in the daemonic workers of a pool, which cannot have workers of their own
+    certificate_node = CertificateNode(directory, node, lease_seconds=5, heartbeat_seconds=0.5, poll_seconds=0.1,
+                                       options=ProcessOptions(workers=1))
+    certificate_node.run()
+    return node, certificate_node.processed_files
+
+
+def test_nodes_share_the_intake(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'intake')
+    for number in range(4):
+        shutil.copy(os.path.join(directory, 'DNVGL_LONGTENG.docx'), os.path.join(directory, f"copy_{number}.docx"))
+    file_names = list_certificate_files(directory)
+    with get_pool_context().Pool(3) as pool:
+        processed = dict(pool.map(run_node, [(directory, f"node{number}") for number in range(3)]))
+    assert sorted([file_name for files in processed.values() for file_name in files]) == sorted(file_names)
+    assert list_certificate_files(directory) == []
+    assert os.listdir(os.path.join(directory, '.leases')) == []
+    for node in processed:
+        assert os.path.exists(os.path.join(directory, 'PASS', f"PASS_{node}.xlsx"))
+        assert os.path.exists(os.path.join(directory, 'EXCEPTION', f"EXCEPTION_{node}.xlsx"))
+    assert len([name for name in os.listdir(os.path.join(directory, 'PASS')) if name.endswith('.docx')]) == 5
+
+
+def test_expired_lease_is_reclaimed(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'intake')
+    # A node died while holding the lease of the Word file
+    dead_node = LeaseDirectory(directory, 'dead', lease_seconds=1)
+    lease = dead_node.try_claim('DNVGL_LONGTENG.docx')
+    assert lease is not None and lease.is_held()
+    assert dead_node.try_claim('DNVGL_LONGTENG.docx') is None
+    start = time.time()
+    certificate_node = CertificateNode(directory, 'alive', lease_seconds=1, poll_seconds=0.1)
+    certificate_node.run()
+    assert time.time() - start > 1
+    assert 'DNVGL_LONGTENG.docx' in certificate_node.processed_files
+    assert not lease.is_held()
+    assert os.path.exists(os.path.join(directory, 'PASS', 'DNVGL_LONGTENG.docx'))
+    assert os.listdir(os.path.join(directory, '.leases')) == []
+
+
+def test_live_lease_is_kept(tmp_path):
+    leases = LeaseDirectory(str(tmp_path), 'node', lease_seconds=1)
+    with open(tmp_path / 'a.pdf', 'wb') as f:
+        f.write(b'a')
+    lease = leases.try_claim('a.pdf')
+    with lease.keep_alive(0.1):
+        time.sleep(1.5)
+        assert LeaseDirectory(str(tmp_path), 'other', lease_seconds=1).try_claim('a.pdf') is None
+    with open(lease.path) as f:
+        assert json.load(f)['node'] == 'node'
+    lease.release()
+    assert LeaseDirectory(str(tmp_path), 'other').try_claim('a.pdf') is not None
+    # The files routed by another node are not claimed
+    assert LeaseDirectory(str(tmp_path), 'other').try_claim('b.pdf') is None
+
+
+def test_node_verifies_its_leases_in_one_pool(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'intake')
+    file_names = list_certificate_files(directory)
+    certificate_node = CertificateNode(directory, 'node', options=ProcessOptions(workers=2))
+    rounds = []
+    verify_files = certificate_node.router.verify_files
+
+    def record_round(round_file_names, pool=None):
+        rounds.append((round_file_names, pool))
+        return verify_files(round_file_names, pool=pool)
+
+    certificate_node.router.verify_files = record_round
+    certificate_node.run()
+    assert [len(round_file_names) for round_file_names, _ in rounds] == [2] * (len(file_names) // 2)
+    assert rounds[0][1] is not None and all([pool is rounds[0][1] for _, pool in rounds])
+    assert certificate_node.pool is None
+    assert sorted(certificate_node.processed_files) == file_names
+    assert os.listdir(os.path.join(directory, '.leases')) == []
+
+
+def test_node_keeps_the_governed_workers_between_the_rounds(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'intake')
+    file_names = list_certificate_files(directory)
+    governor = ResourceGovernor(timeout=60)
+    certificate_node = CertificateNode(directory, 'node', options=ProcessOptions(workers=2, governor=governor))
+    pids = []
+    run = governor.run
+
+    def record_workers(*arguments):
+        yield from run(*arguments)
+        pids.append({worker.process.pid for worker in governor.kept_workers})
+
+    governor.run = record_workers
+    certificate_node.run()
+    assert len(pids) == len(file_names) // 2
+    assert all([round_pids == pids[0] for round_pids in pids]) and len(pids[0]) == 2
+    assert governor.kept_workers is None
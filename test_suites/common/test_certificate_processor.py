@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import certificate_pipeline
+import instrumentation
+from certificate_pipeline import CertificatePipeline
+from certificate_processor import ProcessOptions, process, list_certificate_files
+from duplicate_index import DuplicateIndex
+from metrics import CertificateMetrics
+from resource_governor import ResourceGovernor
+from results_store import ResultsStore
+
+
+def test_parallel_process_matches_serial(tmp_path, prepare_directory, read_outcome):
+    # Both runs use the same directory, as the exception messages may contain the path of the file
+    directory = prepare_directory(tmp_path / 'batch')
+    file_names = list_certificate_files(directory)
+    assert 'broken.pdf' in file_names
+    serial_result = process(directory, ProcessOptions(workers=1))
+    assert list_certificate_files(directory) == []
+    serial_outcome = read_outcome(directory)
+    shutil.rmtree(directory)
+    prepare_directory(directory)
+    parallel_result = process(directory, ProcessOptions(workers=3))
+    assert 'broken.pdf' in [file_name for file_name, _ in serial_result.certificates_with_exception]
+    assert serial_result.certificates_with_exception == parallel_result.certificates_with_exception
+    assert serial_result.failed_files == parallel_result.failed_files
+    assert serial_result.passed_certificate_nos == parallel_result.passed_certificate_nos
+    assert ('PASS', 'PASS.xlsx') in serial_outcome and ('EXCEPTION', 'broken.pdf') in serial_outcome
+    assert len([key for key in serial_outcome if not key[1].endswith('.xlsx')]) == len(file_names)
+    assert read_outcome(directory) == serial_outcome
+
+
+def test_pipeline_matches_serial(tmp_path, prepare_directory, read_outcome):
+    directory = prepare_directory(tmp_path / 'batch')
+    serial_result = process(directory, ProcessOptions(workers=1))
+    serial_outcome = read_outcome(directory)
+    shutil.rmtree(directory)
+    prepare_directory(directory)
+    file_count = len(list_certificate_files(directory))
+    pipeline = CertificatePipeline(directory, ProcessOptions(workers=2), queue_size=1)
+    pipeline_result = pipeline.process()
+    assert pipeline_result.certificates_with_exception == serial_result.certificates_with_exception
+    assert pipeline_result.failed_files == serial_result.failed_files
+    assert read_outcome(directory) == serial_outcome
+    assert pipeline.statistics['parse'].items == pipeline.statistics['route'].items == file_count
+    assert pipeline.statistics['report'].items == len(serial_result.failed_files)
+    assert pipeline.queue_depths() == {'route': 0, 'report': 0}
+
+
+def test_pipeline_routes_and_records_in_its_threads(tmp_path, monkeypatch, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    file_count = len(list_certificate_files(directory))
+    store = ResultsStore(str(tmp_path / 'results.sqlite3'))
+    threads = set()
+    add_result = certificate_pipeline.add_result
+
+    def slow_add_result(*arguments):
+        threads.add(threading.get_ident())
+        time.sleep(0.2)
+        add_result(*arguments)
+
+    monkeypatch.setattr(certificate_pipeline, 'add_result', slow_add_result)
+    pipeline = CertificatePipeline(directory, ProcessOptions(workers=2, store=store), queue_size=1)
+    pipeline.process()
+    assert threads and threading.get_ident() not in threads
+    assert len(store.find_certificates()) > 0
+    # A slow route blocks the parse stage
+    assert pipeline.statistics['route'].busy_seconds >= 0.2 * file_count
+    assert pipeline.statistics['parse'].blocked_seconds > 0
+    store.close()
+
+
+def test_pipeline_with_the_options_of_the_processor(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    file_names = list_certificate_files(directory)
+    timings_path = str(tmp_path / 'timings.jsonl')
+    metrics = CertificateMetrics()
+    governor = ResourceGovernor(max_tasks=1)
+    pipeline = CertificatePipeline(directory, ProcessOptions(workers=2, governor=governor, timings=timings_path,
+                                                             metrics=metrics))
+    pipeline_result = pipeline.process()
+    assert instrumentation.hooks == ()
+    assert governor.recycled_workers > 0
+    with open(timings_path, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(file_names)
+    assert sum([metrics.files.get(verdict=verdict) for verdict in ['PASS', 'FAIL', 'EXCEPTION']]) == len(file_names)
+    assert metrics.files.get(verdict='EXCEPTION') == len(pipeline_result.certificates_with_exception)
+    assert metrics.pending.get() == 0
+    # The files are read ahead of the routing, they cannot be looked up in the index
+    with pytest.raises(ValueError):
+        CertificatePipeline(directory, ProcessOptions(duplicates=DuplicateIndex(str(tmp_path / 'index.sqlite3'))))
+
+
+def test_only_the_failed_limits_are_printed(tmp_path, save_failed_certificate, capsys):
+    save_failed_certificate(os.path.join(tmp_path, 'certificate.docx'))
+    process(str(tmp_path), ProcessOptions(workers=1))
+    lines = capsys.readouterr().out.splitlines()
+    failed = lines[lines.index('Verification Fail!') + 1:]
+    assert failed[0].startswith('[FAIL] The value of chemical element C is 0.5')
+    assert not any(['[PASS]' in line for line in lines])
+
+
+def test_failed_files_with_the_same_name(tmp_path, save_failed_certificate, read_workbook):
+    directory = str(tmp_path)
+    save_failed_certificate(os.path.join(directory, 'certificate.docx'))
+    process(directory, ProcessOptions(workers=1))
+    # Another file with the same name, indexed, and then a copy of it
+    index = DuplicateIndex(str(tmp_path / 'duplicates.sqlite3'))
+    save_failed_certificate(os.path.join(directory, 'certificate.docx'), carbon='0.60')
+    second_result = process(directory, ProcessOptions(workers=1, duplicates=index))
+    assert second_result.failed_files == ['certificate (1).docx']
+    assert sorted(os.listdir(os.path.join(directory, 'FAIL'))) == [
+        'certificate (1).docx', 'certificate (1).xlsx', 'certificate.docx', 'certificate.xlsx'
+    ]
+    carbon = [
+        read_workbook(os.path.join(directory, 'FAIL', file_name))[2][9][0]
+        for file_name in ['certificate.xlsx', 'certificate (1).xlsx']
+    ]
+    assert carbon == [0.5, 0.6]
+    save_failed_certificate(os.path.join(directory, 'copy.docx'), carbon='0.60')
+    assert process(directory, ProcessOptions(workers=1, duplicates=index)).duplicates == [
+        ('copy.docx', 'certificate (1).docx', 'FAIL')
+    ]
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+import certificate_service
+from certificate_service import CertificateService, verify_file
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_data')
+DOCX_PATH = os.path.abspath(os.path.join(TEST_DATA, 'DNVGL_LONGTENG.docx'))
+
+
+def send(url: str, data: bytes = None):
+    request = urllib.request.Request(url, data=data, method='GET' if data is None else 'POST')
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def verify_or_fail(file_path: str):
+    # Verifies in the workers like verify_file, except that crash.docx kills the worker, error.docx raises and
+    # wait.docx waits for the file named in its content
+    file_name = os.path.basename(file_path)
+    if file_name == 'crash.docx':
+        os._exit(1)
+    if file_name == 'error.docx':
+        raise RuntimeError('The verification failed.')
+    if file_name == 'wait.docx':
+        with open(file_path, encoding='utf-8') as f:
+            release_path = f.read()
+        while not os.path.exists(release_path):
+            time.sleep(0.05)
+        return {'file_name': file_name}
+    return verify_file(file_path)
+
+
+def test_certificate_service(monkeypatch, tmp_path):
+    # Set before the workers are forked
+    monkeypatch.setattr(certificate_service, 'verify_file', verify_or_fail)
+    release_path = str(tmp_path / 'release')
+
+    async def run():
+        service = CertificateService(port=0, workers=1, max_concurrent=1, max_pending=0)
+        await service.start()
+        url = f"http://127.0.0.1:{service.port}"
+        loop = asyncio.get_running_loop()
+        try:
+            health = await loop.run_in_executor(None, send, f"{url}/health")
+            by_path = await loop.run_in_executor(None, send, f"{url}/verify?path={quote(DOCX_PATH)}", b'')
+            with open(DOCX_PATH, 'rb') as f:
+                uploaded = await loop.run_in_executor(None, send, f"{url}/verify?file_name=upload.docx", f.read())
+            missing = await loop.run_in_executor(None, send, f"{url}/verify?path=missing.pdf", b'')
+            not_certificate = await loop.run_in_executor(None, send, f"{url}/verify?file_name=notes.txt", b'text')
+            # A single request is verified at once, and none may wait
+            waiting = loop.run_in_executor(None, send, f"{url}/verify?file_name=wait.docx", release_path.encode())
+            while (await loop.run_in_executor(None, send, f"{url}/health"))[1]['running'] == 0:
+                await asyncio.sleep(0.05)
+            refused = await loop.run_in_executor(None, send, f"{url}/verify?path={quote(DOCX_PATH)}", b'')
+            open(release_path, 'w').close()
+            waited = await waiting
+            return health, by_path, uploaded, missing, not_certificate, refused, waited
+        finally:
+            await service.stop()
+
+    health, by_path, uploaded, missing, not_certificate, refused, waited = asyncio.run(run())
+    assert health == (200, {'status': 'ok', 'workers': 1, 'running': 0, 'pending': 0})
+    status, result = by_path
+    assert status == 200 and result['verdict'] == 'PASS' and result['file_name'] == 'DNVGL_LONGTENG.docx'
+    plate = result['certificates'][0]['steel_plates'][0]
+    assert plate['verdict'] == 'PASS'
+    assert plate['fields']['specification']['valid'] is True
+    assert '[PASS]' in plate['fields']['specification']['message']
+    assert all([annotation['valid'] for annotation in plate['chemistry'].values()])
+    assert uploaded[0] == 200 and uploaded[1]['file_name'] == 'upload.docx'
+    assert uploaded[1]['certificates'] == result['certificates']
+    assert missing[0] == 404 and not_certificate[0] == 415
+    assert refused == (503, {'error': '0 requests are already waiting.'})
+    assert waited == (200, {'file_name': 'wait.docx'})
+    assert os.path.exists(DOCX_PATH)
+
+
+def test_certificate_service_recovers_from_failures(monkeypatch):
+    monkeypatch.setattr(certificate_service, 'verify_file', verify_or_fail)
+
+    async def run():
+        service = CertificateService(port=0, workers=1)
+        await service.start()
+        url = f"http://127.0.0.1:{service.port}"
+        loop = asyncio.get_running_loop()
+        try:
+            failed = await loop.run_in_executor(None, send, f"{url}/verify?file_name=error.docx", b'')
+            crashed = await loop.run_in_executor(None, send, f"{url}/verify?file_name=crash.docx", b'')
+            # On a new pool of workers
+            verified = await loop.run_in_executor(None, send, f"{url}/verify?path={quote(DOCX_PATH)}", b'')
+            health = await loop.run_in_executor(None, send, f"{url}/health")
+            return failed, crashed, verified, health
+        finally:
+            await service.stop()
+
+    failed, crashed, verified, health = asyncio.run(run())
+    assert failed == (500, {'error': 'RuntimeError: The verification failed.'})
+    assert crashed == (500, {'error': 'The worker verifying crash.docx stopped unexpectedly.'})
+    assert verified[0] == 200 and verified[1]['verdict'] == 'PASS'
+    assert health == (200, {'status': 'ok', 'workers': 1, 'running': 0, 'pending': 0})
@@ -0,0 +1,138 @@
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+from openpyxl import load_workbook
+
+import certificate_processor
+from certificate_processor import ProcessOptions
+from certificate_watcher import CertificateWatcher, InotifyWatcher, PollingWatcher
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test_data', 'DNVGL_LONGTENG.docx')
+
+
+@pytest.mark.parametrize('poll', [
+    True,
+    pytest.param(False, marks=pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only'))
+])
+def test_watcher_processes_settled_files(tmp_path, poll):
+    with open(TEST_FILE, 'rb') as f:
+        content = f.read()
+    watcher = CertificateWatcher(str(tmp_path), settle_seconds=0.3, poll=poll, interval=0.05,
+                                 options=ProcessOptions(workers=1))
+    watcher.start()
+    try:
+        assert isinstance(watcher.watcher, PollingWatcher if poll else InotifyWatcher)
+        file_path = tmp_path / 'DNVGL_LONGTENG.docx'
+        # A file being copied is not read before it has settled
+        with open(file_path, 'wb') as f:
+            f.write(content[:len(content) // 2])
+            f.flush()
+            assert watcher.run_once(0.1) == []
+            f.write(content[len(content) // 2:])
+        assert watcher.run_once(0.1) == []
+        assert 'DNVGL_LONGTENG.docx' in watcher.pending
+        deadline = time.monotonic() + 10
+        results = []
+        while not results and time.monotonic() < deadline:
+            results = watcher.run_once(0.1)
+    finally:
+        watcher.stop()
+    assert [result.file_name for result in results] == ['DNVGL_LONGTENG.docx']
+    assert results[0].exception_message is None and results[0].valid_flag
+    assert sorted(os.listdir(tmp_path / 'PASS')) == ['DNVGL_LONGTENG.docx', f"PASS_{time.strftime('%Y-%m-%d')}.xlsx"]
+    assert not file_path.exists()
+    assert watcher.pending == {}
+
+
+def test_watcher_rotates_the_summaries(tmp_path):
+    day = time.strftime('%Y-%m-%d')
+    watcher = CertificateWatcher(str(tmp_path), summary_size=2, options=ProcessOptions(workers=2))
+    watcher.start()
+    try:
+        pool = watcher.pool
+        for name in ['a.docx', 'b.docx', 'c.docx']:
+            shutil.copy(TEST_FILE, tmp_path / name)
+            results = watcher.process_files([name])
+            assert [result.file_name for result in results] == [name]
+        # The same workers for every round, and only the results of the current summaries are kept
+        assert watcher.pool is pool
+        assert watcher.summary_files == 1
+        assert watcher.batch_result.passed_certificate_nos == [c.certificate_no for c in results[0].certificates]
+        assert watcher.passed_workbook.output_file == os.path.join(str(tmp_path), 'PASS', f"PASS_{day}_2.xlsx")
+    finally:
+        watcher.stop()
+    assert watcher.pool is None
+    assert sorted(os.listdir(tmp_path / 'PASS')) == [
+        f"PASS_{day}.xlsx", f"PASS_{day}_2.xlsx", 'a.docx', 'b.docx', 'c.docx'
+    ]
+    plates = sum([len(certificate.steel_plates) for certificate in results[0].certificates])
+    rows = [load_workbook(tmp_path / 'PASS' / f"PASS_{day}{suffix}.xlsx").active.max_row for suffix in ['', '_2']]
+    assert rows == [2 + 2 * plates, 2 + plates]
+    # A watcher started again the same day does not overwrite them
+    shutil.copy(TEST_FILE, tmp_path / 'd.docx')
+    watcher = CertificateWatcher(str(tmp_path), options=ProcessOptions(workers=1))
+    watcher.start()
+    try:
+        watcher.process_files(['d.docx'])
+    finally:
+        watcher.stop()
+    assert os.path.exists(tmp_path / 'PASS' / f"PASS_{day}_3.xlsx")
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+def test_inotify_overflow_reports_all_the_files(tmp_path):
+    shutil.copy(TEST_FILE, tmp_path / 'a.docx')
+    watcher = InotifyWatcher(str(tmp_path))
+    os.close(watcher.fd)
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    watcher.fd = read_fd
+    try:
+        os.write(write_fd, InotifyWatcher.EVENT_HEADER.pack(-1, InotifyWatcher.IN_Q_OVERFLOW, 0, 0))
+        assert watcher.wait(1) == {'a.docx'}
+    finally:
+        os.close(write_fd)
+        watcher.close()
+
+
+def test_watcher_rescans_the_directory(tmp_path, monkeypatch):
+    watcher = CertificateWatcher(str(tmp_path), settle_seconds=60, poll=True, interval=0.01, rescan_intervals=5,
+                                 options=ProcessOptions(workers=1))
+    watcher.start()
+    try:
+        # The event of the file is lost, it is found by the next rescan
+        monkeypatch.setattr(watcher.watcher, 'wait', lambda timeout: set())
+        shutil.copy(TEST_FILE, tmp_path / 'a.docx')
+        watcher.run_once(0)
+        assert watcher.pending == {}
+        time.sleep(0.05)
+        watcher.run_once(0)
+        assert list(watcher.pending) == ['a.docx']
+    finally:
+        watcher.stop()
+
+
+def test_watcher_keeps_going_when_a_file_cannot_be_routed(tmp_path, monkeypatch):
+    move_result = certificate_processor.move_result
+
+    def move_or_fail(directory, result):
+        if result.file_name == 'a.docx':
+            raise FileNotFoundError(f"{result.file_name} was deleted")
+        return move_result(directory, result)
+
+    monkeypatch.setattr(certificate_processor, 'move_result', move_or_fail)
+    watcher = CertificateWatcher(str(tmp_path), options=ProcessOptions(workers=1))
+    watcher.start()
+    try:
+        for name in ['a.docx', 'b.docx']:
+            shutil.copy(TEST_FILE, tmp_path / name)
+        results = watcher.process_files(['a.docx', 'b.docx'])
+    finally:
+        watcher.stop()
+    assert [result.file_name for result in results] == ['b.docx']
+    assert watcher.summary_files == 1
+    assert sorted(os.listdir(tmp_path / 'PASS')) == [f"PASS_{time.strftime('%Y-%m-%d')}.xlsx", 'b.docx']
@@ -0,0 +1,96 @@
+import os
+import shutil
+
+import docx
+from openpyxl import load_workbook
+
+import certificate_journal
+from certificate_node import CertificateNode
+from batch_scheduler import BatchScheduler
+from certificate_processor import ProcessOptions, process, list_certificate_files, read_and_verify
+from common import DocxFile
+from duplicate_index import DuplicateIndex, hash_file
+
+
+def test_duplicates_are_routed_to_earlier_verdict(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    # A copy has the same bytes, a document saved again has the same certificates
+    shutil.copy(os.path.join(directory, 'DNVGL_LONGTENG.docx'), os.path.join(directory, 'copy.docx'))
+    docx.Document(os.path.join(directory, 'DNVGL_LONGTENG.docx')).save(os.path.join(directory, 'saved_again.docx'))
+    assert hash_file(os.path.join(directory, 'saved_again.docx')) != \
+           hash_file(os.path.join(directory, 'DNVGL_LONGTENG.docx'))
+    index = DuplicateIndex(str(tmp_path / 'duplicates.sqlite3'))
+
+    batch_result = process(directory, ProcessOptions(workers=1, duplicates=index))
+    assert list_certificate_files(directory) == []
+    assert batch_result.duplicates == [
+        ('copy.docx', 'DNVGL_LONGTENG.docx', 'PASS'), ('saved_again.docx', 'DNVGL_LONGTENG.docx', 'PASS')
+    ]
+    assert sorted(os.listdir(os.path.join(directory, 'DUPLICATE'))) == ['DUPLICATE.xlsx', 'copy.docx',
+                                                                       'saved_again.docx']
+    rows = [[cell.value for cell in row] for row in
+            load_workbook(os.path.join(directory, 'DUPLICATE', 'DUPLICATE.xlsx')).active.iter_rows()]
+    assert rows == [['FILE NAME', 'DUPLICATE OF', 'VERDICT'], ['copy.docx', 'DNVGL_LONGTENG.docx', 'PASS'],
+                    ['saved_again.docx', 'DNVGL_LONGTENG.docx', 'PASS']]
+
+    # In a later batch, the files already verified are duplicates, the files with an exception are read again
+    second_directory = prepare_directory(tmp_path / 'second_batch')
+    docx.Document(os.path.join(second_directory, 'DNVGL_LONGTENG.docx')).save(
+        os.path.join(second_directory, 'saved_again.docx')
+    )
+    second_result = process(second_directory, ProcessOptions(workers=2, duplicates=index))
+    assert second_result.duplicates == [
+        ('DNVGL_LONGTENG.docx', 'DNVGL_LONGTENG.docx', 'PASS'), ('saved_again.docx', 'DNVGL_LONGTENG.docx', 'PASS')
+    ]
+    assert second_result.passed_certificate_nos == []
+    assert 'broken.pdf' in [file_name for file_name, _ in second_result.certificates_with_exception]
+    assert os.path.exists(os.path.join(second_directory, 'EXCEPTION', 'broken.pdf'))
+    index.close()
+
+
+def test_journal_and_nodes_check_the_index(tmp_path, prepare_directory, test_data):
+    index = DuplicateIndex(str(tmp_path / 'duplicates.sqlite3'))
+    directory = prepare_directory(tmp_path / 'batch')
+    shutil.copy(os.path.join(directory, 'DNVGL_LONGTENG.docx'), os.path.join(directory, 'copy.docx'))
+    batch_result = certificate_journal.process(directory, ProcessOptions(workers=2, duplicates=index))
+    assert batch_result.duplicates == [('copy.docx', 'DNVGL_LONGTENG.docx', 'PASS')]
+    assert os.path.exists(os.path.join(directory, 'DUPLICATE', 'DUPLICATE.xlsx'))
+
+    # The same file dropped later into the intake of a node
+    intake = str(tmp_path / 'intake')
+    os.makedirs(intake)
+    shutil.copy(os.path.join(test_data, 'DNVGL_LONGTENG.docx'), intake)
+    node_result = CertificateNode(intake, 'node', options=ProcessOptions(workers=1, duplicates=index)).run()
+    assert node_result.duplicates == [('DNVGL_LONGTENG.docx', 'DNVGL_LONGTENG.docx', 'PASS')]
+    assert sorted(os.listdir(os.path.join(intake, 'DUPLICATE'))) == ['DNVGL_LONGTENG.docx', 'DUPLICATE_node.xlsx']
+    index.close()
+
+
+def test_scheduled_duplicates_name_the_file_routed_first(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    shutil.copy(os.path.join(directory, 'DNVGL_LONGTENG.docx'), os.path.join(directory, 'copy.docx'))
+    docx.Document(os.path.join(directory, 'DNVGL_LONGTENG.docx')).save(os.path.join(directory, 'saved_again.docx'))
+    index = DuplicateIndex(str(tmp_path / 'duplicates.sqlite3'))
+    batch_result = process(directory, ProcessOptions(workers=2, scheduler=BatchScheduler(), duplicates=index))
+    assert list_certificate_files(directory) == []
+    # The original, the copy and the document saved again complete in any order, the first one routed is the original
+    duplicates = {file_name: (earlier_file, verdict) for file_name, earlier_file, verdict in batch_result.duplicates}
+    [original] = {'DNVGL_LONGTENG.docx', 'copy.docx', 'saved_again.docx'} - set(duplicates)
+    assert set(duplicates.values()) == {(original, 'PASS')}
+    assert len(os.listdir(os.path.join(directory, 'DUPLICATE'))) == 3
+    index.close()
+
+
+def test_certificates_are_looked_up_before_the_tables_are_extracted(tmp_path, monkeypatch, test_data):
+    file_path = os.path.join(test_data, 'DNVGL_LONGTENG.docx')
+    result = read_and_verify(file_path)
+    index = DuplicateIndex(str(tmp_path / 'duplicates.sqlite3'))
+    index.add('the hash of another file', 'scanned.docx', 'PASS', result.steel_plant, result.certificate_nos)
+    extracted = []
+    monkeypatch.setattr(DocxFile, 'extract_tables', lambda docx_file: extracted.append(docx_file.file_path))
+    duplicate = read_and_verify(file_path, duplicates_path=index.path)
+    assert duplicate.duplicate_of == ('scanned.docx', 'PASS')
+    assert duplicate.certificate_nos == result.certificate_nos
+    assert duplicate.content_hash == hash_file(file_path)
+    assert extracted == []
+    index.close()
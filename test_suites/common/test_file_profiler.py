@@ -0,0 +1,77 @@
+import os
+import pstats
+
+import pytest
+
+import file_profiler
+from certificate_processor import ProcessOptions, process
+from file_profiler import FileProfile, SlowestProfiles, get_collapsed_stacks, profile_file, enable_profiling, \
+    disable_profiling
+
+MAIN = ('main.py', 1, 'main')
+READ = ('reader.py', 10, 'read')
+PARSE = ('reader.py', 20, 'parse')
+LEN = ('~', 0, '<built-in method builtins.len>')
+
+
+def test_nothing_is_profiled_unless_enabled():
+    with profile_file() as file_profile:
+        sum(range(1000))
+    assert file_profile is None
+    enable_profiling()
+    try:
+        with profile_file() as file_profile:
+            sum(range(1000))
+    finally:
+        disable_profiling()
+    assert not file_profiler.enabled
+    assert file_profile.seconds > 0
+    assert any([name == "<built-in method builtins.sum>" for _, _, name in file_profile.stats])
+
+
+def test_slowest_profiles_are_kept():
+    with pytest.raises(ValueError):
+        SlowestProfiles(0)
+    slowest_profiles = SlowestProfiles(2)
+    for file_name, seconds in [('a.pdf', 1.0), ('b.pdf', 3.0), ('c.pdf', 0.5), ('d.pdf', 2.0), ('e.pdf', 2.0)]:
+        slowest_profiles.add(file_name, FileProfile(seconds))
+    assert [file_name for file_name, _ in slowest_profiles.get_slowest()] == ['b.pdf', 'd.pdf']
+    assert len(slowest_profiles.heap) == 2
+
+
+def test_collapsed_stacks_split_the_time_between_the_callers():
+    # main calls read twice and parse once, read calls parse, parse calls len
+    stats = {
+        MAIN: (1, 1, 0.1, 1.0, {}),
+        READ: (2, 2, 0.2, 0.6, {MAIN: (2, 2, 0.2, 0.6)}),
+        PARSE: (2, 2, 0.4, 0.6, {MAIN: (1, 1, 0.1, 0.3), READ: (1, 1, 0.3, 0.3)}),
+        LEN: (2, 2, 0.2, 0.2, {PARSE: (2, 2, 0.2, 0.2)}),
+    }
+    stacks = get_collapsed_stacks(stats)
+    assert stacks == {
+        'main (main.py:1)': 100000,
+        'main (main.py:1);read (reader.py:10)': 200000,
+        'main (main.py:1);read (reader.py:10);parse (reader.py:20)': 200000,
+        'main (main.py:1);read (reader.py:10);parse (reader.py:20);<built-in method builtins.len>': 100000,
+        'main (main.py:1);parse (reader.py:20)': 200000,
+        'main (main.py:1);parse (reader.py:20);<built-in method builtins.len>': 100000,
+    }
+    assert sum(stacks.values()) == 900000
+
+
+def test_process_writes_the_profiles_of_the_slowest_files(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    process(directory, ProcessOptions(workers=2, profiles=2))
+    assert not file_profiler.enabled
+    profile_directory = os.path.join(directory, 'PROFILE')
+    file_names = sorted(os.listdir(profile_directory))
+    assert len(file_names) == 4
+    for file_name in file_names:
+        path = os.path.join(profile_directory, file_name)
+        if file_name.endswith('.prof'):
+            assert pstats.Stats(path).total_tt > 0
+        else:
+            assert file_name.endswith('.collapsed.txt')
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            assert lines and all([int(line.rsplit(' ', 1)[1]) > 0 for line in lines])
@@ -0,0 +1,75 @@
+import errno
+import os
+
+import file_router
+from file_router import route, get_free_name
+
+
+def create_file(path, content: bytes):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_route_renames_without_overwriting(tmp_path):
+    destination = str(tmp_path / 'PASS')
+    for number in range(3):
+        file_path = create_file(tmp_path / 'certificate.pdf', bytes([number]))
+        assert os.path.basename(route(file_path, destination)) == \
+               ['certificate.pdf', 'certificate (1).pdf', 'certificate (2).pdf'][number]
+        assert not os.path.exists(file_path)
+    for name, content in [('certificate.pdf', 0), ('certificate (1).pdf', 1), ('certificate (2).pdf', 2)]:
+        with open(os.path.join(destination, name), 'rb') as f:
+            assert f.read() == bytes([content])
+    assert get_free_name(destination, 'other.pdf') == 'other.pdf'
+
+
+def test_route_copies_across_devices(tmp_path, monkeypatch):
+    renames = []
+    link = os.link
+
+    def link_on_the_same_device(source, target):
+        # Only the link of the temporary copy is on the same device
+        if not source.endswith('.partial'):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        renames.append(os.path.basename(target))
+        link(source, target)
+
+    monkeypatch.setattr(file_router.os, 'link', link_on_the_same_device)
+    content = os.urandom(3 * file_router.COPY_BUFFER_SIZE + 1)
+    file_path = create_file(tmp_path / 'certificate.docx', content)
+    target = route(file_path, str(tmp_path / 'FAIL'))
+    assert renames == ['certificate.docx']
+    assert not os.path.exists(file_path)
+    assert os.listdir(tmp_path / 'FAIL') == ['certificate.docx']
+    with open(target, 'rb') as f:
+        assert f.read() == content
+
+
+def test_route_does_not_overwrite_a_name_taken_after_the_lookup(tmp_path, monkeypatch):
+    destination = str(tmp_path / 'PASS')
+    os.makedirs(destination)
+    # Another router takes the free name between the lookup and the move
+    free_names = iter(['certificate.pdf', 'certificate (1).pdf'])
+    monkeypatch.setattr(file_router, 'get_free_name', lambda directory, file_name: next(free_names))
+    create_file(os.path.join(destination, 'certificate.pdf'), b'other')
+    file_path = create_file(tmp_path / 'certificate.pdf', b'routed')
+    assert os.path.basename(route(file_path, destination)) == 'certificate (1).pdf'
+    with open(os.path.join(destination, 'certificate.pdf'), 'rb') as f:
+        assert f.read() == b'other'
+    assert not os.path.exists(file_path)
+
+
+def test_route_without_hard_links(tmp_path, monkeypatch):
+    def link(source, target):
+        raise OSError(errno.EPERM, 'Operation not permitted')
+
+    monkeypatch.setattr(file_router.os, 'link', link)
+    destination = str(tmp_path / 'PASS')
+    for number in range(2):
+        file_path = create_file(tmp_path / 'certificate.pdf', bytes([number]))
+        route(file_path, destination)
+        assert not os.path.exists(file_path)
+    assert sorted(os.listdir(destination)) == ['certificate (1).pdf', 'certificate.pdf']
+    with open(os.path.join(destination, 'certificate (1).pdf'), 'rb') as f:
+        assert f.read() == bytes([1])
@@ -0,0 +1,88 @@
+import json
+
+import instrumentation
+from certificate_processor import ProcessOptions, process, list_certificate_files
+from instrumentation import TimingSummary, add_hook, remove_hook, span, instrumented, get_percentile
+
+
+@instrumented('outer')
+def outer():
+    with span('outer.inner'):
+        pass
+    with span('outer.inner'):
+        inner()
+
+
+@instrumented('inner')
+def inner():
+    return 'inner'
+
+
+def test_no_spans_without_hooks():
+    assert instrumentation.hooks == ()
+    with span('file') as file_span:
+        assert inner() == 'inner'
+    assert file_span is None
+    assert getattr(instrumentation.current, 'span', None) is None
+
+
+def test_nested_stages_are_summed_in_the_parent():
+    finished = []
+    add_hook(finished.append)
+    try:
+        with span('file', file_name='a.pdf') as file_span:
+            outer()
+            outer()
+    finally:
+        remove_hook(finished.append)
+    assert instrumentation.hooks == ()
+    assert [finished_span.name for finished_span in finished].count('outer.inner') == 4
+    assert finished[-1] is file_span and file_span.attributes == {'file_name': 'a.pdf'}
+    assert set(file_span.stages) == {'outer', 'outer.inner', 'inner'}
+    assert file_span.stages['outer'] <= file_span.duration
+    assert file_span.stages['inner'] <= file_span.stages['outer.inner'] <= file_span.stages['outer']
+
+
+def test_span_records_the_error():
+    finished = []
+    add_hook(finished.append)
+    try:
+        with span('file'):
+            raise ValueError('broken')
+    except ValueError:
+        pass
+    finally:
+        remove_hook(finished.append)
+    assert finished[0].attributes == {'error': 'ValueError'}
+    assert getattr(instrumentation.current, 'span', None) is None
+
+
+def test_percentiles():
+    values = [float(value) for value in range(1, 101)]
+    assert get_percentile(values, 50) == 50
+    assert get_percentile(values, 95) == 95
+    assert get_percentile(values, 99) == 99
+    assert get_percentile([3.0], 99) == 3
+    summary = TimingSummary()
+    summary.add_record({'file_name': 'a.pdf', 'timings': {'file': 2.0, 'open': 1.0}})
+    summary.add_record({'file_name': 'b.pdf', 'timings': {'file': 4.0}})
+    assert summary.summarize()['file'] == {'count': 2, 'total': 6.0, 'p50': 2.0, 'p95': 4.0, 'p99': 4.0}
+    assert summary.summarize()['open']['count'] == 1
+
+
+def test_process_writes_timing_records(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    timings_path = str(tmp_path / 'timings.jsonl')
+    file_names = list_certificate_files(directory)
+    process(directory, ProcessOptions(workers=2, timings=timings_path))
+    assert instrumentation.hooks == ()
+    with open(timings_path, encoding='utf-8') as f:
+        records = {record['file_name']: record for record in map(json.loads, f)}
+    assert sorted(records) == file_names
+    assert records['broken.pdf']['verdict'] == 'EXCEPTION'
+    docx_timings = records['DNVGL_LONGTENG.docx']['timings']
+    for stage in ['file', 'open', 'open.load', 'open.tables', 'open.text', 'extract.certificate_no',
+                  'rules.get_rules', 'verify']:
+        assert docx_timings[stage] >= 0, stage
+    assert docx_timings['open.load'] + docx_timings['open.tables'] + docx_timings['open.text'] <= \
+           docx_timings['open'] <= docx_timings['file']
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from common import import_backend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKENDS = ['pdfplumber', 'docx', 'win32com', 'openpyxl']
+MODULES = ['common', 'certificate_verification', 'certificate_factory', 'certificate_processor']
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_does_not_load_backends(module):
+    # In a fresh interpreter, as the other tests have loaded the backends already
+    process = subprocess.run(
+        [sys.executable, '-c', f"import sys, {module}; print([b for b in {BACKENDS!r} if b in sys.modules])"],
+        capture_output=True, text=True, cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT)
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.strip() == '[]'
+
+
+def test_missing_backend():
+    with pytest.raises(ImportError, match='needed to read PDF certificates'):
+        import_backend('no_such_backend', 'read PDF certificates')
@@ -0,0 +1,76 @@
+import csv
+import random
+
+import pytest
+
+import limit_statistics
+from certificate_processor import ProcessOptions, process, list_certificate_files
+from certificate_verification import ChemicalCompositionLimit, LimitType, ThicknessLimit, FineGrainElementLimit, \
+    FineGrainElementLimitCombination
+from common import Direction
+from limit_statistics import LimitStatistics, collect_limit_statistics, enable_limit_statistics, \
+    disable_limit_statistics, get_limit_key
+
+
+def test_limit_key_has_the_parameters():
+    limit = ChemicalCompositionLimit(chemical_element='C', limit_type=LimitType.MAXIMUM, maximum=0.18)
+    assert get_limit_key(limit) == "ChemicalCompositionLimit(chemical_element='C', limit_type=MAXIMUM, maximum=0.18)"
+    assert get_limit_key(ThicknessLimit(maximum=50)) == 'ThicknessLimit(maximum=50, minimum=0, limit_type=RANGE)'
+    combination = FineGrainElementLimitCombination(
+        fine_grain_element_limits=[FineGrainElementLimit(concurrent_limits=[limit])], error_message='No fine grain.'
+    )
+    assert get_limit_key(combination) == (
+        "FineGrainElementLimitCombination(fine_grain_element_limits=[FineGrainElementLimit(concurrent_limits=["
+        "ChemicalCompositionLimit(chemical_element='C', limit_type=MAXIMUM, maximum=0.18)])])"
+    )
+
+
+def test_nothing_is_counted_unless_enabled(create_plate):
+    plate = create_plate('VL A', 'AR', 20, 'Killed', Direction.LONGITUDINAL, random.Random(1))
+    with collect_limit_statistics('BAOSHAN IRON & STEEL CO., LTD.') as statistics:
+        assert ThicknessLimit(maximum=50).verify(plate)
+    assert statistics is None
+
+
+def test_evaluations_failures_and_errors_are_counted(create_plate):
+    plate = create_plate('VL A', 'AR', 60, 'Killed', Direction.LONGITUDINAL, random.Random(1))
+    enable_limit_statistics()
+    try:
+        with collect_limit_statistics('BAOSHAN IRON & STEEL CO., LTD.') as statistics:
+            assert not ThicknessLimit(maximum=50).verify(plate)
+            assert ThicknessLimit(maximum=100).verify(plate)
+            assert not ThicknessLimit(maximum=50).verify(plate)
+            with pytest.raises(ValueError):
+                ChemicalCompositionLimit(chemical_element='Xx', limit_type=LimitType.MAXIMUM, maximum=0.1).verify(plate)
+    finally:
+        disable_limit_statistics()
+    assert getattr(limit_statistics.state, 'statistics', None) is None
+    groups = statistics.get_groups()
+    assert list(groups) == [('BAOSHAN IRON & STEEL CO., LTD.', 'VL A')]
+    counters = {limit_key: counter for limit_key, counter in groups[('BAOSHAN IRON & STEEL CO., LTD.', 'VL A')]}
+    # The limits rejecting the most plates first
+    assert list(counters)[0] == 'ThicknessLimit(maximum=50, minimum=0, limit_type=RANGE)'
+    assert (counters['ThicknessLimit(maximum=50, minimum=0, limit_type=RANGE)'].evaluations,
+            counters['ThicknessLimit(maximum=50, minimum=0, limit_type=RANGE)'].failures) == (2, 2)
+    assert counters['ThicknessLimit(maximum=100, minimum=0, limit_type=RANGE)'].failures == 0
+    assert counters["ChemicalCompositionLimit(chemical_element='Xx', limit_type=MAXIMUM, maximum=0.1)"].errors == 1
+    merged = LimitStatistics()
+    merged.merge(statistics)
+    merged.merge(statistics)
+    assert merged.counters[
+        ('BAOSHAN IRON & STEEL CO., LTD.', 'VL A', 'ThicknessLimit(maximum=50, minimum=0, limit_type=RANGE)')
+    ].evaluations == 4
+
+
+def test_process_writes_limit_statistics(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    output_file = str(tmp_path / 'limit_statistics.csv')
+    process(directory, ProcessOptions(workers=2, limit_statistics=output_file))
+    assert not limit_statistics.enabled
+    with open(output_file, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    plants = {row['steel_plant'] for row in rows}
+    assert 'CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.' in plants
+    assert all([int(row['evaluations']) >= int(row['failures']) + int(row['errors']) for row in rows])
+    assert any([row['limit'].startswith('ChemicalCompositionLimit(') for row in rows])
+    assert len(list_certificate_files(directory)) == 0
@@ -0,0 +1,136 @@
+import random
+import urllib.error
+import urllib.request
+
+import pytest
+
+import instrumentation
+from certificate_processor import FileResult, ProcessOptions, process, list_certificate_files
+from instrumentation import add_hook, remove_hook, span
+from certificate_verification import BaoSteelRuleMaker
+from common import Direction
+from metrics import CertificateMetrics, MetricsExporter, MetricsRegistry, CONTENT_TYPE, THROUGHPUT_WINDOW, \
+    get_cache_lookups, get_cache_lookups_since
+from rule_compiler import RuleCompiler
+
+
+def get_samples(text: str):
+    samples = dict()
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_registry_renders_the_text_format():
+    registry = MetricsRegistry()
+    files = registry.counter('files_total', 'Files.', ['verdict'])
+    pending = registry.gauge('pending', 'Pending files.')
+    seconds = registry.histogram('seconds', 'Seconds.', buckets=[0.1, 1])
+    files.inc(verdict='PASS')
+    files.inc(2, verdict='FAIL')
+    pending.set(3)
+    for value in [0.05, 0.1, 0.5, 2]:
+        seconds.observe(value)
+    with pytest.raises(ValueError):
+        files.inc(-1, verdict='PASS')
+    with pytest.raises(ValueError):
+        files.inc(steel_plant='BAOSHAN IRON & STEEL CO., LTD.')
+    with pytest.raises(ValueError):
+        registry.counter('pending', 'Pending files again.')
+    text = registry.render()
+    assert text.splitlines()[:4] == [
+        '# HELP files_total Files.', '# TYPE files_total counter', 'files_total{verdict="FAIL"} 2',
+        'files_total{verdict="PASS"} 1'
+    ]
+    assert '# TYPE seconds histogram' in text
+    assert get_samples(text) == {
+        'files_total{verdict="FAIL"}': 2, 'files_total{verdict="PASS"}': 1, 'pending': 3,
+        'seconds_bucket{le="0.1"}': 2, 'seconds_bucket{le="1"}': 3, 'seconds_bucket{le="+Inf"}': 4,
+        'seconds_sum': 2.65, 'seconds_count': 4
+    }
+
+
+def test_certificate_metrics_record_the_results():
+    metrics = CertificateMetrics()
+    cache_lookups = {('rule_space', 'hit'): 3, ('rule_space', 'miss'): 1, ('rule_compiler_signature', 'hit'): 2}
+    metrics.record(FileResult(file_name='a.docx', timings={'file': 0.2, 'open': 0.1}, cache_lookups=cache_lookups),
+                   'PASS')
+    metrics.record(FileResult(file_name='b.pdf', exception_message='broken', exception_class='PdfReadError'),
+                   'EXCEPTION')
+    add_hook(metrics)
+    try:
+        with span('report.write_pass'):
+            pass
+    finally:
+        remove_hook(metrics)
+    samples = get_samples(metrics.render())
+    assert samples['certificate_files_total{verdict="PASS"}'] == 1
+    assert samples['certificate_exceptions_total{exception_class="PdfReadError"}'] == 1
+    assert samples['certificate_files_per_second'] > 0
+    assert samples['certificate_file_seconds_count'] == 1
+    assert samples['certificate_stage_seconds_count{stage="open"}'] == 1
+    assert samples['certificate_stage_seconds_count{stage="report.write_pass"}'] == 1
+    assert samples['certificate_cache_lookups_total{cache="rule_space",result="hit"}'] == 3
+    assert samples['certificate_cache_lookups_total{cache="rule_space",result="miss"}'] == 1
+    assert samples['certificate_cache_lookups_total{cache="rule_compiler_signature",result="hit"}'] == 2
+
+
+def test_throughput_of_a_short_run():
+    metrics = CertificateMetrics()
+    # Two files in the first 10 seconds are 0.2 files per second, not 2 / THROUGHPUT_WINDOW
+    metrics.start -= 10
+    metrics.record(FileResult(file_name='a.docx'), 'PASS')
+    metrics.record(FileResult(file_name='b.docx'), 'FAIL')
+    assert metrics.files_per_second.get() == pytest.approx(0.2, rel=0.05)
+    metrics.start -= THROUGHPUT_WINDOW
+    metrics.update_throughput()
+    assert metrics.files_per_second.get() == pytest.approx(2 / THROUGHPUT_WINDOW)
+
+
+def test_rule_compiler_lookups_are_counted(create_plate):
+    compiler = RuleCompiler()
+    plate = create_plate('VL A', 'AR', 20, 'Killed', Direction.LONGITUDINAL, random.Random(1))
+    rules = BaoSteelRuleMaker.get_rules(plate)
+    lookups = get_cache_lookups()
+    compiler.verify(plate, rules)
+    compiler.verify(plate, rules)
+    compiler.verify(plate, list(BaoSteelRuleMaker.get_rules(plate)))
+    counted = get_cache_lookups_since(lookups)
+    assert counted[('rule_compiler_identity', 'hit')] >= 1
+    assert sum([count for (cache, _), count in counted.items() if cache == 'rule_compiler_identity']) == 3
+    assert sum([count for (cache, _), count in counted.items() if cache == 'rule_compiler_signature']) <= 2
+
+
+def test_exporter_writes_and_serves_the_metrics(tmp_path):
+    metrics = CertificateMetrics()
+    textfile = str(tmp_path / 'certificates.prom')
+    with MetricsExporter(metrics, textfile, port=0, interval=60) as exporter:
+        metrics.set_pending(5)
+        with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            assert get_samples(response.read().decode('utf-8'))['certificate_files_pending'] == 5
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/", timeout=5)
+    # Written again when stopped
+    with open(textfile, encoding='utf-8') as f:
+        assert get_samples(f.read())['certificate_files_pending'] == 5
+
+
+def test_process_updates_the_metrics(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    file_names = list_certificate_files(directory)
+    metrics = CertificateMetrics()
+    process(directory, ProcessOptions(workers=2, metrics=metrics))
+    assert instrumentation.hooks == ()
+    samples = get_samples(metrics.render())
+    files = sum([value for name, value in samples.items() if name.startswith('certificate_files_total')])
+    assert files == len(file_names)
+    # broken.pdf at least
+    exceptions = sum([value for name, value in samples.items() if name.startswith('certificate_exceptions_total')])
+    assert exceptions == samples['certificate_files_total{verdict="EXCEPTION"}'] >= 1
+    assert samples['certificate_plates_total'] > 0
+    assert samples['certificate_files_pending'] == 0
+    assert samples['certificate_file_seconds_count'] == files
+    assert samples['certificate_stage_seconds_count{stage="verify"}'] > 0
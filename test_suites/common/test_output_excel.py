@@ -0,0 +1,107 @@
+import os
+import random
+import tracemalloc
+
+from openpyxl import load_workbook
+
+from certificate_processor import read_and_verify
+from common import PlateNo, Quantity, Mass
+from output_utilities.output_excel import initialize_workbook, write_single_certificate, \
+    write_multiple_certificates_to_excel, build_header, create_workbook, get_header_template, TITLE_STYLE, \
+    VALUE_STYLE, INVALID_VALUE_STYLE, StreamingCertificateWorkbook
+
+
+def create_written_certificates(certificates):
+    # The certificates of create_certificates, with the fields of the workbook which it leaves out
+    for certificate in certificates:
+        for plate in certificate.steel_plates:
+            plate.plate_no = PlateNo(None, None, None, f"{plate.batch_no.value}-1", None)
+            plate.quantity = Quantity(None, None, None, 1, None)
+            plate.mass = Mass(None, None, None, 1.5, None)
+    return certificates
+
+
+def read_cells(file_path: str):
+    sheet = load_workbook(file_path).active
+    cells = [
+        [
+            (cell.value, cell.font.b, cell.alignment.horizontal, cell.border.top.style, cell.border.left.style,
+             cell.fill.fgColor.rgb if cell.fill.fill_type else None, cell.comment.text if cell.comment else None)
+            for cell in row
+        ]
+        for row in sheet.iter_rows()
+    ]
+    return sheet.title, sorted([merged_range.coord for merged_range in sheet.merged_cells.ranges]), cells
+
+
+def test_streaming_workbook_is_the_same_as_the_workbook_in_memory(tmp_path, create_certificates):
+    certificates = create_written_certificates(create_certificates(random.Random(2020)))
+    workbook, sheet, row_cursor, _ = initialize_workbook('PASS')
+    for certificate in certificates:
+        row_cursor = write_single_certificate(certificate, sheet, row_cursor)
+    workbook.save(filename=str(tmp_path / 'expected.xlsx'))
+    # From a generator, the certificates are written as they come
+    write_multiple_certificates_to_excel((certificate for certificate in certificates),
+                                         output_file=str(tmp_path / 'PASS.xlsx'))
+    title, merged_ranges, cells = read_cells(str(tmp_path / 'PASS.xlsx'))
+    assert title == 'PASS'
+    assert 'A1:C1' in merged_ranges and 'D1:E1' in merged_ranges
+    assert (title, merged_ranges, cells) == read_cells(str(tmp_path / 'expected.xlsx'))
+    assert len(cells) == 2 + sum([len(certificate.steel_plates) for certificate in certificates])
+    assert any([comment is not None for row in cells for *_, comment in row])
+
+
+def test_streaming_workbook_without_certificates(tmp_path):
+    write_multiple_certificates_to_excel([], sheet_name='FAIL', output_file=str(tmp_path / 'FAIL.xlsx'))
+    title, merged_ranges, cells = read_cells(str(tmp_path / 'FAIL.xlsx'))
+    assert title == 'FAIL' and 'A1:C1' in merged_ranges
+    assert [value for value, *_ in cells[1][:3]] == ['FILE NAME', 'STEEL PLANT', 'CERTIFICATE NO.']
+
+
+def test_header_template_is_the_header_built_from_scratch(tmp_path):
+    workbook = create_workbook()
+    workbook.active.title = 'FAIL'
+    row_cursor = build_header(workbook.active)
+    workbook.save(filename=str(tmp_path / 'expected.xlsx'))
+    assert get_header_template() is get_header_template()
+    workbook, sheet, cloned_row_cursor, column_cursor = initialize_workbook('FAIL')
+    workbook.save(filename=str(tmp_path / 'cloned.xlsx'))
+    assert (cloned_row_cursor, column_cursor) == (row_cursor, 1) == (3, 1)
+    assert read_cells(str(tmp_path / 'cloned.xlsx')) == read_cells(str(tmp_path / 'expected.xlsx'))
+    assert sheet['A1'].style == TITLE_STYLE
+
+
+def test_cells_have_named_styles(tmp_path, create_certificates):
+    certificates = create_written_certificates(create_certificates(random.Random(2020)))
+    write_multiple_certificates_to_excel(certificates, output_file=str(tmp_path / 'PASS.xlsx'))
+    sheet = load_workbook(str(tmp_path / 'PASS.xlsx')).active
+    styles = {cell.style for row in sheet.iter_rows(min_row=3) for cell in row}
+    assert styles == {VALUE_STYLE, INVALID_VALUE_STYLE}
+    assert all([cell.comment is not None for row in sheet.iter_rows(min_row=3) for cell in row
+                if cell.style == INVALID_VALUE_STYLE])
+
+
+def get_peak_memory(certificates, repeats: int, output_file: str) -> int:
+    # Peak of the memory allocated while the rows are written, before the workbook is saved
+    tracemalloc.start()
+    try:
+        workbook = StreamingCertificateWorkbook(output_file)
+        for _ in range(repeats):
+            for certificate in certificates:
+                workbook.write(certificate)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    workbook.save()
+    return peak
+
+
+def test_streaming_workbook_memory_does_not_grow_with_the_rows(tmp_path, test_data):
+    # Passed certificates, without the comments of invalid values
+    certificates = read_and_verify(os.path.join(test_data, 'DNVGL_LONGTENG.docx')).certificates
+    get_peak_memory(certificates, 1, str(tmp_path / 'warm_up.xlsx'))
+    peaks = [get_peak_memory(certificates, repeats, str(tmp_path / f"PASS_{repeats}.xlsx")) for repeats in [2, 20]]
+    rows = sum([1 for _ in load_workbook(str(tmp_path / 'PASS_20.xlsx'), read_only=True).active.iter_rows()])
+    assert rows == 2 + 20 * sum([len(certificate.steel_plates) for certificate in certificates])
+    # Ten times the rows, not ten times the memory
+    assert peaks[1] < peaks[0] * 2
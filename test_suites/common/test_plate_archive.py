@@ -0,0 +1,81 @@
+import math
+import os
+import random
+import time
+
+import pytest
+
+from certificate_processor import FileResult
+from plate_archive import PlateArchive, get_plate_row
+from test_suites.common.conftest import BAOSHAN, LONGTENG
+
+
+def test_plate_archive(tmp_path, create_certificates):
+    certificates = create_certificates(random.Random(2020))
+    archive = PlateArchive(str(tmp_path / 'archive'))
+    assert len(archive.export(certificates[:4], month='2020-11')) == 2
+    assert len(archive.export(certificates[4:], month='2020-12')) == 2
+    assert len(archive.get_chunks()) == 4
+    assert len(archive.get_chunks(plant=BAOSHAN)) == 2
+    assert len(archive.get_chunks(plant=LONGTENG, month='2020-12')) == 1
+    assert os.path.isdir(tmp_path / 'archive' / 'plant=BAOSHAN_IRON_STEEL_CO_LTD' / 'month=2020-11' / 'chunk-000001')
+
+    rows = [get_plate_row(certificate, plate) for certificate in certificates for plate in certificate.steel_plates]
+    assert {row['verdict'] for row in rows} == {'PASS', 'FAIL'}
+
+    def same(first, second):
+        return first == second or (isinstance(first, float) and math.isnan(first) and math.isnan(second))
+
+    def expected(plant=None, month=None, **filters):
+        selected = []
+        for certificate in certificates:
+            certificate_month = '2020-11' if certificates.index(certificate) < 4 else '2020-12'
+            if (plant is not None and certificate.steel_plant != plant) or \
+                    (month is not None and month != certificate_month):
+                continue
+            for plate in certificate.steel_plates:
+                row = get_plate_row(certificate, plate)
+                if all([row[column] == value for column, value in filters.items()]):
+                    selected.append(row)
+        # The chunks are read by plant, then month
+        return sorted(selected, key=lambda row: (row['steel_plant'] != BAOSHAN, row['certificate_no']))
+
+    for plant, month, filters in [
+        (None, None, {}), (None, None, {'specification': 'VL D36'}), (BAOSHAN, None, {'delivery_condition': 'TM'}),
+        (LONGTENG, '2020-12', {'specification': 'VL A', 'delivery_condition': 'AR'}), (None, None, {'verdict': 'FAIL'}),
+        (None, None, {'specification': 'VL E'})
+    ]:
+        scanned = list(archive.scan(None, plant, month, **filters))
+        expected_rows = expected(plant, month, **filters)
+        assert len(scanned) == len(expected_rows)
+        for row, expected_row in zip(scanned, expected_rows):
+            assert all([same(row[column], expected_row[column]) for column in expected_row])
+
+    columns = archive.read(['batch_no', 'Mn', 'yield_strength'], specification='VL D36')
+    assert columns['batch_no'] == [row['batch_no'] for row in expected(specification='VL D36')]
+    assert columns['Mn'] == [row['Mn'] for row in expected(specification='VL D36')]
+    with pytest.raises(ValueError):
+        archive.read(['Mn'], thickness='12')
+
+
+def test_export_of_results_is_idempotent(tmp_path, create_certificates):
+    certificates = create_certificates(random.Random(2021))
+    november, december = [time.mktime((2020, month, 15, 12, 0, 0, 0, 0, -1)) for month in [11, 12]]
+    results = [
+        FileResult(file_name='a.pdf', certificates=certificates[:4], verified_at=november),
+        FileResult(file_name='b.pdf', certificates=certificates[4:], verified_at=december),
+        FileResult(file_name='broken.pdf', exception_message='not a pdf', verified_at=december)
+    ]
+    archive = PlateArchive(str(tmp_path / 'archive'))
+    # Partitioned by the month of the verification, not of the export
+    assert len(archive.export_results(results)) == 4
+    assert len(archive.get_chunks(month='2020-11')) == 2 and len(archive.get_chunks(month='2020-12')) == 2
+    assert archive.export_results(results) == []
+    # A journal resumed since, with one more certificate
+    [extra] = create_certificates(random.Random(1))[:1]
+    extra.certificate_no = 'C6'
+    results.append(FileResult(file_name='c.pdf', certificates=[extra], verified_at=december))
+    assert len(archive.export_results(results)) == 1
+    certificate_nos = archive.read(['certificate_no'])['certificate_no']
+    assert len(certificate_nos) == sum([len(certificate.steel_plates) for certificate in certificates + [extra]])
+    assert sorted(set(certificate_nos)) == [f"C{number}" for number in range(7)]
@@ -0,0 +1,90 @@
+import os
+import time
+
+from certificate_processor import ProcessOptions, process
+from resource_governor import ResourceGovernor, MEBIBYTE, get_rss
+
+
+def read_slowly(file_path: str):
+    # The name of the file gives its behaviour
+    name = os.path.basename(file_path)
+    if name.startswith('slow'):
+        time.sleep(60)
+    if name.startswith('large'):
+        memory = b'x' * (256 * MEBIBYTE)
+        time.sleep(60)
+        return len(memory)
+    if name.startswith('crash'):
+        os._exit(3)
+    return name, os.getpid()
+
+
+def fail(file_path: str, reason: str):
+    return os.path.basename(file_path), reason
+
+
+def test_governor_gives_up_offending_files():
+    max_rss = 128 * MEBIBYTE
+    governor = ResourceGovernor(timeout=1, max_rss=max_rss, max_tasks=2, poll_interval=0.05)
+    file_paths = ['a.pdf', 'slow.pdf', 'b.pdf', 'large.pdf', 'crash.pdf', 'c.pdf', 'd.pdf']
+    start = time.monotonic()
+    indexed_results = list(governor.run(file_paths, 2, read_slowly, fail))
+    assert time.monotonic() - start < 30
+    # As they complete: the files given up come after the short files dispatched after them
+    indexes = [index for index, _ in indexed_results]
+    assert sorted(indexes) == list(range(len(file_paths))) and indexes.index(5) < indexes.index(1)
+    results = [result for _, result in sorted(indexed_results, key=lambda indexed_result: indexed_result[0])]
+    assert [result[0] for result in results] == file_paths
+    assert results[1] == ('slow.pdf', 'timeout after 1 s')
+    if get_rss(os.getpid()) is not None:
+        assert results[3][1].startswith(f"memory above the ceiling of {max_rss // MEBIBYTE} MiB")
+    assert results[4] == ('crash.pdf', 'worker exited with code 3')
+    # Two files per worker at most
+    worker_files = dict()
+    for name, pid in [results[index] for index in [0, 2, 5, 6]]:
+        worker_files.setdefault(pid, []).append(name)
+    assert max([len(names) for names in worker_files.values()]) <= 2
+    assert governor.killed_workers == 3 and governor.recycled_workers >= 1
+
+
+def warm_up_slowly():
+    time.sleep(2)
+
+
+def test_timeout_does_not_count_the_warm_up_of_the_workers():
+    governor = ResourceGovernor(timeout=1, poll_interval=0.05)
+    file_paths = ['a.pdf', 'b.pdf', 'slow.pdf']
+    indexed_results = governor.run(file_paths, 2, read_slowly, fail, initializer=warm_up_slowly)
+    results = [result for _, result in sorted(indexed_results, key=lambda indexed_result: indexed_result[0])]
+    assert [result[0] for result in results] == file_paths
+    assert results[2] == ('slow.pdf', 'timeout after 1 s')
+    assert governor.killed_workers == 1
+
+
+def test_ceiling_applies_to_the_growth_of_the_workers():
+    # The parent is already above the ceiling when the workers are forked, they inherit its pages
+    memory = b'x' * (192 * MEBIBYTE)
+    max_rss = 64 * MEBIBYTE
+    if get_rss(os.getpid()) is not None:
+        assert get_rss(os.getpid()) > max_rss
+    governor = ResourceGovernor(max_rss=max_rss, poll_interval=0.05)
+    file_paths = ['a.pdf', 'b.pdf', 'large.pdf', 'c.pdf']
+    results = [result for _, result in sorted(governor.run(file_paths, 2, read_slowly, fail),
+                                              key=lambda indexed_result: indexed_result[0])]
+    assert len(memory) == 192 * MEBIBYTE
+    assert [result[0] for result in results] == file_paths
+    assert [isinstance(results[index][1], int) for index in [0, 1, 3]] == [True, True, True]
+    if get_rss(os.getpid()) is not None:
+        assert results[2][1].startswith(f"memory above the ceiling of {max_rss // MEBIBYTE} MiB")
+        assert governor.killed_workers == 1 and governor.recycled_workers == 0
+
+
+def test_governed_process_routes_timeouts_to_exception(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    governor = ResourceGovernor(timeout=0.001)
+    batch_result = process(directory, ProcessOptions(workers=2, governor=governor))
+    assert batch_result.passed_certificate_nos == [] and batch_result.failed_files == []
+    # The broken file fails before the timeout
+    assert {message for name, message in batch_result.certificates_with_exception if name != 'broken.pdf'} == \
+           {'timeout after 0.001 s'}
+    assert len(os.listdir(os.path.join(directory, 'EXCEPTION'))) == len(batch_result.certificates_with_exception) + 1
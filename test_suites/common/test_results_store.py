@@ -0,0 +1,70 @@
+import os
+import shutil
+import time
+
+from certificate_processor import ProcessOptions, process, read_and_verify
+from results_store import ResultsStore, get_verified_elements
+
+
+def test_results_store(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    store = ResultsStore(str(tmp_path / 'results.sqlite3'))
+    start = time.time()
+    batch_result = process(directory, ProcessOptions(workers=1, store=store))
+
+    exceptions = store.find_certificates(verdict='EXCEPTION')
+    assert [row['file_name'] for row in exceptions] == [name for name, _ in batch_result.certificates_with_exception]
+    assert store.find_certificates(verdict='FAIL') == []
+    passed = store.find_certificates(verdict='PASS')
+    assert [row['certificate_no'] for row in passed] == batch_result.passed_certificate_nos
+
+    # The batch result only keeps the numbers of the passed certificates
+    certificate = read_and_verify(os.path.join(directory, 'PASS', 'DNVGL_LONGTENG.docx')).certificates[0]
+    plate = certificate.steel_plates[0]
+    assert [row['certificate_no'] for row in store.find_certificates(batch_no=plate.batch_no.value)] == \
+           [certificate.certificate_no]
+    plates = store.find_plates(specification=plate.specification.value, min_thickness=plate.thickness.value,
+                               max_thickness=plate.thickness.value, since=start)
+    assert plate.serial_number.value in [row['serial_number'] for row in plates]
+    assert all([row['verdict'] == 'PASS' for row in plates])
+    assert store.find_plates(specification=plate.specification.value, until=start) == []
+    assert store.find_plates(plate_no='no such plate') == []
+
+    plate_id = store.find_plates(certificate_no=certificate.certificate_no)[0]['id']
+    chemistry = {row['element']: row['value'] for row in store.get_chemistry(plate_id)}
+    assert chemistry == {
+        element: value.calculated_value for element, value in plate.chemical_compositions.items()
+    }
+    mechanical = store.get_mechanical(plate_id)
+    assert [row['value'] for row in mechanical if row['test'] == 'impact_energy'] == \
+           [energy.value for energy in plate.impact_energy_list]
+    assert [row['value'] for row in mechanical if row['test'] == 'yield_strength'] == [plate.yield_strength.value]
+    store.close()
+
+    # The results are kept across runs
+    store = ResultsStore(str(tmp_path / 'results.sqlite3'))
+    assert len(store.find_certificates()) == len(passed) + len(exceptions)
+    store.close()
+    assert os.path.exists(tmp_path / 'results.sqlite3')
+
+
+def test_results_store_keeps_the_routed_name_and_the_verdict_of_the_verifier(tmp_path, prepare_directory, test_data):
+    directory = prepare_directory(tmp_path / 'batch')
+    os.makedirs(os.path.join(directory, 'PASS'))
+    shutil.copy(os.path.join(test_data, 'DNVGL_LONGTENG.docx'), os.path.join(directory, 'PASS'))
+    store = ResultsStore(str(tmp_path / 'results.sqlite3'))
+    process(directory, ProcessOptions(workers=1, store=store))
+    certificate = read_and_verify(os.path.join(directory, 'PASS', 'DNVGL_LONGTENG.docx')).certificates[0]
+    [row] = store.find_certificates(certificate_no=certificate.certificate_no)
+    assert row['file_name'] == 'DNVGL_LONGTENG (1).docx'
+    assert os.path.exists(os.path.join(directory, 'PASS', row['file_name']))
+
+    # A rule may fail without annotating an element, the verdicts are not derived from the annotations
+    plate_flags = [[index != 0 for index in range(len(certificate.steel_plates))]]
+    store.add_result('verified.docx', [certificate], plate_flags)
+    [row] = store.find_certificates(verdict='FAIL')
+    assert row['file_name'] == 'verified.docx'
+    plates = store.find_plates(verdict='FAIL')
+    assert [plate['serial_number'] for plate in plates] == [certificate.steel_plates[0].serial_number.value]
+    assert all([element.valid_flag for element in get_verified_elements(certificate.steel_plates[0])])
+    store.close()
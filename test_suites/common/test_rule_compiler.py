@@ -0,0 +1,62 @@
+import copy
+import random
+
+import pytest
+
+from certificate_verification import BaoSteelRuleMaker, LongTengRuleMaker, SpecificationLimit, ThicknessLimit
+from common import SteelPlate, SerialNumber, Direction
+from rule_compiler import RuleCompiler
+from test_suites.common.conftest import BAOSTEEL_SPECIFICATIONS, LONGTENG_SPECIFICATIONS
+
+
+def verify_interpreted(plate, rules):
+    return all([limit.verify(plate) for limit in rules])
+
+
+@pytest.mark.parametrize('rule_maker, specifications, delivery_conditions, steel_making_types', [
+    (BaoSteelRuleMaker(), BAOSTEEL_SPECIFICATIONS, ['AR', 'N', 'TM', 'CR'], [None]),
+    (LongTengRuleMaker(), LONGTENG_SPECIFICATIONS, ['AR'], ['BOC, CC', 'EAF, CC']),
+])
+def test_compiled_rules_match_limits(rule_maker, specifications, delivery_conditions, steel_making_types, create_plate,
+                                     snapshot):
+    generator = random.Random(2020)
+    compiler = RuleCompiler()
+    for specification in specifications:
+        for delivery_condition in delivery_conditions:
+            for steel_making_type in steel_making_types:
+                for thickness in [8, 12.5, 15, 17, 19, 25, 35, 50, 68, 80, 100, 150]:
+                    for direction in Direction:
+                        for _ in range(2):
+                            plate = create_plate(specification, delivery_condition, thickness, steel_making_type,
+                                                 direction, generator)
+                            try:
+                                rules = rule_maker.get_rules(plate)
+                            except ValueError:
+                                continue
+                            compiled_plate = copy.deepcopy(plate)
+                            try:
+                                expected = verify_interpreted(plate, rules)
+                            except ValueError as e:
+                                with pytest.raises(ValueError) as excinfo:
+                                    compiler.verify(compiled_plate, rules)
+                                assert str(excinfo.value) == str(e)
+                                continue
+                            assert compiler.verify(compiled_plate, rules) == expected
+                            assert snapshot(compiled_plate) == snapshot(plate)
+
+
+def test_compiled_rules_are_cached():
+    compiler = RuleCompiler()
+    compiler.clear()
+    rules = [SpecificationLimit(scope=['VL A']), ThicknessLimit(maximum=20)]
+    function = compiler.compile(rules)
+    assert compiler.compile([SpecificationLimit(scope=['VL A']), ThicknessLimit(maximum=20)]) is function
+    assert compiler.compile([SpecificationLimit(scope=['VL A']), ThicknessLimit(maximum=15)]) is not function
+    assert len(compiler) == 2
+
+
+def test_compiled_rules_missing_element():
+    plate = SteelPlate(serial_number=SerialNumber(table_index=None, x_coordinate=None, y_coordinate=None, value=2))
+    with pytest.raises(ValueError) as excinfo:
+        RuleCompiler().verify(plate, [ThicknessLimit(maximum=20)])
+    assert str(excinfo.value) == "Could not find value of thickness in the 2nd steel plate."
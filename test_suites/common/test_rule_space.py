@@ -0,0 +1,97 @@
+import os
+import random
+
+import pytest
+
+from certificate_processor import read_and_verify
+from certificate_verification import BaoSteelRuleMaker, LongTengRuleMaker
+from common import Direction
+from rule_compiler import RuleCompiler
+from rule_space import RuleSpace, RuleSpaceDimensions
+from test_suites.common.conftest import BAOSTEEL_SPECIFICATIONS, LONGTENG_SPECIFICATIONS
+
+
+@pytest.fixture(scope='module')
+def rule_space():
+    space = RuleSpace()
+    space.build([BaoSteelRuleMaker(), LongTengRuleMaker()])
+    yield space
+    space.clear()
+
+
+def get_rules_or_error(get_rules, plate):
+    try:
+        return RuleCompiler.get_signature(get_rules(plate))
+    except ValueError as e:
+        return str(e)
+
+
+def test_rule_space_dimensions():
+    dimensions = RuleSpaceDimensions(BaoSteelRuleMaker())
+    assert dimensions.specifications == BAOSTEEL_SPECIFICATIONS
+    assert sorted(dimensions.delivery_conditions) == ['AR', 'N', 'NR', 'TM']
+    assert 12.5 in dimensions.thickness_boundaries and 150 in dimensions.thickness_boundaries
+    dimensions = RuleSpaceDimensions(LongTengRuleMaker())
+    assert dimensions.specifications == LONGTENG_SPECIFICATIONS
+    assert dimensions.steel_making_types[:2] == ['BOC, CC', 'EAF, CC']
+    assert 15 in dimensions.thickness_boundaries and 17 in dimensions.thickness_boundaries
+
+
+@pytest.mark.parametrize('rule_maker, specifications, delivery_conditions, steel_making_types', [
+    (BaoSteelRuleMaker(), BAOSTEEL_SPECIFICATIONS + ['VL A Z35'], ['AR', 'N', 'TM', 'CR'], [None]),
+    (LongTengRuleMaker(), LONGTENG_SPECIFICATIONS, ['AR', 'N'], ['BOC, CC', 'EAF, CC', None, 'EAF']),
+])
+def test_rule_space_matches_rule_maker(rule_space, rule_maker, specifications, delivery_conditions,
+                                       steel_making_types, create_plate):
+    generator = random.Random(2020)
+    for specification in specifications:
+        for delivery_condition in delivery_conditions:
+            for steel_making_type in steel_making_types:
+                for thickness in [8, 12.5, 12.6, 15, 16, 17, 19, 20, 25, 35, 50, 68, 70.5, 80, 100, 150, 151]:
+                    direction = generator.choice(list(Direction))
+                    plate = create_plate(specification, delivery_condition, thickness, steel_making_type, direction,
+                                         generator)
+                    assert get_rules_or_error(lambda p: rule_space.get_rules(rule_maker, p), plate) == \
+                           get_rules_or_error(rule_maker.get_rules, plate)
+
+
+def test_rule_space_shares_rule_sets(rule_space, create_plate):
+    generator = random.Random(2020)
+    first = create_plate('VL D36', 'TM', 31, None, Direction.TRANSVERSE, generator)
+    second = create_plate('VL D36', 'TM', 35, None, Direction.TRANSVERSE, generator)
+    assert rule_space.get_rules(BaoSteelRuleMaker(), first) is rule_space.get_rules(BaoSteelRuleMaker(), second)
+
+
+def test_rule_space_snapshot(rule_space, tmp_path, create_plate):
+    path = str(tmp_path / 'rule_space.pickle')
+    rule_space.save(path)
+    rule_sets = dict(rule_space.rule_sets)
+    assert rule_space.load(path)
+    assert len(rule_space) == len(rule_sets)
+    plate = create_plate('VL A32', 'AR', 18, 'EAF, CC', Direction.LONGITUDINAL, random.Random(2020))
+    rule_space.misses = 0
+    assert RuleCompiler.get_signature(rule_space.get_rules(LongTengRuleMaker(), plate)) == \
+           RuleCompiler.get_signature(LongTengRuleMaker.get_rules(plate))
+    assert rule_space.misses == 0
+    assert not rule_space.load(str(tmp_path / 'missing.pickle'))
+    assert len(rule_space) == 0
+    assert rule_space.load(path)
+
+
+def test_files_are_verified_with_the_compiled_rules_of_the_rule_space(rule_space, tmp_path, snapshot, test_data):
+    file_path = os.path.join(test_data, 'DNVGL_LONGTENG.docx')
+    compiler = RuleCompiler()
+    compiler.clear()
+    rule_space.hits = 0
+    compiled = read_and_verify(file_path)
+    assert rule_space.hits > 0 and compiler.misses > 0
+    path = str(tmp_path / 'rule_space.pickle')
+    rule_space.save(path)
+    rule_space.clear()
+    compiler.clear()
+    interpreted = read_and_verify(file_path)
+    assert rule_space.load(path)
+    assert len(compiler) == 0
+    assert compiled.plate_flags == interpreted.plate_flags
+    assert [[snapshot(plate) for plate in certificate.steel_plates] for certificate in compiled.certificates] == \
+           [[snapshot(plate) for plate in certificate.steel_plates] for certificate in interpreted.certificates]
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from common import SingletonMeta, SingletonRegistry
+
+
+class SlowSingleton(metaclass=SingletonMeta):
+    created = 0
+
+    def __init__(self):
+        time.sleep(0.05)
+        SlowSingleton.created += 1
+        self.cache = {}
+
+
+class ForkedSingleton(metaclass=SingletonMeta):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.forks = 0
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self.forks += 1
+
+
+def test_singleton_created_once_by_threads():
+    barrier = threading.Barrier(8)
+
+    def create():
+        barrier.wait()
+        return SlowSingleton()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        instances = list(executor.map(lambda _: create(), range(8)))
+    assert SlowSingleton.created == 1
+    assert all(instance is instances[0] for instance in instances)
+
+
+def test_singleton_warm_up():
+    calls = []
+    hook = SingletonRegistry.add_warm_up_hook(lambda: calls.append(os.getpid()))
+    try:
+        SingletonRegistry._warmed_up_pid = None
+        SingletonRegistry.warm_up(SlowSingleton)
+        SingletonRegistry.warm_up(SlowSingleton)
+        assert calls == [os.getpid()]
+        assert SingletonRegistry.is_warmed_up()
+    finally:
+        SingletonRegistry.remove_warm_up_hook(hook)
+    assert hook not in SingletonRegistry._warm_up_hooks
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork is not available')
+def test_singleton_shared_with_forked_worker():
+    parent = ForkedSingleton()
+    parent.cache = 'built by the parent'
+    # The child must neither deadlock on the locks held by the parent nor rebuild the instance
+    with parent.lock, SingletonRegistry._lock:
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                child = ForkedSingleton()
+                with child.lock:
+                    SlowSingleton()
+                    if child is parent and child.cache == 'built by the parent' and child.forks == 1 and \
+                            not SingletonRegistry.is_warmed_up():
+                        status = 0
+            finally:
+                os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert parent.forks == 0
@@ -0,0 +1,79 @@
+import json
+import os
+
+import instrumentation
+from certificate_processor import ProcessOptions, process, list_certificate_files
+from instrumentation import add_hook, remove_hook, span, set_attributes
+from tracer import Tracer, get_value
+
+
+def read_spans(path: str):
+    with open(path, encoding='utf-8') as f:
+        resource_spans = json.load(f)['resourceSpans']
+    assert len(resource_spans) == 1
+    return resource_spans[0]['scopeSpans'][0]['spans']
+
+
+def get_attributes(otlp_span):
+    return {attribute['key']: attribute['value'] for attribute in otlp_span['attributes']}
+
+
+def test_values():
+    assert get_value(True) == {'boolValue': True}
+    assert get_value(12) == {'intValue': '12'}
+    assert get_value(0.5) == {'doubleValue': 0.5}
+    assert get_value(['4x6']) == {'arrayValue': {'values': [{'stringValue': '4x6'}]}}
+
+
+def test_one_trace_per_file(tmp_path):
+    tracer = Tracer(str(tmp_path))
+    add_hook(tracer)
+    try:
+        with span('file', file_name='a.pdf'):
+            with span('open'):
+                set_attributes(table_shapes=['4x6', '14x38'])
+            try:
+                with span('verify'):
+                    raise ValueError('broken')
+            except ValueError:
+                pass
+        # Not a file, no trace
+        with span('report.write_duplicates'):
+            pass
+    finally:
+        remove_hook(tracer)
+    set_attributes(ignored=True)
+    assert tracer.pending == {}
+    assert os.listdir(os.path.join(str(tmp_path), 'TRACE')) == ['a.pdf.json']
+    file_span, open_span, verify_span = read_spans(os.path.join(str(tmp_path), 'TRACE', 'a.pdf.json'))
+    assert [file_span['name'], open_span['name'], verify_span['name']] == ['file', 'open', 'verify']
+    assert len({file_span['traceId'], open_span['traceId'], verify_span['traceId']}) == 1
+    assert len(file_span['traceId']) == 32 and len(file_span['spanId']) == 16
+    assert file_span['parentSpanId'] == ''
+    assert open_span['parentSpanId'] == verify_span['parentSpanId'] == file_span['spanId']
+    assert int(file_span['startTimeUnixNano']) <= int(open_span['startTimeUnixNano']) <= \
+           int(open_span['endTimeUnixNano']) <= int(file_span['endTimeUnixNano'])
+    assert get_attributes(file_span) == {'file_name': {'stringValue': 'a.pdf'}}
+    assert get_attributes(open_span)['table_shapes']['arrayValue']['values'][1] == {'stringValue': '14x38'}
+    assert verify_span['status'] == {'code': 2, 'message': 'ValueError'}
+    assert file_span['status'] == {}
+
+
+def test_process_writes_the_trace_of_each_file(tmp_path, prepare_directory):
+    directory = prepare_directory(tmp_path / 'batch')
+    file_names = list_certificate_files(directory)
+    process(directory, ProcessOptions(workers=2, trace=True))
+    assert instrumentation.hooks == ()
+    assert sorted(os.listdir(os.path.join(directory, 'TRACE'))) == [f"{file_name}.json" for file_name in file_names]
+    spans = read_spans(os.path.join(directory, 'TRACE', 'DNVGL_LONGTENG.docx.json'))
+    file_attributes = get_attributes(spans[0])
+    assert file_attributes['steel_plant'] == {'stringValue': 'CHANGSHU LONGTENG SPECIAL STEEL CO., LTD.'}
+    assert int(file_attributes['plate_count']['intValue']) > 0
+    assert file_attributes['verdict']['stringValue'] in ('PASS', 'FAIL')
+    names = {otlp_span['name'] for otlp_span in spans}
+    assert {'open', 'open.load', 'open.tables', 'open.text', 'extract.steel_plates', 'verify'} <= names
+    tables_span = [otlp_span for otlp_span in spans if otlp_span['name'] == 'open.tables'][0]
+    assert 'table_shapes' in get_attributes(tables_span)
+    broken_span = read_spans(os.path.join(directory, 'TRACE', 'broken.pdf.json'))[0]
+    assert get_attributes(broken_span)['verdict'] == {'stringValue': 'EXCEPTION'}
+    assert broken_span['status']['code'] == 2
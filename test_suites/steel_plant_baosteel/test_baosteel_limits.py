@@ -4,7 +4,7 @@ from certificate_verification import ChemicalCompositionLimit, LimitType, Thickn
     DeliveryConditionLimit, YieldStrengthLimit, TensileStrengthLimit, ElongationLimit, TemperatureLimit, \
     ImpactEnergyLimit, BaoSteelAlLimit, FineGrainElementLimit, FineGrainElementLimitCombination
 from common import SteelPlate, SerialNumber, ChemicalElementValue, Thickness, Specification, DeliveryCondition, \
-    YieldStrength, TensileStrength, Elongation, Temperature, ImpactEnergy
+    YieldStrength, TensileStrength, Elongation, Temperature, ImpactEnergy, LimitMessage
 
 
 @pytest.fixture
@@ -322,6 +322,36 @@ def test_chemical_composition_limit(plate: SteelPlate):
     assert '[FAIL]' in plate.chemical_compositions['C'].message
 
 
+def test_chemical_composition_limit_message(plate: SteelPlate):
+    # the message is kept as limit results and only rendered into text when it is read.
+    cl = ChemicalCompositionLimit(
+        chemical_element='C',
+        limit_type=LimitType.MAXIMUM,
+        maximum=0.20
+    )
+    plate.chemical_compositions['C'].set_value_and_precision(value=19, precision=2)
+    cl.verify(plate)
+    message = plate.chemical_compositions['C'].message
+    assert isinstance(message, LimitMessage)
+    assert len(message.parts) == 1
+    assert message.parts[0].limit is cl
+    assert message.parts[0].value == 0.19
+    assert message.parts[0].valid_flag
+    assert str(message) == (
+        "[PASS] The value of chemical element C is 0.19, meets the maximum limit 0.2 % by weight."
+    )
+    # a failed result is put in front of the existing annotation.
+    plate.chemical_compositions['C'].set_value_and_precision(value=21, precision=2)
+    cl.verify(plate)
+    assert str(plate.chemical_compositions['C'].message) == (
+        "[FAIL] The value of chemical element C is 0.21, violates the maximum limit 0.2 % by weight. "
+        "[PASS] The value of chemical element C is 0.19, meets the maximum limit 0.2 % by weight."
+    )
+    assert cl.verify_value(0.21) == (
+        False, "[FAIL] The value of chemical element C is 0.21, violates the maximum limit 0.2 % by weight."
+    )
+
+
 def test_thickness_limit(plate: SteelPlate):
     tl = ThicknessLimit(
         maximum=20.0,
@@ -770,3 +800,33 @@ def test_fine_grain_element_limit_combination(plate: SteelPlate):
     assert '[FAIL]' in plate.chemical_compositions['Als'].message
     assert '[FAIL]' in plate.chemical_compositions['Ti'].message
     assert '[FAIL]' in plate.chemical_compositions['Nb'].message
+
+
+def test_fine_grain_element_limit_combination_elements(plate: SteelPlate):
+    # the elements of a combination are collected once, in order of appearance and without duplicates.
+    combination = FineGrainElementLimitCombination(
+        fine_grain_element_limits=[
+            FineGrainElementLimit(
+                concurrent_limits=[
+                    BaoSteelAlLimit(),
+                    ChemicalCompositionLimit(chemical_element='Ti', limit_type=LimitType.MINIMUM, minimum=0.007)
+                ]
+            ),
+            FineGrainElementLimit(
+                concurrent_limits=[
+                    BaoSteelAlLimit(),
+                    ChemicalCompositionLimit(chemical_element='Nb', limit_type=LimitType.MINIMUM, minimum=0.010),
+                    ChemicalCompositionLimit(chemical_element='Nb + V + Ti', limit_type=LimitType.MAXIMUM,
+                                             maximum=0.12)
+                ]
+            )
+        ],
+        error_message='[FAIL] Fine Grain Element failed test: '
+    )
+    assert combination.element_names == ('Alt', 'Als', 'Ti', 'Nb', 'V')
+    elements = combination.get_element(plate)
+    assert [element.element for element in elements] == ['Alt', 'Als', 'Ti', 'Nb', 'V']
+    assert all(element is plate.chemical_compositions[element.element] for element in elements)
+    del plate.chemical_compositions['V']
+    with pytest.raises(ValueError):
+        combination.get_element(plate)
@@ -0,0 +1,105 @@
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, List
+
+from instrumentation import Span
+
+# Export of the spans of each file (see instrumentation) as a trace, in the JSON encoding of the OpenTelemetry protocol
+# (OTLP/JSON, as the file exporter of the OpenTelemetry collector writes it), without any collector: a hook writes the
+# trace of a file when its span ends, to the TRACE subdirectory of the batch:
+#
+#     <file name>.json      {"resourceSpans": [{"resource": ..., "scopeSpans": [{"scope": ..., "spans": [...]}]}]}
+#
+#     python certificate_processor.py <directory> --trace
+#
+# The spans carry the attributes set on them, e.g. the steel plant, the number of plates and the verdict of the file,
+# the shapes of the tables read (rows x columns), or the number of "Test Lot No" lines of a BaoSteel certificate. The
+# hook is registered before the worker processes are forked, so that each worker writes the traces of its files.
+
+TRACE_DIRECTORY = 'TRACE'
+SERVICE_NAME = 'certificate_processor'
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_ERROR = 2
+
+
+def get_value(value: Any) -> Dict[str, Any]:
+    # AnyValue of OTLP/JSON, the 64 bit integers are strings
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [get_value(item) for item in value]}}
+    return {'stringValue': str(value)}
+
+
+def get_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': get_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Tracer:
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, TRACE_DIRECTORY)
+        os.makedirs(self.directory, exist_ok=True)
+        # The clock of the spans (perf_counter) to the Unix time, the forked workers share the monotonic clock
+        self.offset = time.time() - time.perf_counter()
+        # The finished spans by root, until the root ends
+        self.pending: Dict[Span, List[Span]] = dict()
+        self.lock = threading.Lock()
+
+    def __call__(self, finished_span: Span):
+        root = finished_span
+        while root.parent is not None:
+            root = root.parent
+        with self.lock:
+            spans = self.pending.setdefault(root, [])
+            spans.append(finished_span)
+            if finished_span is not root:
+                return
+            del self.pending[root]
+        # Only the files make a trace, e.g. the writing of the summaries doesn't
+        if root.name == 'file':
+            self.write(root.attributes.get('file_name', 'file'), spans)
+
+    def get_unix_nano(self, seconds: float) -> str:
+        return str(int((self.offset + seconds) * 1e9))
+
+    def get_trace(self, spans: List[Span]) -> Dict[str, Any]:
+        trace_id = secrets.token_hex(16)
+        span_ids = {finished_span: secrets.token_hex(8) for finished_span in spans}
+        otlp_spans = []
+        # From the root, in the order the spans started
+        for finished_span in sorted(spans, key=lambda s: s.start):
+            otlp_span = {
+                'traceId': trace_id,
+                'spanId': span_ids[finished_span],
+                'parentSpanId': span_ids[finished_span.parent] if finished_span.parent is not None else '',
+                'name': finished_span.name,
+                'kind': SPAN_KIND_INTERNAL,
+                'startTimeUnixNano': self.get_unix_nano(finished_span.start),
+                'endTimeUnixNano': self.get_unix_nano(finished_span.end),
+                'attributes': get_attributes(finished_span.attributes),
+                'status': {}
+            }
+            error = finished_span.attributes.get('error') or finished_span.attributes.get('exception_message')
+            if error is not None:
+                otlp_span['status'] = {'code': STATUS_CODE_ERROR, 'message': str(error)}
+            otlp_spans.append(otlp_span)
+        return {
+            'resourceSpans': [{
+                'resource': {
+                    'attributes': get_attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})
+                },
+                'scopeSpans': [{'scope': {'name': 'instrumentation'}, 'spans': otlp_spans}]
+            }]
+        }
+
+    def write(self, file_name: str, spans: List[Span]):
+        with open(os.path.join(self.directory, f"{file_name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.get_trace(spans), f, ensure_ascii=False)